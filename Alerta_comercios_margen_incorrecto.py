@@ -4,24 +4,27 @@
 # ═════════════════════════════════════════════════════════════════════════════
 # 1) IMPORTS Y CONFIGURACIÓN INICIAL
 # ═════════════════════════════════════════════════════════════════════════════
-import smtplib
-import psycopg2
+import argparse
 import pandas as pd
 from datetime import datetime, timedelta
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+from alcance_comercios import alcance_por_grupo, consultar_con_alcance
+from tablas_html import tabla_html
+import estado_alertas
+from estado_alertas import filtrar_por_estado, registrar_reportados, resumen_html
+import perfilado
+import metricas
 
-# -- Configuración de fecha dinámica
-hoy = datetime.now()
+# -- Configuración de fecha dinámica (se recalcula en cada corrida, ver actualizar_periodo)
 nombres_meses_es = [
     "Enero","Febrero","Marzo","Abril","Mayo","Junio",
     "Julio","Agosto","Septiembre","Octubre","Noviembre","Diciembre"
 ]
-CONFIG_MES = {'nombre': nombres_meses_es[hoy.month - 1], 'numero': hoy.month, 'ano': hoy.year}
+CONFIG_MES: Dict = {}
 
-# -- Para evaluar un mes específico completo, comentar la línea de arriba
-# CONFIG_MES = {'nombre': 'Junio', 'numero': 6, 'ano': 2025}
+# -- Para evaluar un mes específico completo, fijarlo aquí (None = mes en curso)
+# MES_FIJO = {'nombre': 'Junio', 'numero': 6, 'ano': 2025}
+MES_FIJO: Optional[Dict] = None
 
 
 # -- Credenciales DB (anonimizadas)
@@ -35,18 +38,50 @@ CREDENTIALS_DB = {
 DATA_MAIL = {
     'sender_email': 'alertas@demo.com', 'sender_password': '********',
     'recipient': ['persona1@demo.com', 'persona2@demo.com'],
-    'subject': f"🚨 Alerta: Objetivo Inválido Detectado - {CONFIG_MES['nombre']} {CONFIG_MES['ano']}"
+    'subject': None,  # ver actualizar_periodo
 }
+SMTP_CONFIG = {
+    'host': 'smtp.demo.com', 'port': 587, 'remitente': DATA_MAIL['sender_email'],
+    'usuario': DATA_MAIL['sender_email'], 'password': DATA_MAIL['sender_password']
+}
+
+def actualizar_periodo(hoy: Optional[datetime] = None) -> Dict:
+    """Recalcula el mes a revisar y el asunto del correo; en el programador el módulo sigue
+    cargado entre corridas, así que no puede quedar fijo el mes del momento del import."""
+    hoy = hoy or datetime.now()
+    CONFIG_MES.clear()
+    CONFIG_MES.update(MES_FIJO or {'nombre': nombres_meses_es[hoy.month - 1], 'numero': hoy.month, 'ano': hoy.year})
+    DATA_MAIL['subject'] = f"🚨 Alerta: Objetivo Inválido Detectado - {CONFIG_MES['nombre']} {CONFIG_MES['ano']}"
+    return CONFIG_MES
+
+actualizar_periodo()
 
 # ═════════════════════════════════════════════════════════════════════════════
 # 2) CONSTANTES PARA LA CONSULTA
 # ═════════════════════════════════════════════════════════════════════════════
 
-# Lista de identificadores a validar (anonimizados)
+# Lista de identificadores a validar (anonimizados); se carga en una tabla temporal
 IDS_A_VALIDAR = [
     '11111111-1','22222222-2','33333333-3','44444444-4','55555555-5'
 ]
 
+# Conexiones paralelas entre las que se reparte la lista de comercios (1 = una sola sesión)
+CONEXIONES_PARALELAS = 1
+
+# -- Modo multi-mes / multi-grupo: varios meses y grupos de comercios en una sola consulta agrupada.
+#    Los grupos se cargan en la tabla temporal con su nombre (columna grupo).
+GRUPOS_COMERCIOS: Dict[str, List[str]] = {
+    'principal': IDS_A_VALIDAR,
+    # 'otro_grupo': ['66666666-6', '77777777-7'],
+}
+# Destinatarios por grupo en el reporte por grupo (si falta, se usa DATA_MAIL['recipient'])
+DESTINATARIOS_GRUPO: Dict[str, List[str]] = {}
+
+# -- Estado (ver estado_alertas.py): con marca de agua, el mes se consulta sólo desde la última
+#    revisión (menos RELECTURA_DIAS por datos tardíos) o desde el caso abierto más antiguo.
+NOMBRE_ALERTA = 'margen_objetivo'
+RELECTURA_DIAS = 3
+
 # Tipos de transacción a ser excluidos (anonimizados)
 TIPOS_TX_A_EXCLUIR = [
     'ANULACION_TIPO_A','ANULACION_TIPO_B','REVERSA_TIPO_C',
@@ -57,39 +92,34 @@ TIPOS_TX_A_EXCLUIR = [
 # 3) FUNCIONES DE UTILIDAD
 # ═════════════════════════════════════════════════════════════════════════════
 
-def connect_db(credentials: Dict) -> psycopg2.extensions.connection:
-    """Establece conexión con la base de datos Redshift."""
-    try:
-        conn = psycopg2.connect(**credentials)
-        print("✓ Conexión exitosa a la base de datos.")
-        return conn
-    except psycopg2.OperationalError as e:
-        raise SystemExit(f"❌ Error fatal al conectar a la base de datos: {e}")
-
-def close_db_connection(connection: psycopg2.extensions.connection):
-    """Cierra la conexión a la base de datos."""
-    if connection:
-        connection.close()
-        print("✓ Conexión a la base de datos cerrada.")
-
-def send_alert_email(df_nulos: pd.DataFrame, df_menores: pd.DataFrame):
-    """Envía un correo de alerta con los datos encontrados, separados por categoría."""
+def send_alert_email(df_nulos: pd.DataFrame, df_menores: pd.DataFrame,
+                     etiqueta_periodo: Optional[str] = None, destinatarios: Optional[List[str]] = None,
+                     asunto: Optional[str] = None, resumen_estado: Optional[Dict] = None):
+    """Encola un correo de alerta con los datos encontrados, separados por categoría; retorna el Future del envío."""
+    etiqueta_periodo = etiqueta_periodo or f"{CONFIG_MES['nombre']} {CONFIG_MES['ano']}"
+    destinatarios = destinatarios or DATA_MAIL["recipient"]
+    # Imports diferidos: en una corrida sin hallazgos no se cargan los módulos de correo
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    from envio_correos import encolar
+
     msg = MIMEMultipart("related")
     msg["From"] = DATA_MAIL["sender_email"]
-    msg["To"] = ", ".join(DATA_MAIL["recipient"])
-    msg["Subject"] = DATA_MAIL["subject"]
+    msg["To"] = ", ".join(destinatarios)
+    msg["Subject"] = asunto or DATA_MAIL["subject"]
     
     # Inicia el cuerpo del correo
     cuerpo_html = f"""
     <p>Estimados,</p>
-    <p>Se detectaron problemas con el <b>Objetivo</b> para transacciones en el periodo de <b>{CONFIG_MES['nombre']} {CONFIG_MES['ano']}</b>.</p>
+    <p>Se detectaron problemas con el <b>Objetivo</b> para transacciones en el periodo de <b>{etiqueta_periodo}</b>.</p>
+    {resumen_html(resumen_estado)}
     <p>A continuación, se detallan los casos encontrados:</p>
     """
     
     # --- SECCIÓN 1: Objetivo NULO ---
     if not df_nulos.empty:
         df_reporte_nulos = df_nulos.rename(columns={
-            'id_comercio': 'ID Comercio', 'periodo': 'Periodo',
+            'grupo': 'Grupo', 'mes': 'Mes', 'id_comercio': 'ID Comercio', 'periodo': 'Periodo',
             'objetivo': 'Objetivo', 'cantidad_tx': 'Cantidad de TX'
         })
         cuerpo_html += """
@@ -97,13 +127,13 @@ def send_alert_email(df_nulos: pd.DataFrame, df_menores: pd.DataFrame):
         <h3>Casos con Objetivo Nulo</h3>
         <p>Estos registros no tienen un valor asignado en el campo <code>objetivo</code>.</p>
         """
-        cuerpo_html += df_reporte_nulos.to_html(index=False, border=0, na_rep='NULO')
+        cuerpo_html += tabla_html(df_reporte_nulos, na_rep='NULO', miles=['Cantidad de TX'])
         cuerpo_html += "<br>"
 
     # --- SECCIÓN 2: Objetivo MENOR A 1 ---
     if not df_menores.empty:
         df_reporte_menores = df_menores.rename(columns={
-            'id_comercio': 'ID Comercio', 'periodo': 'Periodo',
+            'grupo': 'Grupo', 'mes': 'Mes', 'id_comercio': 'ID Comercio', 'periodo': 'Periodo',
             'objetivo': 'Objetivo', 'cantidad_tx': 'Cantidad de TX'
         })
         cuerpo_html += """
@@ -111,7 +141,7 @@ def send_alert_email(df_nulos: pd.DataFrame, df_menores: pd.DataFrame):
         <h3>Casos con Objetivo Menor a 1</h3>
         <p>Estos registros tienen un valor incorrecto en <code>objetivo</code> (menor a 1).</p>
         """
-        cuerpo_html += df_reporte_menores.to_html(index=False, border=0)
+        cuerpo_html += tabla_html(df_reporte_menores, miles=['Cantidad de TX'])
 
     # Cierre del correo
     cuerpo_html += """
@@ -121,21 +151,17 @@ def send_alert_email(df_nulos: pd.DataFrame, df_menores: pd.DataFrame):
     
     msg.attach(MIMEText(cuerpo_html, "html", "utf-8"))
     
-    try:
-        with smtplib.SMTP("smtp.demo.com", 587) as srv:
-            srv.starttls()
-            srv.login(DATA_MAIL["sender_email"], DATA_MAIL["sender_password"])
-            srv.sendmail(DATA_MAIL["sender_email"], DATA_MAIL["recipient"], msg.as_string())
-        print(f"✉️ Correo de alerta enviado exitosamente a: {', '.join(DATA_MAIL['recipient'])}")
-    except Exception as e:
-        print(f"❌ Error al enviar el correo: {e}")
+    # El envío ocurre en segundo plano (ver envio_correos.py)
+    futuro = encolar(SMTP_CONFIG, msg, destinatarios)
+    print(f"📨 Correo de alerta encolado para: {', '.join(destinatarios)}")
+    return futuro
 
 # ═════════════════════════════════════════════════════════════════════════════
 # 4) LÓGICA PRINCIPAL
 # ═════════════════════════════════════════════════════════════════════════════
 
-def construir_query_revision(mes: int, ano: int, ids: List[str], tx_excluidas: List[str]) -> str:
-    """Construye la consulta SQL dinámicamente."""
+def rango_mes(mes: int, ano: int) -> Tuple[str, str]:
+    """Retorna (inicio, fin exclusivo) del mes; el mes en curso se corta en mañana."""
     start_date = f"{ano}-{mes:02d}-01"
     hoy = datetime.now()
     if ano == hoy.year and mes == hoy.month:
@@ -144,51 +170,187 @@ def construir_query_revision(mes: int, ano: int, ids: List[str], tx_excluidas: L
     else:
         next_month, next_year = (mes % 12) + 1, ano + (mes // 12)
         end_date = f"{next_year}-{next_month:02d}-01"
+    return start_date, end_date
 
-    ids_sql = ", ".join([f"'{r}'" for r in ids])
-    tx_sql = ", ".join([f"'{tx}'" for tx in tx_excluidas])
+def construir_query_revision(mes: int, ano: int, tx_excluidas: List[str],
+                             desde: Optional[str] = None) -> Tuple[str, Dict]:
+    """Construye la consulta SQL y sus parámetros; los comercios vienen de la tabla temporal de alcance.
 
-    query = f"""
+    `desde` (AAAA-MM-DD) reemplaza el inicio del mes cuando se revisa desde una marca de agua.
+    """
+    start_date, end_date = rango_mes(mes, ano)
+    if desde:
+        start_date = desde
+
+    query = """
         SELECT 
             al.id_comercio,
             TO_CHAR(al.fecha_tx, 'yyyy-mm-dd') AS periodo,
             SUM(rc.objetivo) AS objetivo,
             COUNT(al.codigo_tx) AS cantidad_tx
         FROM schema_demo.transacciones al
+        JOIN tmp_alcance_comercios sc ON (al.id_comercio = sc.id_comercio)
         LEFT JOIN schema_demo.objetivos rc ON (al.id = rc.id)
-        WHERE al.id_comercio IN ({ids_sql})
-          AND al.tipo_tx NOT IN ({tx_sql})
-          AND al.fecha_tx >= '{start_date}'::timestamp
-          AND al.fecha_tx < '{end_date}'::timestamp
+        WHERE al.tipo_tx NOT IN %(tx_excluidas)s
+          AND al.fecha_tx >= %(start_date)s::timestamp
+          AND al.fecha_tx < %(end_date)s::timestamp
           AND (rc.objetivo IS NULL OR rc.objetivo < 1)
         GROUP BY al.id_comercio, periodo
         ORDER BY periodo;
     """
-    return query
+    params = {
+        'tx_excluidas': tuple(tx_excluidas),
+        'start_date': start_date,
+        'end_date': end_date,
+    }
+    return query, params
+
+def construir_query_multi(meses: List[Tuple[int, int]], tx_excluidas: List[str]) -> Tuple[str, Dict]:
+    """Una sola consulta para varios meses (mes, año) y todos los grupos de la tabla temporal.
+
+    Agrupa además por grupo y mes, para separar el resultado localmente.
+    """
+    rangos = [rango_mes(m, a) for m, a in meses]
+    query = """
+        SELECT 
+            sc.grupo,
+            TO_CHAR(al.fecha_tx, 'yyyy-mm') AS mes,
+            al.id_comercio,
+            TO_CHAR(al.fecha_tx, 'yyyy-mm-dd') AS periodo,
+            SUM(rc.objetivo) AS objetivo,
+            COUNT(al.codigo_tx) AS cantidad_tx
+        FROM schema_demo.transacciones al
+        JOIN tmp_alcance_comercios sc ON (al.id_comercio = sc.id_comercio)
+        LEFT JOIN schema_demo.objetivos rc ON (al.id = rc.id)
+        WHERE al.tipo_tx NOT IN %(tx_excluidas)s
+          AND al.fecha_tx >= %(start_date)s::timestamp
+          AND al.fecha_tx < %(end_date)s::timestamp
+          AND TO_CHAR(al.fecha_tx, 'yyyy-mm') IN %(meses)s
+          AND (rc.objetivo IS NULL OR rc.objetivo < 1)
+        GROUP BY sc.grupo, mes, al.id_comercio, periodo
+        ORDER BY sc.grupo, periodo;
+    """
+    params = {
+        'tx_excluidas': tuple(tx_excluidas),
+        'start_date': min(r[0] for r in rangos),
+        'end_date': max(r[1] for r in rangos),
+        'meses': tuple(f"{a}-{m:02d}" for m, a in meses),
+    }
+    return query, params
+
+def inicio_revision(start_date: str) -> str:
+    """Inicio efectivo: desde la marca de agua (si es posterior al inicio del mes), pero nunca
+    después del caso abierto más antiguo, para poder detectar cuándo se resuelve."""
+    if not estado_alertas.USAR_ESTADO:
+        return start_date
+    marca = estado_alertas.leer_marca(NOMBRE_ALERTA)
+    abierto = estado_alertas.ambito_abierto_mas_antiguo(NOMBRE_ALERTA)
+    desde = max(start_date, marca) if marca else start_date
+    return min(desde, abierto) if abierto else desde
+
+def consultar() -> pd.DataFrame:
+    """Ejecuta la revisión del mes configurado sobre la lista de comercios."""
+    actualizar_periodo()
+    start_date, end_date = rango_mes(CONFIG_MES['numero'], CONFIG_MES['ano'])
+    desde = inicio_revision(start_date)
+    query, params = construir_query_revision(
+        mes=CONFIG_MES['numero'],
+        ano=CONFIG_MES['ano'],
+        tx_excluidas=TIPOS_TX_A_EXCLUIR,
+        desde=desde
+    )
+    if desde != start_date:
+        print(f"⏩ Revisando desde {desde} (marca de agua / casos abiertos)")
+    df = consultar_con_alcance(
+        CREDENTIALS_DB, [query], IDS_A_VALIDAR,
+        params=params, conexiones=CONEXIONES_PARALELAS,
+        nombres=["margen_revision"]
+    )[0]
+    # Lo evaluado (para marcar resueltos) y la nueva marca, con margen para datos tardíos; la marca
+    # se guarda junto al estado, recién con el correo entregado (ver estado_alertas.registrar_reportados)
+    df.attrs['rango_ambito'] = (desde, end_date)
+    marca = min(end_date, (datetime.now() - timedelta(days=RELECTURA_DIAS)).strftime('%Y-%m-%d'))
+    df.attrs['marca'] = max(marca, start_date)
+    return df
+
+def separar_resultados(df_resultados: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Separa los resultados en (objetivo nulo, objetivo menor a 1)."""
+    df_nulos = df_resultados[df_resultados['objetivo'].isnull()].copy()
+    df_menores_a_uno = df_resultados[df_resultados['objetivo'].notnull()].copy()
+    return df_nulos, df_menores_a_uno
+
+def consultar_multi(meses: List[Tuple[int, int]], grupos: Dict[str, List[str]] = GRUPOS_COMERCIOS) -> pd.DataFrame:
+    """Revisa varios meses y grupos con una consulta agrupada (el alcance se reparte por conexión)."""
+    query, params = construir_query_multi(meses, TIPOS_TX_A_EXCLUIR)
+    return consultar_con_alcance(
+        CREDENTIALS_DB, [query], alcance_por_grupo(grupos),
+        params=params, conexiones=CONEXIONES_PARALELAS,
+        nombres=["margen_revision_multi"]
+    )[0]
 
+def enviar_reporte_multi(df_resultados: pd.DataFrame, meses: List[Tuple[int, int]], por_grupo: bool = False):
+    """Envía un reporte consolidado (columnas Grupo y Mes) o uno por grupo a sus destinatarios."""
+    etiqueta = ", ".join(f"{nombres_meses_es[m - 1]} {a}" for m, a in meses)
+    if not por_grupo:
+        send_alert_email(*separar_resultados(df_resultados), etiqueta_periodo=etiqueta,
+                         asunto=f"🚨 Alerta: Objetivo Inválido Detectado - {etiqueta}")
+        return
+    for grupo, df_grupo in df_resultados.groupby('grupo', sort=True):
+        df_nulos, df_menores = separar_resultados(df_grupo.drop(columns=['grupo']))
+        send_alert_email(df_nulos, df_menores, etiqueta_periodo=f"{etiqueta} ({grupo})",
+                         destinatarios=DESTINATARIOS_GRUPO.get(grupo, DATA_MAIL['recipient']),
+                         asunto=f"🚨 Alerta: Objetivo Inválido Detectado - {grupo} - {etiqueta}")
+
+# Definición de la alerta para el ejecutor unificado (ver ejecutar_alertas.py)
+ALERTA = {
+    'nombre':        NOMBRE_ALERTA,
+    'consultar':     consultar,
+    'separar':       separar_resultados,
+    'enviar':        send_alert_email,
+    'destinatarios': DATA_MAIL['recipient'],
+    'estado':        {'claves': ['id_comercio', 'periodo'], 'ambito': 'periodo'},
+}
+
+@perfilado.perfilar("margen_objetivo_multi")
+def main_multi(meses: List[Tuple[int, int]], por_grupo: bool = False):
+    """Modo multi-mes / multi-grupo: una consulta, separación local y reporte consolidado o por grupo.
+
+    No usa el estado de estado_alertas.py: está pensado para re-chequeos puntuales que reportan todo.
+    """
+    print(f"🚀 Revisión de Objetivo para {len(meses)} meses y {len(GRUPOS_COMERCIOS)} grupos...")
+    try:
+        with perfilado.etapa("consulta"):
+            df_resultados = consultar_multi(meses)
+        if df_resultados.empty:
+            print("✅ ¡Perfecto! No se encontraron registros con Objetivo inválido.")
+            return
+        resumen = df_resultados.groupby(['grupo', 'mes']).size()
+        for (grupo, mes), n in resumen.items():
+            print(f"  - {grupo} {mes}: {n} registros con Objetivo inválido.")
+        with perfilado.etapa("correo"):
+            enviar_reporte_multi(df_resultados, meses, por_grupo=por_grupo)
+    except Exception as e:
+        print(f"❌ Ocurrió un error inesperado durante la ejecución: {e}")
+    finally:
+        print("🏁 Proceso finalizado.")
+
+@perfilado.perfilar("margen_objetivo")
 def main():
     """Función principal que orquesta todo el proceso."""
+    actualizar_periodo()
     print(f"🚀 Iniciando revisión de Objetivo para {CONFIG_MES['nombre']} de {CONFIG_MES['ano']}...")
-    conn = None
     try:
-        conn = connect_db(CREDENTIALS_DB)
-        
-        query = construir_query_revision(
-            mes=CONFIG_MES['numero'],
-            ano=CONFIG_MES['ano'],
-            ids=IDS_A_VALIDAR,
-            tx_excluidas=TIPOS_TX_A_EXCLUIR
-        )
-        
         print("⚙️  Ejecutando consulta en la base de datos...")
-        df_resultados = pd.read_sql(query, conn)
+        with perfilado.etapa("consulta"):
+            df_resultados = consultar()
+        with perfilado.etapa("estado"):
+            df_reporte, resumen, novedades = filtrar_por_estado(ALERTA, df_resultados)
         
-        if not df_resultados.empty:
-            print(f"🚨 ¡Alerta! Se encontraron {len(df_resultados)} registros con Objetivo inválido.")
+        if novedades:
+            print(f"🚨 ¡Alerta! Se encontraron {len(df_reporte)} registros nuevos con Objetivo inválido.")
             
             # Separar el DataFrame en dos según la condición
-            df_nulos = df_resultados[df_resultados['objetivo'].isnull()].copy()
-            df_menores_a_uno = df_resultados[df_resultados['objetivo'].notnull()].copy()
+            df_nulos, df_menores_a_uno = separar_resultados(df_reporte)
             
             # Imprimir resumen
             if not df_nulos.empty:
@@ -197,16 +359,28 @@ def main():
                 print(f"  - {len(df_menores_a_uno)} casos con Objetivo MENOR A 1.")
 
             # Enviar reporte por correo
-            send_alert_email(df_nulos, df_menores_a_uno)
-        else:
+            with perfilado.etapa("correo"), metricas.medir("correo_armado_segundos", correo="margen_objetivo"):
+                futuro = send_alert_email(df_nulos, df_menores_a_uno, resumen_estado=resumen)
+            # El estado se guarda sólo con el correo entregado: si falla, la próxima corrida lo reporta de nuevo
+            futuro.result()
+        elif df_resultados.empty:
             print("✅ ¡Perfecto! No se encontraron registros con Objetivo inválido.")
+        else:
+            print(f"ℹ️  {len(df_resultados)} casos ya informados siguen abiertos; sin novedades.")
+        registrar_reportados(resumen)
 
     except Exception as e:
         print(f"❌ Ocurrió un error inesperado durante la ejecución: {e}")
     finally:
-        if conn:
-            close_db_connection(conn)
         print("🏁 Proceso finalizado.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Revisión de Objetivo inválido por comercio")
+    parser.add_argument("--meses", nargs="+", metavar="AAAA-MM",
+                        help="Revisa varios meses y todos los GRUPOS_COMERCIOS en una sola consulta")
+    parser.add_argument("--por-grupo", action="store_true", help="Con --meses, un correo por grupo")
+    args = parser.parse_args()
+    if args.meses:
+        main_multi([(int(m[5:7]), int(m[:4])) for m in args.meses], por_grupo=args.por_grupo)
+    else:
+        main()
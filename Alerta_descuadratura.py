@@ -4,18 +4,26 @@
 # ═════════════════════════════════════════════════════════════════════════════
 # 1) IMPORTS
 # ═════════════════════════════════════════════════════════════════════════════
-import smtplib
-import psycopg2
+import time
+import sqlite3
+import argparse
 import pandas as pd
-from datetime import datetime
-from typing import Dict, List
-from psycopg2 import OperationalError
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from acceso_datos import conexion, consultar_df
+from tablas_html import tabla_html
+from estado_alertas import filtrar_por_estado, registrar_reportados, resumen_html
+import perfilado
+import metricas
+
+if TYPE_CHECKING:
+    from email.mime.application import MIMEApplication
 
 # ═════════════════════════════════════════════════════════════════════════════
 # 2) CONFIGURACIÓN GENERAL
 # ═════════════════════════════════════════════════════════════════════════════
+# Fecha de la corrida (asunto y nombre de adjuntos); se recalcula en cada consulta, ver actualizar_fecha
 HOY = datetime.now().strftime("%Y-%m-%d")
 
 # Credenciales para la conexión a la base de datos (anonimizadas)
@@ -33,46 +41,89 @@ MAIL_CONFIG: Dict[str, object] = {
     'sender_password': 'your_smtp_password',
     'recipient':       ['user1@yourdomain.com', 'user2@yourdomain.com'],
     'recipient_cc':    [],
-    'subject':         f'ALERTA: Discrepancias detectadas - {HOY}',
+    'subject':         None,  # ver actualizar_fecha
     'cuerpo_intro':    "<p>Estimados,</p><p>Se detectaron diferencias en las validaciones automáticas. A continuación, se detallan las inconsistencias:</p>",
     'cuerpo_cierre':   ("<br><p>Favor revisar la causa de estas diferencias.<br>Saludos,<br>Equipo de Monitoreo.</p><br>"
                         "Nota: Este correo fue generado automáticamente, favor no responder."),
 }
+# Filas que se muestran en el cuerpo; si hay más, el detalle completo va como CSV adjunto
+MAX_FILAS_CORREO = 500
+
+SMTP_CONFIG = {
+    'host': 'smtp.office365.com', 'port': 587, 'remitente': MAIL_CONFIG['sender_email'],
+    'usuario': MAIL_CONFIG['sender_email'], 'password': MAIL_CONFIG['sender_password']
+}
+
+
+def actualizar_fecha() -> str:
+    """Recalcula HOY y el asunto: en el programador el módulo sigue cargado entre corridas."""
+    global HOY
+    HOY = datetime.now().strftime("%Y-%m-%d")
+    MAIL_CONFIG['subject'] = f'ALERTA: Discrepancias detectadas - {HOY}'
+    return HOY
+
+actualizar_fecha()
+
+# -- Reconciliación incremental: agregados por (periodo, fuente) guardados en SQLite local.
+#    Cada corrida consulta sólo los MESES_ABIERTOS más recientes y re-chequea RECHEQUEO_POR_CORRIDA
+#    meses cerrados (los revisados hace más tiempo); la comparación se hace localmente.
+MODO_INCREMENTAL = False
+AGREGADOS_DB = "agregados_descuadratura.sqlite"
+FECHA_INICIO = date(2025, 1, 1)
+MESES_ABIERTOS = 2
+RECHEQUEO_POR_CORRIDA = 1
+
+# -- Declaración de la tabla consolidada y de cada fuente original (tabla, columna de fecha y
+#    expresiones de venta/trx). De aquí se arman SQL_VALIDACION, SQL_AGREGADOS, el modo fan-out y
+#    el drill-down diario; para sumar una fuente basta con declararla aquí.
+CONSOLIDADA = {
+    'tabla': 'your_schema.your_consolidated_table', 'fecha': 'fecha_tx',
+    'venta': 'sum(monto_venta)', 'trx': 'sum(cant_trx)',
+}
+FUENTES: Dict[str, Dict[str, str]] = {
+    'SOURCE_A': {'tabla': 'your_schema.source_a', 'fecha': 'fecha_evento',
+                 'venta': 'round(sum(monto)/1000)', 'trx': 'count(id_tx)'},
+    'SOURCE_B': {'tabla': 'your_schema.source_b', 'fecha': 'fecha_evento',
+                 'venta': 'round(sum(monto)/1000)', 'trx': 'count(id_tx)'},
+}
 
-# Query SQL de validación (placeholder, ajusta según tu caso)
-SQL_VALIDACION = """
-WITH fuente_creada AS (
-    SELECT
-        fuente,
-        to_char(fecha_tx, 'YYYY-MM') AS periodo,
-        sum(monto_venta) AS venta,
-        sum(cant_trx) AS trx
-    FROM your_schema.your_consolidated_table
-    WHERE fecha_tx >= '2025-01-01'::timestamp
-    GROUP BY periodo, fuente
+# -- Fan-out: cada fuente (y la consolidada) se agrega en su propia consulta y conexión, en paralelo
+MODO_FAN_OUT = False
+WORKERS_FUENTES = 6
+
+# -- Drill-down: consultas diarias sólo para los (periodo, fuente) descuadrados, en paralelo
+DRILLDOWN_ACTIVO = True
+WORKERS_DRILLDOWN = 4
+MAX_DRILLDOWN = 24  # tope de (periodo, fuente) a detallar por corrida
+
+# Filtro de una ventana [desde, hasta) sobre la columna de fecha de una tabla declarada
+RANGO_VENTANA = "{fecha} >= %(desde)s::timestamp AND {fecha} < %(hasta)s::timestamp"
+
+# Agregado mensual (fuente, periodo, venta, trx) de una tabla declarada en CONSOLIDADA o FUENTES;
+# lo usan SQL_VALIDACION, SQL_AGREGADOS y el modo fan-out
+def _sql_mensual(decl: Dict[str, str], columna_fuente: str, rango: str, lado: Optional[str] = None,
+                 agrupar: str = "") -> str:
+    col_lado = f"\n    '{lado}' AS lado," if lado else ""
+    return f"""
+SELECT{col_lado}
+    {columna_fuente} AS fuente,
+    to_char({decl['fecha']}, 'YYYY-MM') AS periodo,
+    {decl['venta']} AS venta,
+    {decl['trx']} AS trx
+FROM {decl['tabla']}
+WHERE {rango.format(fecha=decl['fecha'])}
+GROUP BY {agrupar}to_char({decl['fecha']}, 'YYYY-MM')"""
+
+
+def construir_sql_validacion() -> str:
+    """Comparación completa desde FECHA_INICIO: consolidada vs. la unión de FUENTES (FULL OUTER JOIN)."""
+    rango = f"{{fecha}} >= '{FECHA_INICIO:%Y-%m-%d}'::timestamp"
+    creada = _sql_mensual(CONSOLIDADA, "fuente", rango, agrupar="fuente, ")
+    originales = "\n\nUNION ALL\n".join(_sql_mensual(d, f"'{f}'", rango) for f, d in FUENTES.items())
+    return f"""
+WITH fuente_creada AS ({creada}
 ),
-fuentes_originales AS (
-    -- Ejemplo de fuente 1
-    SELECT
-        'SOURCE_A' AS fuente,
-        to_char(fecha_evento, 'yyyy-mm') AS periodo,
-        round(sum(monto)/1000) AS venta,
-        count(id_tx) AS trx
-    FROM your_schema.source_a
-    WHERE fecha_evento >= '2025-01-01'::timestamp
-    GROUP BY to_char(fecha_evento, 'yyyy-mm')
-
-    UNION ALL
-
-    -- Ejemplo de fuente 2
-    SELECT
-        'SOURCE_B' AS fuente,
-        to_char(fecha_evento, 'yyyy-mm') AS periodo,
-        round(sum(monto)/1000) AS venta,
-        count(id_tx) AS trx
-    FROM your_schema.source_b
-    WHERE fecha_evento >= '2025-01-01'::timestamp
-    GROUP BY periodo
+fuentes_originales AS ({originales}
 )
 -- Comparación final
 SELECT
@@ -85,100 +136,368 @@ SELECT
     (COALESCE(o.venta, 0) - COALESCE(c.venta, 0)) AS diferencia_venta,
     (COALESCE(o.trx, 0) - COALESCE(c.trx, 0)) AS diferencia_trx
 FROM fuente_creada c
-FULL OUTER JOIN fuentes_originales o 
+FULL OUTER JOIN fuentes_originales o
     ON c.periodo = o.periodo AND c.fuente = o.fuente
 WHERE (COALESCE(o.trx, 0) - COALESCE(c.trx, 0)) <> 0
 ORDER BY periodo, fuente;
 """
 
+
+def construir_sql_agregados() -> str:
+    """Agregados de ambos lados para una ventana [desde, hasta); la comparación se hace en pandas."""
+    partes = [_sql_mensual(CONSOLIDADA, "fuente", RANGO_VENTANA, lado='creada', agrupar="fuente, ")]
+    partes += [_sql_mensual(d, f"'{f}'", RANGO_VENTANA, lado='original') for f, d in FUENTES.items()]
+    return "\n\nUNION ALL\n".join(partes) + ";\n"
+
+
+SQL_VALIDACION = construir_sql_validacion()
+SQL_AGREGADOS = construir_sql_agregados()
+
+# Agregado diario de una tabla declarada (CONSOLIDADA o FUENTES) para un mes
+PLANTILLA_DIARIA = """
+SELECT
+    to_char({fecha}, 'YYYY-MM-DD') AS dia,
+    {venta} AS venta,
+    {trx} AS trx
+FROM {tabla}
+WHERE {fecha} >= %(desde)s::timestamp AND {fecha} < %(hasta)s::timestamp{filtro}
+GROUP BY to_char({fecha}, 'YYYY-MM-DD');
+"""
+
 # ═════════════════════════════════════════════════════════════════════════════
 # 3) UTILIDADES – DB & CORREO
 # ═════════════════════════════════════════════════════════════════════════════
 
-def connect_db(cfg):
-    """Conecta a Amazon Redshift y devuelve (conn, cursor)."""
-    try:
-        conn = psycopg2.connect(**cfg)
-        print("✓ Conectado a Redshift")
-        return conn, conn.cursor()
-    except OperationalError as e:
-        raise SystemExit(f"❌ No se pudo conectar: {e.pgerror or e}")
-
-def query_df(conn, sql) -> pd.DataFrame:
-    """Ejecuta una consulta SQL y la devuelve como DataFrame."""
-    return pd.read_sql(sql, conn)
-
-def close_db(conn, cur):
-    if cur:  cur.close()
-    if conn: conn.close(); print("✓ Conexión a Redshift cerrada.")
-
-def dataframe_to_html(df: pd.DataFrame) -> str:
-    """Convierte un DataFrame de pandas a una tabla HTML con estilos."""
-    header_style = "background:#002B49; color:#fff; padding:8px; border:1px solid #ddd; text-align:left;"
-    cell_style = "padding:8px; border:1px solid #ddd; text-align:left;"
-    
-    html = '<table style="border-collapse:collapse; width:100%; font-family:Arial,sans-serif;">'
-    html += '<thead><tr>'
-    for col in df.columns:
-        html += f'<th style="{header_style}">{col}</th>'
-    html += '</tr></thead><tbody>'
-    for i, row in df.iterrows():
-        bg = "#f9f9f9" if i % 2 == 0 else "#ffffff"
-        html += f'<tr style="background:{bg}">'
-        for col in df.columns:
-            html += f'<td style="{cell_style}">{row[col]}</td>'
-        html += '</tr>'
-    html += '</tbody></table>'
-    return html
-
-def build_and_send_mail(df_alertas: pd.DataFrame):
-    """Construye y envía el correo de alerta."""
-    msg = MIMEMultipart("related")
+def _adjunto_csv(df: pd.DataFrame, nombre: str) -> "MIMEApplication":
+    from email.mime.application import MIMEApplication
+    adjunto = MIMEApplication(df.to_csv(index=False).encode("utf-8"), Name=nombre)
+    adjunto.add_header("Content-Disposition", "attachment", filename=nombre)
+    return adjunto
+
+def build_and_send_mail(df_alertas: pd.DataFrame, df_detalle: Optional[pd.DataFrame] = None,
+                        resumen_estado: Optional[Dict] = None):
+    """Construye y encola el correo de alerta (con el detalle diario adjunto si existe); retorna el Future del envío."""
+    # Imports diferidos: en una corrida sin descuadres no se cargan los módulos de correo
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    from envio_correos import encolar
+
+    msg = MIMEMultipart("mixed")
     msg["From"] = MAIL_CONFIG["sender_email"]
     msg["To"] = ", ".join(MAIL_CONFIG["recipient"])
     if MAIL_CONFIG["recipient_cc"]:
         msg["Cc"] = ", ".join(MAIL_CONFIG["recipient_cc"])
     msg["Subject"] = MAIL_CONFIG["subject"]
 
-    # Cuerpo del correo en HTML
-    tabla_html = dataframe_to_html(df_alertas)
-    cuerpo_html = MAIL_CONFIG["cuerpo_intro"] + tabla_html + MAIL_CONFIG["cuerpo_cierre"]
+    # Cuerpo del correo en HTML (con tope de filas; el resto va en el adjunto)
+    tabla = tabla_html(df_alertas, miles=True, max_filas=MAX_FILAS_CORREO)
+    nota_detalle = ""
+    if df_detalle is not None and not df_detalle.empty:
+        nota_detalle = (f"<p>Se adjunta el detalle diario: {len(df_detalle)} días con diferencias "
+                        f"en {df_detalle[['periodo', 'fuente']].drop_duplicates().shape[0]} periodos/fuentes.</p>")
+    cuerpo_html = (MAIL_CONFIG["cuerpo_intro"] + resumen_html(resumen_estado) + tabla + nota_detalle
+                   + MAIL_CONFIG["cuerpo_cierre"])
     msg.attach(MIMEText(cuerpo_html, "html", "utf-8"))
+    if len(df_alertas) > MAX_FILAS_CORREO:
+        msg.attach(_adjunto_csv(df_alertas, f"descuadres_{HOY}.csv"))
+    if nota_detalle:
+        msg.attach(_adjunto_csv(df_detalle, f"descuadres_diarios_{HOY}.csv"))
 
     recip_all = MAIL_CONFIG["recipient"] + MAIL_CONFIG["recipient_cc"]
+    # El envío ocurre en segundo plano (ver envio_correos.py)
+    futuro = encolar(SMTP_CONFIG, msg, recip_all)
+    print(f"📨 Correo de alerta encolado para: {', '.join(recip_all)}")
+    return futuro
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 4) RECONCILIACIÓN INCREMENTAL
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _mes_siguiente(d: date) -> date:
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def _mes_anterior(d: date) -> date:
+    return date(d.year - (d.month == 1), (d.month - 2) % 12 + 1, 1)
+
+
+def _inicio_mes(periodo: str) -> date:
+    ano, mes = periodo.split("-")
+    return date(int(ano), int(mes), 1)
+
+
+def _abrir_agregados() -> sqlite3.Connection:
+    db = sqlite3.connect(AGREGADOS_DB)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS agregados (
+            lado TEXT, fuente TEXT, periodo TEXT, venta REAL, trx REAL,
+            PRIMARY KEY (lado, fuente, periodo)
+        )
+    """)
+    db.execute("CREATE TABLE IF NOT EXISTS periodos (periodo TEXT PRIMARY KEY, actualizado TEXT)")
+    return db
+
+
+def ventanas_a_consultar(db: sqlite3.Connection, hoy: Optional[date] = None,
+                         reconstruir: bool = False) -> List[Tuple[date, date]]:
+    """Ventanas [desde, hasta) a traer: meses abiertos + re-chequeo de los cerrados más antiguos.
+
+    Con el almacén vacío (o `reconstruir`) se trae todo desde FECHA_INICIO. Si la última corrida
+    quedó atrás (p. ej. un mes sin correr), la ventana abierta parte en el mes siguiente al último
+    guardado, para no dejar meses sin traer.
+    """
+    hoy = hoy or date.today()
+    fin = _mes_siguiente(hoy)
+    ultimo = db.execute("SELECT MAX(periodo) FROM periodos").fetchone()[0]
+    if reconstruir or ultimo is None:
+        return [(FECHA_INICIO, fin)]
+
+    desde_abierto = date(hoy.year, hoy.month, 1)
+    for _ in range(MESES_ABIERTOS - 1):
+        desde_abierto = _mes_anterior(desde_abierto)
+    desde_abierto = min(desde_abierto, _mes_siguiente(_inicio_mes(ultimo)))
+    ventanas = [(max(desde_abierto, FECHA_INICIO), fin)]
+
+    cerrados = db.execute(
+        "SELECT periodo FROM periodos WHERE periodo < ? ORDER BY actualizado, periodo LIMIT ?",
+        (desde_abierto.strftime("%Y-%m"), RECHEQUEO_POR_CORRIDA)
+    ).fetchall()
+    for (periodo,) in cerrados:
+        inicio = _inicio_mes(periodo)
+        ventanas.append((inicio, _mes_siguiente(inicio)))
+    return ventanas
+
+
+def guardar_agregados(db: sqlite3.Connection, df: pd.DataFrame, desde: date, hasta: date) -> None:
+    """Reemplaza en el almacén los agregados de la ventana (lo que desapareció se borra)."""
+    p_desde, p_hasta = desde.strftime("%Y-%m"), hasta.strftime("%Y-%m")
+    ahora = datetime.now().isoformat(timespec="seconds")
+    with db:
+        db.execute("DELETE FROM agregados WHERE periodo >= ? AND periodo < ?", (p_desde, p_hasta))
+        db.executemany(
+            "INSERT INTO agregados VALUES (?, ?, ?, ?, ?)",
+            [(r.lado, r.fuente, r.periodo, float(r.venta or 0), float(r.trx or 0)) for r in df.itertuples()]
+        )
+        periodos = []
+        d = desde
+        while d < hasta:
+            periodos.append((d.strftime("%Y-%m"), ahora))
+            d = _mes_siguiente(d)
+        db.executemany("INSERT OR REPLACE INTO periodos VALUES (?, ?)", periodos)
+
+
+def comparar(creada: pd.DataFrame, original: pd.DataFrame, claves: List[str]) -> pd.DataFrame:
+    """Outer join de ambos lados por `claves`; retorna sólo las filas con diferencia de trx."""
+    df = creada.merge(original, on=claves, how='outer', suffixes=('_creada', '_original'))
+    for col in ('venta_creada', 'trx_creada', 'venta_original', 'trx_original'):
+        df[col] = df[col].fillna(0).astype(float)
+    df['diferencia_venta'] = df['venta_original'] - df['venta_creada']
+    df['diferencia_trx'] = df['trx_original'] - df['trx_creada']
+    df = df[df['diferencia_trx'] != 0]
+    return df.sort_values(claves).reset_index(drop=True)[claves + [
+        'venta_creada', 'trx_creada', 'venta_original', 'trx_original',
+        'diferencia_venta', 'diferencia_trx'
+    ]]
+
+
+def comparar_agregados(agregados: pd.DataFrame) -> pd.DataFrame:
+    """Equivalente local del FULL OUTER JOIN de SQL_VALIDACION."""
+    cols = ['periodo', 'fuente', 'venta', 'trx']
+    return comparar(
+        agregados[agregados['lado'] == 'creada'][cols],
+        agregados[agregados['lado'] == 'original'][cols],
+        ['periodo', 'fuente'],
+    )
+
+
+def traer_agregados(desde: date, hasta: date, fan_out: bool = False) -> pd.DataFrame:
+    """Agregados (lado, fuente, periodo, venta, trx) de la ventana, en una consulta o en fan-out."""
+    if fan_out:
+        return agregados_por_fuente(desde, hasta)
+    with conexion(DB_CONFIG) as conn:
+        return consultar_df(conn, SQL_AGREGADOS, params={'desde': desde, 'hasta': hasta},
+                            nombre="descuadratura_agregados")
+
+
+def consultar_incremental(reconstruir: bool = False, fan_out: bool = False) -> pd.DataFrame:
+    """Actualiza el almacén con las ventanas necesarias y compara todo el historial localmente."""
+    db = _abrir_agregados()
     try:
-        with smtplib.SMTP("smtp.office365.com", 587) as srv:
-            srv.starttls()
-            srv.login(MAIL_CONFIG["sender_email"], MAIL_CONFIG["sender_password"])
-            srv.sendmail(MAIL_CONFIG["sender_email"], recip_all, msg.as_string())
-        print(f"✉️  Correo de alerta enviado a: {', '.join(recip_all)}")
+        ventanas = ventanas_a_consultar(db, reconstruir=reconstruir)
+        for desde, hasta in ventanas:
+            df = traer_agregados(desde, hasta, fan_out=fan_out)
+            guardar_agregados(db, df, desde, hasta)
+            print(f"✓ Agregados {desde:%Y-%m} a {hasta:%Y-%m} (excl.): {len(df)} filas")
+        agregados = pd.read_sql("SELECT lado, fuente, periodo, venta, trx FROM agregados", db)
+    finally:
+        db.close()
+    return comparar_agregados(agregados)
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 5) AGREGADOS POR FUENTE EN PARALELO (FAN-OUT)
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _consulta_mensual(fuente: Optional[str], desde: date, hasta: date) -> Tuple[pd.DataFrame, float]:
+    """Agregado mensual de la consolidada (`fuente` None) o de una fuente declarada; retorna (df, segundos)."""
+    params = {'desde': desde, 'hasta': hasta}
+    if fuente is None:
+        sql = _sql_mensual(CONSOLIDADA, "fuente", RANGO_VENTANA, agrupar="fuente, ") + ";\n"
+        nombre, lado = "descuadratura_mensual_creada", 'creada'
+    else:
+        sql = _sql_mensual(FUENTES[fuente], "%(fuente)s", RANGO_VENTANA) + ";\n"
+        params['fuente'] = fuente
+        nombre, lado = "descuadratura_mensual_original", 'original'
+    t0 = time.perf_counter()
+    with conexion(DB_CONFIG) as conn:
+        df = consultar_df(conn, sql, params=params, nombre=nombre)
+    df.insert(0, 'lado', lado)
+    return df, time.perf_counter() - t0
+
+
+def agregados_por_fuente(desde: date, hasta: date, workers: int = WORKERS_FUENTES) -> pd.DataFrame:
+    """Trae la consolidada y cada fuente de FUENTES en consultas paralelas (una conexión cada una).
+
+    Retorna las mismas columnas que SQL_AGREGADOS e imprime el tiempo de cada fuente.
+    """
+    tareas: List[Optional[str]] = [None] + list(FUENTES)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tareas)))) as pool:
+        resultados = list(pool.map(lambda f: _consulta_mensual(f, desde, hasta), tareas))
+
+    tiempos = sorted(((f or 'CONSOLIDADA', seg, len(df)) for f, (df, seg) in zip(tareas, resultados)),
+                     key=lambda x: -x[1])
+    for nombre, seg, filas in tiempos:
+        print(f"   ⏱️  {nombre:<20} {seg:7.2f}s  {filas:>6} filas")
+    return pd.concat([df for df, _ in resultados], ignore_index=True)[['lado', 'fuente', 'periodo', 'venta', 'trx']]
+
+
+def consultar_fan_out() -> pd.DataFrame:
+    """Reconciliación completa desde FECHA_INICIO con una consulta por fuente y el cruce en pandas."""
+    print(f"⚙️  Fan-out: consolidada + {len(FUENTES)} fuentes en paralelo...")
+    agregados = agregados_por_fuente(FECHA_INICIO, _mes_siguiente(date.today()))
+    return comparar_agregados(agregados)
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 6) DRILL-DOWN DIARIO
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _consulta_diaria(periodo: str, fuente: str, lado: str) -> pd.DataFrame:
+    """Agregado diario de un lado (creada u original) para un mes y una fuente."""
+    desde = _inicio_mes(periodo)
+    params = {'desde': desde, 'hasta': _mes_siguiente(desde)}
+    if lado == 'creada':
+        decl, filtro = CONSOLIDADA, " AND fuente = %(fuente)s"
+        params['fuente'] = fuente
+    else:
+        decl, filtro = FUENTES[fuente], ""
+    sql = PLANTILLA_DIARIA.format(filtro=filtro, **decl)
+    with conexion(DB_CONFIG) as conn:
+        return consultar_df(conn, sql, params=params, nombre=f"descuadratura_diario_{lado}")
+
+
+def drilldown_diario(df_alertas: pd.DataFrame, workers: int = WORKERS_DRILLDOWN) -> pd.DataFrame:
+    """Para cada (periodo, fuente) descuadrado consulta ambos lados por día, en paralelo.
+
+    Retorna los días con diferencia de trx (mismas columnas que la alerta + `dia`).
+    """
+    pares = df_alertas[['periodo', 'fuente']].drop_duplicates().head(MAX_DRILLDOWN)
+    if len(df_alertas[['periodo', 'fuente']].drop_duplicates()) > MAX_DRILLDOWN:
+        print(f"[WARN] Drill-down acotado a {MAX_DRILLDOWN} periodos/fuentes")
+    tareas = [(p, f, 'creada') for p, f in pares.itertuples(index=False)]
+    # Si la fuente no está declarada, el lado original cuenta como cero
+    tareas += [(p, f, 'original') for p, f in pares.itertuples(index=False) if f in FUENTES]
+    if not tareas:
+        return pd.DataFrame()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tareas)))) as pool:
+        resultados = dict(zip(tareas, pool.map(lambda t: _consulta_diaria(*t), tareas)))
+
+    vacio = pd.DataFrame(columns=['dia', 'venta', 'trx'])
+    partes = []
+    for p, f in pares.itertuples(index=False):
+        detalle = comparar(resultados[(p, f, 'creada')], resultados.get((p, f, 'original'), vacio), ['dia'])
+        detalle.insert(0, 'fuente', f)
+        detalle.insert(0, 'periodo', p)
+        partes.append(detalle)
+    df = pd.concat(partes, ignore_index=True)
+    print(f"🔎 Drill-down: {len(tareas)} consultas diarias, {len(df)} días con diferencias")
+    return df
+
+
+def separar_con_detalle(df_alertas: pd.DataFrame) -> Tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+    """Agrega el drill-down diario (si está activo) a los argumentos del correo."""
+    if not DRILLDOWN_ACTIVO:
+        return df_alertas, None
+    try:
+        return df_alertas, drilldown_diario(df_alertas)
     except Exception as e:
-        print(f"❌ Error al enviar el correo: {e}")
+        # El detalle es complementario: si falla, la alerta mensual sale igual
+        print(f"[WARN] Falló el drill-down diario: {e}")
+        return df_alertas, None
 
 # ═════════════════════════════════════════════════════════════════════════════
-# 4) FUNCIÓN PRINCIPAL
+# 7) FUNCIÓN PRINCIPAL
 # ═════════════════════════════════════════════════════════════════════════════
-def main():
+def consultar(incremental: Optional[bool] = None, reconstruir: bool = False,
+              fan_out: Optional[bool] = None) -> pd.DataFrame:
+    """Ejecuta la validación (completa o incremental, en una consulta o por fuente) y retorna los descuadres."""
+    actualizar_fecha()
+    if incremental is None:
+        incremental = MODO_INCREMENTAL
+    if fan_out is None:
+        fan_out = MODO_FAN_OUT
+    if incremental:
+        return consultar_incremental(reconstruir=reconstruir, fan_out=fan_out)
+    if fan_out:
+        return consultar_fan_out()
+    with conexion(DB_CONFIG) as conn:
+        return consultar_df(conn, SQL_VALIDACION, nombre="descuadratura_validacion")
+
+# Definición de la alerta para el ejecutor unificado (ver ejecutar_alertas.py)
+ALERTA = {
+    'nombre':        'descuadratura',
+    'consultar':     consultar,
+    'separar':       separar_con_detalle,
+    'enviar':        build_and_send_mail,
+    'destinatarios': MAIL_CONFIG['recipient'] + MAIL_CONFIG['recipient_cc'],
+    'estado':        {'claves': ['periodo', 'fuente'], 'ambito': 'periodo'},
+}
+
+@perfilado.perfilar("descuadratura")
+def main(incremental: Optional[bool] = None, reconstruir: bool = False, fan_out: Optional[bool] = None):
     """Función principal que orquesta la validación y el envío de alertas."""
-    conn, cur = None, None
     try:
-        conn, cur = connect_db(DB_CONFIG)
         print("⚙️  Ejecutando consulta de validación...")
-        df_alertas = query_df(conn, SQL_VALIDACION)
+        with perfilado.etapa("consulta"):
+            df_alertas = consultar(incremental=incremental, reconstruir=reconstruir, fan_out=fan_out)
 
-        if not df_alertas.empty:
-            print(f"⚠️  ¡Alerta! Se encontraron {len(df_alertas)} registros con diferencias.")
-            build_and_send_mail(df_alertas)
-        else:
+        with perfilado.etapa("estado"):
+            df_reporte, resumen, novedades = filtrar_por_estado(ALERTA, df_alertas)
+        if novedades:
+            print(f"⚠️  ¡Alerta! Se encontraron {len(df_reporte)} registros con diferencias.")
+            with perfilado.etapa("drilldown"):
+                df_reporte, df_detalle = separar_con_detalle(df_reporte)
+            with perfilado.etapa("correo"), metricas.medir("correo_armado_segundos", correo="descuadratura"):
+                futuro = build_and_send_mail(df_reporte, df_detalle, resumen_estado=resumen)
+            # El estado se guarda sólo con el correo entregado: si falla, la próxima corrida lo reporta de nuevo
+            futuro.result()
+        elif df_alertas.empty:
             print("✅ No se encontraron discrepancias. Todo OK.")
+        else:
+            print(f"ℹ️  {len(df_alertas)} diferencias ya informadas siguen abiertas; sin novedades.")
+        registrar_reportados(resumen)
     except Exception as e:
         print(f"❌ Ocurrió un error inesperado en el proceso: {e}")
-    finally:
-        if conn:
-            close_db(conn, cur)
 
 # ═════════════════════════════════════════════════════════════════════════════
-# 5) PUNTO DE ENTRADA
+# 8) PUNTO DE ENTRADA
 # ═════════════════════════════════════════════════════════════════════════════
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Alerta de descuadres entre la fuente creada y las originales")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Consulta sólo meses abiertos + re-chequeo y compara contra el almacén local")
+    parser.add_argument("--reconstruir", action="store_true",
+                        help="Con --incremental, vuelve a traer todo el historial desde FECHA_INICIO")
+    parser.add_argument("--fan-out", action="store_true",
+                        help="Una consulta por fuente en conexiones paralelas; el cruce se hace localmente")
+    args = parser.parse_args()
+    main(incremental=args.incremental or None, reconstruir=args.reconstruir, fan_out=args.fan_out or None)
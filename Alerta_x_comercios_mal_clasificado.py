@@ -1,15 +1,25 @@
 #El objetivo de este script es revisar la clasificación de comercios en una base de datos Redshift,
 # identificar aquellos que están mal clasificados y enviar un correo de alerta con los detalles.
+# Los valores esperados se declaran por lista de comercios (REGLAS_LISTAS) y sólo se traen desde la base
+# los comercios cuyas filas de segmentación cambiaron desde la corrida anterior (huella MD5 guardada localmente).
+# Un comercio puede tener varias filas distintas en segmentación: se evalúan (y se informan) todas.
 # -*- coding: utf-8 -*-
 # ═════════════════════════════════════════════════════════════════════════════
 # 1) IMPORTS Y CONFIGURACIÓN INICIAL
 # ═════════════════════════════════════════════════════════════════════════════
-import smtplib
-import psycopg2
+import hashlib
+import sqlite3
+import argparse
 import pandas as pd
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from typing import Dict
+from datetime import datetime, timedelta
+from psycopg2.extras import execute_values
+from typing import Dict, List, Optional
+from alcance_comercios import TABLA_ALCANCE, alcance_por_grupo, cargar_alcance
+from acceso_datos import conexion, consultar_df
+from tablas_html import tabla_html
+from estado_alertas import filtrar_por_estado, registrar_reportados, resumen_html
+import perfilado
+import metricas
 
 # -- Credenciales DB (usar variables de entorno en un entorno real)
 CREDENTIALS_DB = {
@@ -27,95 +37,160 @@ DATA_MAIL = {
     'recipient': ['recipient1@example.com', 'recipient2@example.com'],
     'subject': "🚨 Alerta: Comercios Mal Clasificados Detectados"
 }
+SMTP_CONFIG = {
+    'host': 'smtp.office365.com', 'port': 587, 'remitente': DATA_MAIL['sender_email'],
+    'usuario': DATA_MAIL['sender_email'], 'password': DATA_MAIL['sender_password']
+}
 
 # ═════════════════════════════════════════════════════════════════════════════
-# 2) CONSULTA SQL PARA LA VALIDACIÓN
+# 2) REGLAS Y CONSULTA SQL
 # ═════════════════════════════════════════════════════════════════════════════
 
-QUERY_VALIDACION = """
+# Clasificación que deben tener todos los comercios de la lista principal
+CLASIFICACION_ESPERADA = 'Clasificación Correcta Esperada'
+
+# -- Lista principal de comercios. None = usar la tabla schema_auxiliar.lista_comercios.
+LISTA_COMERCIOS: Optional[List[str]] = None
+
+# -- Reglas por lista de comercios: 'comercios' (lista de RUT; si es None se usa 'tabla', con columna
+#    rut_comercio, vía la copia local de listas) y los valores 'esperado' por columna de segmentación. Una columna omitida (o None) no se revisa.
+#    Un comercio puede estar en varias listas; se evalúa contra las reglas de cada una.
+COLUMNAS_SEGMENTACION = ['clasificacion_final', 'ceco_final', 'segmentacion_final', 'segmentacion_final_general']
+
+REGLAS_LISTAS: Dict[str, Dict] = {
+    'principal': {
+        'comercios': LISTA_COMERCIOS,
+        'tabla':     'schema_auxiliar.lista_comercios',
+        'esperado':  {'clasificacion_final': CLASIFICACION_ESPERADA},
+    },
+    # 'grandes_cuentas': {
+    #     'comercios': ['76.123.456-7', '96.765.432-1'],
+    #     'esperado':  {'clasificacion_final': 'GRANDES CUENTAS', 'ceco_final': '00000',
+    #                   'segmentacion_final': 'SEGMENTO X', 'segmentacion_final_general': 'GENERAL'},
+    # },
+}
+
+# -- Filas de segmentación vistas por comercio (SQLite local). Sólo se traen desde Redshift los
+#    comercios cuyo conjunto de filas cambió; el resto se evalúa con la copia local.
+CACHE_SEGMENTACION = "segmentacion_clasificacion.sqlite"
+TABLA_HUELLAS = "tmp_huellas_segmentacion"
+
+# -- Las listas definidas por 'tabla' se leen de Redshift a lo más una vez cada VIGENCIA_LISTAS_H horas y
+#    se guardan en la copia local; el resto de las corridas las sube desde ahí a la tabla temporal de
+#    alcance, sin tocar la tabla persistente. --recargar fuerza la relectura.
+VIGENCIA_LISTAS_H = 24
+
+# Huella de cada fila calculada en el servidor; la del comercio es el MD5 de las huellas de sus filas
+# ordenadas y separadas por coma (ver `huellas_por_comercio`, que la reproduce sobre la copia local)
+EXPR_HUELLA = "MD5(" + " || '|' || ".join(
+    f"COALESCE(sc.{c}::VARCHAR, '')" for c in COLUMNAS_SEGMENTACION
+) + ")"
+
+QUERY_CAMBIOS = f"""
+    WITH filas AS (
+        SELECT DISTINCT
+            sc.rut_comercio,
+            sc.clasificacion_final,
+            sc.ceco_final,
+            sc.segmentacion_final,
+            sc.segmentacion_final_general,
+            {EXPR_HUELLA} AS huella
+        FROM
+            schema_clientes.segmentacion sc
+        JOIN
+            (SELECT DISTINCT id_comercio FROM {TABLA_ALCANCE}) lc
+            ON sc.rut_comercio = lc.id_comercio
+    ),
+    por_comercio AS (
+        SELECT
+            rut_comercio,
+            MD5(LISTAGG(huella, ',') WITHIN GROUP (ORDER BY huella)) AS huella
+        FROM
+            filas
+        GROUP BY
+            rut_comercio
+    )
     SELECT
-        sc.rut_comercio,
-        sc.clasificacion_final,
-        sc.ceco_final,
-        sc.segmentacion_final,
-        sc.segmentacion_final_general
+        f.rut_comercio,
+        f.clasificacion_final,
+        f.ceco_final,
+        f.segmentacion_final,
+        f.segmentacion_final_general,
+        f.huella
     FROM
-        schema_clientes.segmentacion sc
+        filas f
+    JOIN
+        por_comercio p
+        ON p.rut_comercio = f.rut_comercio
     LEFT JOIN
-        schema_auxiliar.lista_comercios lc 
-        ON sc.rut_comercio = lc.rut_comercio
+        {TABLA_HUELLAS} h
+        ON h.rut_comercio = f.rut_comercio
     WHERE
-        lc.rut_comercio IS NOT NULL
-    AND
-        sc.clasificacion_final <> 'Clasificación Correcta Esperada'
-    GROUP BY
-        sc.rut_comercio,
-        sc.clasificacion_final,
-        sc.ceco_final,
-        sc.segmentacion_final,
-        sc.segmentacion_final_general
-    ORDER BY
-        sc.rut_comercio;
+        h.huella IS NULL OR h.huella <> p.huella;
 """
 
+QUERY_LISTAS = f"SELECT DISTINCT id_comercio AS rut_comercio, grupo AS lista FROM {TABLA_ALCANCE};"
+
 # ═════════════════════════════════════════════════════════════════════════════
 # 3) FUNCIONES DE UTILIDAD
 # ═════════════════════════════════════════════════════════════════════════════
 
-def connect_db(credentials: Dict) -> psycopg2.extensions.connection:
-    """Establece conexión con la base de datos Redshift."""
-    try:
-        conn = psycopg2.connect(**credentials)
-        print("✓ Conexión exitosa a la base de datos.")
-        return conn
-    except psycopg2.OperationalError as e:
-        raise SystemExit(f"❌ Error fatal al conectar a la base de datos: {e}")
-
-def close_db_connection(connection: psycopg2.extensions.connection):
-    """Cierra la conexión a la base de datos."""
-    if connection:
-        connection.close()
-        print("✓ Conexión a la base de datos cerrada.")
-
-def send_alert_email(df_incorrectos: pd.DataFrame):
+NOMBRES_COLUMNAS = {
+    'lista': 'Lista',
+    'rut_comercio': 'RUT Comercio',
+    'clasificacion_final': 'Clasificación Final',
+    'ceco_final': 'CECO Final',
+    'segmentacion_final': 'Segmentación Final',
+    'segmentacion_final_general': 'Segmentación General',
+    'campos_incorrectos': 'Campos Incorrectos',
+}
+
+
+def tabla_reglas(reglas: Dict[str, Dict] = REGLAS_LISTAS) -> pd.DataFrame:
+    """Una fila por lista con sus valores esperados (None en las columnas que no se revisan)."""
+    return pd.DataFrame(
+        [{'lista': lista, **{c: regla['esperado'].get(c) for c in COLUMNAS_SEGMENTACION}}
+         for lista, regla in reglas.items()],
+        columns=['lista'] + COLUMNAS_SEGMENTACION
+    )
+
+
+def send_alert_email(df_incorrectos: pd.DataFrame, resumen_estado: Optional[Dict] = None):
     """
-    Envía un correo de alerta mostrando los comercios incorrectos
-    y luego la configuración correcta esperada.
+    Encola un correo de alerta mostrando los comercios incorrectos
+    y luego la configuración esperada de cada lista involucrada; retorna el Future del envío.
     """
+    # Imports diferidos: en una corrida sin hallazgos no se cargan los módulos de correo
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    from envio_correos import encolar
+
     msg = MIMEMultipart("related")
     msg["From"] = DATA_MAIL["sender_email"]
     msg["To"] = ", ".join(DATA_MAIL["recipient"])
     msg["Subject"] = DATA_MAIL["subject"]
 
     # --- TABLA 1: Comercios con datos incorrectos ---
-    df_reporte_incorrectos = df_incorrectos.rename(columns={
-        'rut_comercio': 'RUT Comercio',
-        'clasificacion_final': 'Clasificación Final',
-        'ceco_final': 'CECO Final',
-        'segmentacion_final': 'Segmentación Final',
-        'segmentacion_final_general': 'Segmentación General'
-    })
-
-    # --- TABLA 2: Configuración esperada ---
-    datos_correctos = {
-        'Clasificación Final': ['Clasificación Correcta Esperada'],
-        'CECO Final': [00000],
-        'Segmentación Final': ['SEGMENTO X'],
-        'Segmentación General': ['GENERAL']
-    }
-    df_reporte_correctos = pd.DataFrame(datos_correctos)
+    df_reporte_incorrectos = df_incorrectos.rename(columns=NOMBRES_COLUMNAS)
+
+    # --- TABLA 2: Configuración esperada (desde REGLAS_LISTAS) ---
+    reglas = tabla_reglas()
+    if 'lista' in df_incorrectos.columns:
+        reglas = reglas[reglas['lista'].isin(df_incorrectos['lista'])]
+    df_reporte_correctos = reglas.rename(columns=NOMBRES_COLUMNAS)
 
     # --- Cuerpo del Correo ---
     cuerpo_html = f"""
     <p>Estimados,</p>
     <p>Se han detectado comercios que presentan una clasificación incorrecta.</p>
+    {resumen_html(resumen_estado)}
     <hr>
     <h3>Casos Detectados con Clasificación Incorrecta ❌</h3>
-    {df_reporte_incorrectos.to_html(index=False, border=0)}
+    {tabla_html(df_reporte_incorrectos)}
     <br>
     <hr>
     <h3>Configuración Correcta Esperada ✅</h3>
-    {df_reporte_correctos.to_html(index=False, border=0)}
+    {tabla_html(df_reporte_correctos, na_rep='(no se revisa)')}
     <br>
     <hr>
     <p>Se recomienda revisar y corregir la clasificación de los comercios listados.</p>
@@ -124,41 +199,230 @@ def send_alert_email(df_incorrectos: pd.DataFrame):
     
     msg.attach(MIMEText(cuerpo_html, "html", "utf-8"))
     
+    # El envío ocurre en segundo plano (ver envio_correos.py)
+    futuro = encolar(SMTP_CONFIG, msg, DATA_MAIL["recipient"])
+    print(f"📨 Correo de alerta encolado para: {', '.join(DATA_MAIL['recipient'])}")
+    return futuro
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 4) CAMBIOS DE SEGMENTACIÓN Y EVALUACIÓN DE REGLAS
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _abrir_cache() -> sqlite3.Connection:
+    db = sqlite3.connect(CACHE_SEGMENTACION, timeout=30)
+    # Formato anterior (una sola fila por comercio); se descarta y la próxima corrida trae todo
+    db.execute("DROP TABLE IF EXISTS segmentacion")
+    db.execute(f"""
+        CREATE TABLE IF NOT EXISTS filas_segmentacion (
+            rut_comercio TEXT, {', '.join(f'{c} TEXT' for c in COLUMNAS_SEGMENTACION)},
+            huella TEXT, actualizado TEXT, PRIMARY KEY (rut_comercio, huella)
+        )
+    """)
+    db.execute("CREATE TABLE IF NOT EXISTS listas (lista TEXT, rut_comercio TEXT, PRIMARY KEY (lista, rut_comercio))")
+    db.execute("CREATE TABLE IF NOT EXISTS listas_leidas (lista TEXT PRIMARY KEY, tabla TEXT, leido TEXT)")
+    return db
+
+
+def leer_cache() -> pd.DataFrame:
+    """Filas de segmentación vistas por comercio (con la huella de cada fila)."""
+    db = _abrir_cache()
     try:
-        with smtplib.SMTP("smtp.office365.com", 587) as srv:
-            srv.starttls()
-            srv.login(DATA_MAIL["sender_email"], DATA_MAIL["sender_password"])
-            srv.sendmail(DATA_MAIL["sender_email"], DATA_MAIL["recipient"], msg.as_string())
-        print(f"✉️ Correo de alerta enviado exitosamente a: {', '.join(DATA_MAIL['recipient'])}")
-    except Exception as e:
-        print(f"❌ Error al enviar el correo: {e}")
+        return pd.read_sql_query(
+            f"SELECT rut_comercio, {', '.join(COLUMNAS_SEGMENTACION)}, huella FROM filas_segmentacion", db
+        )
+    finally:
+        db.close()
+
+
+def huellas_por_comercio(cache: pd.DataFrame) -> pd.DataFrame:
+    """Huella del conjunto de filas de cada comercio, igual a la que calcula QUERY_CAMBIOS."""
+    if cache.empty:
+        return pd.DataFrame(columns=['rut_comercio', 'huella'])
+    return (cache.groupby('rut_comercio')['huella']
+                 .agg(lambda h: hashlib.md5(','.join(sorted(set(h))).encode('utf-8')).hexdigest())
+                 .reset_index())
+
+
+def guardar_cambios(df_cambios: pd.DataFrame) -> None:
+    """Reemplaza todas las filas guardadas de los comercios que cambiaron."""
+    if df_cambios.empty:
+        return
+    ahora = datetime.now().isoformat(timespec="seconds")
+    columnas = ['rut_comercio'] + COLUMNAS_SEGMENTACION + ['huella']
+    filas = [
+        tuple(None if pd.isna(v) else str(v) for v in fila) + (ahora,)
+        for fila in df_cambios[columnas].itertuples(index=False)
+    ]
+    ruts = [(r,) for r in df_cambios['rut_comercio'].astype(str).unique()]
+    db = _abrir_cache()
+    try:
+        with db:
+            db.executemany("DELETE FROM filas_segmentacion WHERE rut_comercio = ?", ruts)
+            db.executemany(
+                f"INSERT OR REPLACE INTO filas_segmentacion VALUES ({', '.join('?' * (len(columnas) + 1))})", filas
+            )
+    finally:
+        db.close()
+
+
+def borrar_cache() -> None:
+    db = _abrir_cache()
+    try:
+        with db:
+            db.execute("DELETE FROM filas_segmentacion")
+            db.execute("DELETE FROM listas")
+            db.execute("DELETE FROM listas_leidas")
+    finally:
+        db.close()
+
+
+def comercios_de_tabla(conn, lista: str, tabla: str) -> List[str]:
+    """RUT de una lista definida por tabla: desde la copia local si está vigente, si no desde Redshift."""
+    limite = (datetime.now() - timedelta(hours=VIGENCIA_LISTAS_H)).isoformat(timespec="seconds")
+    db = _abrir_cache()
+    try:
+        leida = db.execute(
+            "SELECT 1 FROM listas_leidas WHERE lista = ? AND tabla = ? AND leido >= ?", (lista, tabla, limite)
+        ).fetchone()
+        if leida:
+            return [r for (r,) in db.execute("SELECT rut_comercio FROM listas WHERE lista = ?", (lista,))]
+
+        ruts = consultar_df(conn, f"SELECT DISTINCT rut_comercio FROM {tabla};",
+                            nombre="clasificacion_lista_tabla")['rut_comercio'].astype(str).tolist()
+        with db:
+            db.execute("DELETE FROM listas WHERE lista = ?", (lista,))
+            db.executemany("INSERT OR IGNORE INTO listas VALUES (?, ?)", [(lista, r) for r in ruts])
+            db.execute("INSERT OR REPLACE INTO listas_leidas VALUES (?, ?, ?)",
+                       (lista, tabla, datetime.now().isoformat(timespec="seconds")))
+        print(f"✓ Lista '{lista}' releída desde {tabla}: {len(ruts)} comercios.")
+        return ruts
+    finally:
+        db.close()
+
+
+def cargar_listas(conn, reglas: Dict[str, Dict] = REGLAS_LISTAS) -> int:
+    """Carga todas las listas en la tabla temporal de alcance (VALUES en bloque), con grupo = nombre de la lista."""
+    comercios = {
+        lista: r['comercios'] if r.get('comercios') is not None else comercios_de_tabla(conn, lista, r['tabla'])
+        for lista, r in reglas.items()
+    }
+    return cargar_alcance(conn, alcance_por_grupo(comercios))
+
+
+def cargar_huellas(conn, cache: pd.DataFrame) -> int:
+    """Sube las huellas conocidas por comercio a una tabla temporal para que el servidor descarte lo que no cambió."""
+    por_comercio = huellas_por_comercio(cache)
+    cur = conn.cursor()
+    try:
+        cur.execute(f"DROP TABLE IF EXISTS {TABLA_HUELLAS};")
+        cur.execute(f"CREATE TEMP TABLE {TABLA_HUELLAS} (rut_comercio VARCHAR(64), huella CHAR(32));")
+        if not por_comercio.empty:
+            execute_values(
+                cur,
+                f"INSERT INTO {TABLA_HUELLAS} (rut_comercio, huella) VALUES %s",
+                list(por_comercio.itertuples(index=False, name=None)),
+                page_size=1000
+            )
+    finally:
+        cur.close()
+    return len(por_comercio)
+
+
+def evaluar_reglas(df_listas: pd.DataFrame, df_segmentacion: pd.DataFrame,
+                   reglas: Dict[str, Dict] = REGLAS_LISTAS) -> pd.DataFrame:
+    """Evalúa todas las listas y reglas en una pasada: (lista, comercio) x valores esperados.
+
+    Retorna las filas con al menos una columna distinta de lo esperado y la lista de esas columnas.
+    Los comercios sin fila en segmentación no se informan (igual que el JOIN original); un comercio
+    con varias filas distintas se evalúa fila por fila.
+    """
+    esperado = tabla_reglas(reglas).rename(columns={c: f'{c}_esperado' for c in COLUMNAS_SEGMENTACION})
+    # Los nulos llegan como NaN de Redshift y como None desde la copia local: se igualan a '' (como
+    # el COALESCE de la huella) para que la misma fila tenga la misma huella en estado_alertas.py
+    segmentacion = df_segmentacion[['rut_comercio'] + COLUMNAS_SEGMENTACION].astype(object)
+    segmentacion[COLUMNAS_SEGMENTACION] = segmentacion[COLUMNAS_SEGMENTACION].fillna('').astype(str)
+    df = (df_listas.merge(segmentacion, on='rut_comercio')
+                   .merge(esperado, on='lista', how='left'))
+
+    incorrectos = pd.DataFrame(index=df.index)
+    for c in COLUMNAS_SEGMENTACION:
+        esp = df[f'{c}_esperado']
+        incorrectos[c] = esp.notna() & (df[c].astype(str) != esp.astype(str))
+    malos = incorrectos.any(axis=1)
+
+    nombres = pd.Series(COLUMNAS_SEGMENTACION, index=COLUMNAS_SEGMENTACION)
+    df['campos_incorrectos'] = incorrectos[malos].apply(lambda f: ', '.join(nombres[f]), axis=1) if malos.any() else ''
+    return (df.loc[malos, ['lista', 'rut_comercio'] + COLUMNAS_SEGMENTACION + ['campos_incorrectos']]
+              .sort_values(['lista', 'rut_comercio'])
+              .reset_index(drop=True))
 
 # ═════════════════════════════════════════════════════════════════════════════
-# 4) LÓGICA PRINCIPAL
+# 5) LÓGICA PRINCIPAL
 # ═════════════════════════════════════════════════════════════════════════════
 
-def main():
+def consultar(recargar: bool = False) -> pd.DataFrame:
+    """Trae sólo los comercios con segmentación cambiada, actualiza la copia local y evalúa las reglas.
+
+    Con `recargar=True` se descarta la copia local (segmentación y listas) y se relee todo desde Redshift.
+    """
+    if recargar:
+        borrar_cache()
+    cache = leer_cache()
+    with conexion(CREDENTIALS_DB) as conn:
+        n = cargar_listas(conn)
+        n_huellas = cargar_huellas(conn, cache)
+        print(f"✓ {n} comercios de {len(REGLAS_LISTAS)} listas y {n_huellas} huellas cargados en tablas temporales.")
+        df_listas = consultar_df(conn, QUERY_LISTAS, nombre="clasificacion_listas")
+        df_cambios = consultar_df(conn, QUERY_CAMBIOS, nombre="clasificacion_cambios")
+
+    print(f"✓ {df_cambios['rut_comercio'].nunique()} comercios con segmentación nueva o cambiada.")
+    guardar_cambios(df_cambios)
+    df_cambios = df_cambios.astype({c: object for c in COLUMNAS_SEGMENTACION})
+    segmentacion = pd.concat(
+        [cache[~cache['rut_comercio'].isin(df_cambios['rut_comercio'])], df_cambios], ignore_index=True
+    )
+    return evaluar_reglas(df_listas, segmentacion)
+
+# Definición de la alerta para el ejecutor unificado (ver ejecutar_alertas.py)
+ALERTA = {
+    'nombre':        'clasificacion_comercios',
+    'consultar':     consultar,
+    'separar':       lambda df: (df,),
+    'enviar':        send_alert_email,
+    'destinatarios': DATA_MAIL['recipient'],
+    'estado':        {'claves': ['lista', 'rut_comercio'] + COLUMNAS_SEGMENTACION},
+}
+
+@perfilado.perfilar("clasificacion_comercios")
+def main(recargar: bool = False):
     """Función principal que orquesta todo el proceso."""
     print("🚀 Iniciando revisión de clasificación de comercios...")
-    conn = None
     try:
-        conn = connect_db(CREDENTIALS_DB)
-        
         print("⚙️  Ejecutando consulta en la base de datos...")
-        df_incorrectos = pd.read_sql(QUERY_VALIDACION, conn)
+        with perfilado.etapa("consulta"):
+            df_incorrectos = consultar(recargar=recargar)
         
-        if not df_incorrectos.empty:
-            print(f"🚨 ¡Alerta! Se encontraron {len(df_incorrectos)} comercios mal clasificados.")
-            send_alert_email(df_incorrectos)
-        else:
+        with perfilado.etapa("estado"):
+            df_reporte, resumen, novedades = filtrar_por_estado(ALERTA, df_incorrectos)
+        if novedades:
+            print(f"🚨 ¡Alerta! Se encontraron {len(df_reporte)} comercios mal clasificados nuevos.")
+            with perfilado.etapa("correo"), metricas.medir("correo_armado_segundos", correo="clasificacion_comercios"):
+                futuro = send_alert_email(df_reporte, resumen_estado=resumen)
+            # El estado se guarda sólo con el correo entregado: si falla, la próxima corrida lo reporta de nuevo
+            futuro.result()
+        elif df_incorrectos.empty:
             print("✅ ¡Perfecto! No se encontraron comercios mal clasificados.")
+        else:
+            print(f"ℹ️  {len(df_incorrectos)} comercios ya informados siguen mal clasificados; sin novedades.")
+        registrar_reportados(resumen)
 
     except Exception as e:
         print(f"❌ Ocurrió un error inesperado durante la ejecución: {e}")
     finally:
-        if conn:
-            close_db_connection(conn)
         print("🏁 Proceso finalizado.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Revisión de clasificación de comercios por lista")
+    parser.add_argument("--recargar", action="store_true",
+                        help="Descarta la copia local (huellas y listas) y relee todo desde Redshift")
+    main(recargar=parser.parse_args().recargar)
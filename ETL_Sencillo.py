@@ -2,12 +2,13 @@
 # que extrae datos de una base de datos Redshift, los transforma y limpia, y luego los carga de vuelta a Redshift.
 # -*- coding: utf-8 -*-
 
-from sqlite3 import OperationalError
+import sys
 import pandas as pd  # type: ignore
-import psycopg2  # type: ignore
 import numpy as np
 from psycopg2.extras import execute_values
 from datetime import timedelta
+from acceso_datos import conexion, consultar_df
+import perfilado
 
 # ===== Credenciales (usar variables de entorno en la práctica) =====
 Credenciales_redshift = {
@@ -18,23 +19,17 @@ Credenciales_redshift = {
     'password': 'your_password'
 }
 
-# ===== Funciones de Conexión y Consulta =====
-def connect_db(cfg):
-    """Establece conexión con la base de datos Redshift."""
-    try:
-        conn = psycopg2.connect(**cfg)
-        print("✓ Conectado a Redshift")
-        return conn
-    except OperationalError as e:
-        raise SystemExit(f"❌ No se pudo conectar: {e.pgerror or e}")
-
-def query_df(conn, sql):
-    """Ejecuta una consulta SQL y retorna un DataFrame de Pandas."""
+# ===== Funciones de Consulta =====
+def query_df(conn, sql, nombre=None):
+    """Ejecuta una consulta SQL y retorna un DataFrame de Pandas (con captura de plan si `nombre`).
+
+    Un error se propaga: una fuente vacía por falla no debe reemplazar la tabla destino.
+    """
     try:
-        return pd.read_sql(sql, conn)
+        return consultar_df(conn, sql, nombre=nombre)
     except Exception as e:
         print(f"⚠️ Error en la consulta: {e}")
-        return pd.DataFrame()
+        raise
 
 # ===== Definición de Consultas (Queries de ejemplo) =====
 query1 = """
@@ -103,25 +98,6 @@ WHERE fecha_venta >= '2025-01-01'::timestamp
 GROUP BY nacionalidad_tx, tx_codigo_mandante, fecha_tx, tarjeta_presente
 """
 
-# ===== Descarga de Datos desde Redshift =====
-print("🚚 Iniciando descarga de datos desde Redshift...")
-conn = connect_db(Credenciales_redshift)
-df1 = query_df(conn, query1)
-df2 = query_df(conn, query2)
-df3 = query_df(conn, query3)
-conn.close()
-print("✓ Datos descargados.")
-
-# ===== Limpieza y Normalización de Datos =====
-print("🧹 Procesando y limpiando datos...")
-df1 = df1.rename(columns={"marca": "tx_codigo_mandante"})
-df1["tipo_tx"] = "VENTA"
-df2["tipo_tx"] = "RECHAZOS"
-df3["tipo_tx"] = "CHECKIN"
-
-for df in [df1, df2, df3]:
-    df["cant_trx"] = df.get("cant_trx", df.get("cant_tx", 0))
-
 required_columns = [
     "tipo_tx", "nacionalidad_tx", "tarjeta_presente", "tx_codigo_mandante", "fecha_tx",
     "monto_venta", "cant_trx",
@@ -129,34 +105,46 @@ required_columns = [
     "costo_6", "costo_7", "costo_8", "costo_9", "costo_10"
 ]
 
+# ===== Descarga de Datos desde Redshift =====
+def extraer(cfg=Credenciales_redshift):
+    """Descarga las tres fuentes usando una conexión del pool compartido."""
+    print("🚚 Iniciando descarga de datos desde Redshift...")
+    with conexion(cfg) as conn:
+        df1 = query_df(conn, query1, nombre="etl_query1")
+        df2 = query_df(conn, query2, nombre="etl_query2")
+        df3 = query_df(conn, query3, nombre="etl_query3")
+    print("✓ Datos descargados.")
+    return df1, df2, df3
+
+# ===== Limpieza y Normalización de Datos =====
 def completar_columnas(df):
     for col in required_columns:
         if col not in df.columns:
             df[col] = 0
     return df[required_columns]
 
-df1 = completar_columnas(df1)
-df2 = completar_columnas(df2)
-df3 = completar_columnas(df3)
+def normalizar(df1, df2, df3):
+    """Homologa columnas de las tres fuentes y las une en un solo DataFrame."""
+    print("🧹 Procesando y limpiando datos...")
+    df1 = df1.rename(columns={"marca": "tx_codigo_mandante"})
+    df1["tipo_tx"] = "VENTA"
+    df2["tipo_tx"] = "RECHAZOS"
+    df3["tipo_tx"] = "CHECKIN"
 
-df1["fuente"] = "ADQ"
-df2["fuente"] = "RECHAZOS"
-df3["fuente"] = "CHECKIN"
+    for df in [df1, df2, df3]:
+        df["cant_trx"] = df.get("cant_trx", df.get("cant_tx", 0))
 
-df_final = pd.concat([df1, df2, df3], ignore_index=True)
+    df1 = completar_columnas(df1)
+    df2 = completar_columnas(df2)
+    df3 = completar_columnas(df3)
 
-# ===== Lógica de Nuevas Columnas de Fechas =====
-df_final["fecha_tx"] = pd.to_datetime(df_final["fecha_tx"])
+    df1["fuente"] = "ADQ"
+    df2["fuente"] = "RECHAZOS"
+    df3["fuente"] = "CHECKIN"
 
-# Calcular billing_date (próximo domingo)
-weekday = df_final["fecha_tx"].dt.weekday
-days_to_sunday = (6 - weekday + 7) % 7
-df_final["billing_date"] = df_final["fecha_tx"] + pd.to_timedelta(days_to_sunday, unit="D")
+    return pd.concat([df1, df2, df3], ignore_index=True)
 
-df_final["fecha_contable"] = df_final["fecha_tx"]
-df_final["fecha_visa"] = df_final["fecha_tx"].dt.month
-
-# ===== Cálculo adicional de billing_date_2 =====
+# ===== Lógica de Nuevas Columnas de Fechas =====
 def calcular_billing_date_2(fecha_tx):
     fecha_tx = pd.to_datetime(fecha_tx)
     weekday = fecha_tx.weekday()
@@ -168,41 +156,73 @@ def calcular_billing_date_2(fecha_tx):
     domingo_post_jueves = jueves_objetivo + timedelta(days=3)
     return domingo_post_jueves.normalize()
 
-df_final["billing_date_2"] = df_final["fecha_tx"].apply(calcular_billing_date_2)
+def agregar_fechas(df_final):
+    """Agrega billing_date, fecha_contable, fecha_visa y billing_date_2."""
+    df_final["fecha_tx"] = pd.to_datetime(df_final["fecha_tx"])
+
+    # Calcular billing_date (próximo domingo)
+    weekday = df_final["fecha_tx"].dt.weekday
+    days_to_sunday = (6 - weekday + 7) % 7
+    df_final["billing_date"] = df_final["fecha_tx"] + pd.to_timedelta(days_to_sunday, unit="D")
+
+    df_final["fecha_contable"] = df_final["fecha_tx"]
+    df_final["fecha_visa"] = df_final["fecha_tx"].dt.month
+
+    # ===== Cálculo adicional de billing_date_2 =====
+    df_final["billing_date_2"] = df_final["fecha_tx"].apply(calcular_billing_date_2)
+    return df_final
 
 # ===== Carga de Datos a Redshift =====
-conn, cur = None, None
-try:
-    conn = connect_db(Credenciales_redshift)
-    cur = conn.cursor()
-    
-    print("🗑️  Limpiando la tabla destino schema_x.tabla_destino...")
-    cur.execute("DELETE FROM schema_x.tabla_destino;")
-    print("✓ Tabla limpiada.")
-    
-    df_ins = df_final.astype(object).where(pd.notnull(df_final), None)
-    
-    cols = ", ".join(df_ins.columns)
-    insert_sql = f"INSERT INTO schema_x.tabla_destino ({cols}) VALUES %s"
-    
-    print(f"📦 Insertando {len(df_ins)} registros...")
-    execute_values(
-        cur,
-        insert_sql,
-        df_ins.to_records(index=False).tolist(),
-        page_size=1000
-    )
-    
-    conn.commit()
-    print("✅ ¡Éxito! Datos insertados correctamente en tabla destino.")
-
-except Exception as e:
-    print(f"❌ Error durante la carga a Redshift: {e}")
-    if conn:
-        conn.rollback()
-finally:
-    if cur:
-        cur.close()
-    if conn:
-        conn.close()
-    print("🚪 Conexión a Redshift cerrada.")
+def cargar(df_final, cfg=Credenciales_redshift):
+    """Reemplaza el contenido de la tabla destino en una sola transacción; retorna si quedó cargada."""
+    try:
+        with conexion(cfg) as conn:
+            cur = conn.cursor()
+            try:
+                print("🗑️  Limpiando la tabla destino schema_x.tabla_destino...")
+                cur.execute("DELETE FROM schema_x.tabla_destino;")
+                print("✓ Tabla limpiada.")
+
+                df_ins = df_final.astype(object).where(pd.notnull(df_final), None)
+
+                cols = ", ".join(df_ins.columns)
+                insert_sql = f"INSERT INTO schema_x.tabla_destino ({cols}) VALUES %s"
+
+                print(f"📦 Insertando {len(df_ins)} registros...")
+                execute_values(
+                    cur,
+                    insert_sql,
+                    df_ins.to_records(index=False).tolist(),
+                    page_size=1000
+                )
+
+                conn.commit()
+                print("✅ ¡Éxito! Datos insertados correctamente en tabla destino.")
+            finally:
+                cur.close()
+        return True
+    except Exception as e:
+        # Sin commit, la conexión hace rollback al volver al pool
+        print(f"❌ Error durante la carga a Redshift: {e}")
+        return False
+
+@perfilado.perfilar("etl_sencillo")
+def main():
+    # El código de salida permite a orquestador.py no lanzar los chequeos sobre una carga fallida
+    try:
+        with perfilado.etapa("extraer"):
+            df1, df2, df3 = extraer()
+    except Exception as e:
+        # Sin las tres fuentes no se toca la tabla destino (cargar la reemplaza completa)
+        print(f"❌ Falló la extracción; no se carga la tabla destino: {e}")
+        return 1
+    with perfilado.etapa("normalizar"):
+        df_final = normalizar(df1, df2, df3)
+    with perfilado.etapa("fechas"):
+        df_final = agregar_fechas(df_final)
+    with perfilado.etapa("cargar"):
+        return 0 if cargar(df_final) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,28 +5,46 @@
 """
 # Validador de Tarifas – Script de Alerta
 • Lee la BO desde S3 (toma el CSV más reciente del prefijo dado).
-• Ejecuta dos consultas en Redshift: Día (última fecha) y MTD (mes hasta la fecha).
+• Ejecuta dos consultas en Redshift: Día (última fecha) y MTD (mes hasta la fecha),
+  generadas desde una plantilla única con la ventana de fechas como parámetro y
+  acotadas por MERCHANT_SCOPE cargado en una tabla temporal (ver alcance_comercios.py).
+  `--explain` registra el costo estimado vs la versión original de tres recorridos.
 • Cruza, calcula diferencias y clasifica errores (excluye NO Error 6: MCC 4511 – MD particular).
 • Envía por correo un resumen HTML tabular (con líneas) con columnas MTD
-  y adjunta **dos CSV**: detalle diario y detalle acumulado MTD.
-
-Dependencias: boto3, pandas, numpy, psycopg2-binary
+  y adjunta el detalle diario y el acumulado MTD, comprimidos (CSV gzip/zip o Parquet)
+  y escritos por bloques; si superan ATTACHMENT_MAX_BYTES se dividen en varios correos
+  o se suben a ATTACHMENT_SPILL_PATH y se envía el enlace.
+• Modo `--incremental`: si comercial sube una BO corregida, re-procesa sólo las
+  `join_key` que cambiaron usando las liquidaciones en caché (sin ir a Redshift).
+• Modo `--batch`: valida varias carteras (alcance, prefijo BO y destinatarios propios)
+  con una sola extracción para la unión de comercios y un reporte por cartera.
+• Modo `--backfill --desde AAAA-MM-DD --hasta AAAA-MM-DD`: re-valida meses pasados por
+  unidades diarias o mensuales en paralelo, con detalle en Parquet particionado por unidad
+  y resumen acumulado. Las unidades ya completadas se saltan al reiniciar.
+
+Dependencias: boto3, pandas, numpy, psycopg2-binary (pyarrow para --backfill)
 """
 import io
 import os
 import sys
-import boto3
-import smtplib
+import gzip
+import json
+import time
+import zipfile
+import argparse
 import traceback
 import numpy as np
 import pandas as pd
-import psycopg2
 from typing import Tuple, Optional, List
-from datetime import datetime
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
+from datetime import date, datetime, timedelta
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from alcance_comercios import alcance_por_grupo, cargar_alcance, consultar_con_alcance, normalizar_alcance
+from plan_consultas import costo_explain
+from acceso_datos import conexion, consultar_df
+from tablas_html import ESTILO_REPORTE, formato_miles, tabla_html
+import grabacion
+import perfilado
+import metricas
 
 # ===============================
 # ⚙️ CONFIGURACIÓN EN LÍNEA
@@ -38,24 +56,86 @@ DB_USER = "your_db_user"
 DB_PASSWORD = "YOUR_SECURE_PASSWORD"
 DB_PORT = 5439
 
+# Alcance de comercios a validar: RUT completo o (RUT, local). Se carga en tabla temporal.
+MERCHANT_SCOPE = [
+    "11111111-1",
+    "22222222-2",
+    "33333333-3",
+    ("99999999-9", "100001"),
+    ("99999999-9", "100002"),
+    ("99999999-9", "100003"),
+]
+# Conexiones paralelas entre las que se reparte el alcance (1 = una sola sesión)
+SCOPE_CONNECTIONS = 1
+
 # S3 (prefijo de entrada con los CSV de BO)
 S3_INPUT = "s3://your-company-datalake/path/to/input/files/"
 
+# Carteras para el modo --batch: cada una con su alcance, prefijo de BO y destinatarios.
+# También se pueden entregar en un JSON con la misma estructura (--carteras archivo.json).
+PORTFOLIOS = [
+    {
+        "nombre": "cartera_principal",
+        "alcance": MERCHANT_SCOPE,
+        "s3_input": S3_INPUT,
+        "destinatarios": [
+            "recipient.one@example.com",
+            "team.alias@example.com",
+        ],
+    },
+]
+# Procesos en paralelo para `procesar` por cartera
+BATCH_WORKERS = 4
+
+# Backfill histórico: carpeta de salida (Parquet particionado por unidad) y concurrencia máxima
+BACKFILL_DIR = "backfill_validador_tarifas"
+BACKFILL_WORKERS = 4
+
+# Adjuntos del reporte: formato ("csv.gz", "zip" o "parquet"), filas por bloque al serializar,
+# tope de bytes por correo y qué hacer si se supera ("split" = varios correos, "spill" = enlace)
+ATTACHMENT_FORMAT = "csv.gz"
+ATTACHMENT_CHUNK_ROWS = 100_000
+ATTACHMENT_MAX_BYTES = 15 * 1024 * 1024
+ATTACHMENT_OVERFLOW = "spill"
+# Destino del desborde: prefijo s3:// (se envía URL prefirmada) o carpeta local
+ATTACHMENT_SPILL_PATH = "s3://your-company-datalake/path/to/reports/"
+ATTACHMENT_LINK_EXPIRATION = 7 * 24 * 3600
+
 # Correo (Office365 o similar)
 SMTP_HOST = "smtp.your-email-provider.com"
 SMTP_PORT = 587
 MAIL_SENDER = "automation-sender@yourcompany.com"
 MAIL_PASSWORD = "YOUR_EMAIL_APP_PASSWORD"
+SMTP_CONFIG = {"host": SMTP_HOST, "port": SMTP_PORT, "remitente": MAIL_SENDER,
+               "usuario": MAIL_SENDER, "password": MAIL_PASSWORD}
 MAIL_RECIPIENTS = [
     "recipient.one@example.com",
     "recipient.two@example.com",
     "team.alias@example.com",
 ]
 
+# Caché local para la re-validación incremental (liquidaciones, BO aplicada y detalle)
+CACHE_DIR = "cache_validador_tarifas"
+
+# Historial de costos EXPLAIN (modo --explain)
+EXPLAIN_LOG = "explain_validador_tarifas.jsonl"
+
 # ===============================
 # 🔧 UTILIDADES S3
 # ===============================
-s3 = boto3.client("s3")
+# El cliente se crea en el primer uso (importar boto3 y crear el cliente cuesta ~0,4 s al arrancar)
+_s3 = None
+
+def _crear_cliente_s3():
+    import boto3
+    return boto3.client("s3")
+
+def cliente_s3():
+    global _s3
+    if _s3 is None:
+        # Con GRABACION activa el cliente graba o lee los objetos de los fixtures (ver grabacion.py)
+        _s3 = grabacion.cliente_s3(_crear_cliente_s3)
+    return _s3
 
 def parse_s3_url(url: str) -> Tuple[str, str]:
     if not url.startswith("s3://"):
@@ -71,7 +151,7 @@ def parse_s3_url(url: str) -> Tuple[str, str]:
 
 def get_latest_object(bucket: str, prefix: str, suffixes: Tuple[str, ...] = (".csv", ".CSV")) -> Optional[str]:
     """Retorna la key más reciente (LastModified) que termine en .csv dentro del prefijo."""
-    paginator = s3.get_paginator("list_objects_v2")
+    paginator = cliente_s3().get_paginator("list_objects_v2")
     latest_key, latest_time = None, None
     for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
         for obj in page.get("Contents", []):
@@ -87,7 +167,7 @@ def get_latest_object(bucket: str, prefix: str, suffixes: Tuple[str, ...] = (".c
 
 def read_csv_from_s3(bucket: str, key: str) -> pd.DataFrame:
     """Lee CSV de S3 a pandas, probando UTF-8-SIG y UTF-8."""
-    obj = s3.get_object(Bucket=bucket, Key=key)
+    obj = cliente_s3().get_object(Bucket=bucket, Key=key)
     raw = obj["Body"].read()
     for enc in ("utf-8-sig", "utf-8"):
         try:
@@ -99,81 +179,55 @@ def read_csv_from_s3(bucket: str, key: str) -> pd.DataFrame:
 # ===============================
 # 🛢️ CONEXIÓN REDSHIFT
 # ===============================
-def connect_redshift() -> psycopg2.extensions.connection:
-    try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            port=DB_PORT,
-        )
-        print("✓ Conexión a Redshift OK")
-        return conn
-    except psycopg2.OperationalError as e:
-        raise SystemExit(f"❌ Error al conectar a Redshift: {e}")
-
-
-RED_SHIFT_QUERY = """
+# Las conexiones salen del pool compartido (acceso_datos.py)
+DB_CONFIG = {
+    "host": DB_HOST,
+    "database": DB_NAME,
+    "user": DB_USER,
+    "password": DB_PASSWORD,
+    "port": DB_PORT,
+}
+
+
+QUERY_ULTIMA_FECHA = "SELECT MAX(CAST(settlement_date AS DATE)) FROM analytics_schema.settlements_table;"
+
+# Plantilla única para las variantes Día / MTD / rango (backfill): la ventana de settlement_date
+# va como parámetro (los % de LIKE van escapados). {ctes_mapas}, {columnas_mapas} y {joins_mapas}
+# se completan con MAPAS_UNA_PASADA (por defecto) o MAPAS_SEPARADOS (versión original, para EXPLAIN).
+PLANTILLA_QUERY_TARIFAS = """
 -- =========================================================================================
 -- NOTA DE ANONIMIZACIÓN: Los nombres de esquemas, tablas y campos han sido reemplazados
 -- por nombres genéricos para proteger la confidencialidad del negocio.
 -- La lógica y estructura de la consulta se mantienen intactas.
 -- =========================================================================================
 WITH filtered_settlements AS (
-    SELECT *
-    FROM analytics_schema.settlements_table
-    WHERE CAST(settlement_date AS DATE) = (
-        SELECT MAX(CAST(settlement_date AS DATE)) FROM analytics_schema.settlements_table
-    )
-    AND (
-        merchant_id IN ('11111111-1', '22222222-2', '33333333-3')
-        OR (merchant_id = '99999999-9' AND store_id IN ('100001', '100002', '100003'))
-    )
+    SELECT st.*, sc.grupo AS grupo_alcance
+    FROM analytics_schema.settlements_table AS st
+    JOIN tmp_alcance_comercios AS sc
+        ON st.merchant_id = sc.id_comercio
+        AND (sc.id_local IS NULL OR st.store_id = sc.id_local)
+    WHERE CAST(st.settlement_date AS DATE) BETWEEN %(fecha_desde)s AND %(fecha_hasta)s
 ),
 enriched_transactions AS (
     SELECT st.*, f.transaction_id, f.card_present_flag, f.mcc_code AS original_mcc, f.transaction_origin, f.fee_percentage
     FROM filtered_settlements AS st
     LEFT JOIN analytics_schema.transactions_fact_table AS f ON st.transaction_code = f.transaction_code
 ),
-corrected_mcc_map AS (
-    SELECT transaction_id, COALESCE(MAX(NULLIF(mcc_code, '0')), '0') AS mcc_code_fix
-    FROM analytics_schema.transactions_fact_table
-    WHERE transaction_id IN (SELECT DISTINCT transaction_id FROM enriched_transactions WHERE transaction_id IS NOT NULL)
-    GROUP BY transaction_id
-),
-corrected_origin_map AS (
-    SELECT transaction_id, COALESCE(MAX(NULLIF(transaction_origin, '-')), '-') AS origin_fix
-    FROM analytics_schema.transactions_fact_table
-    WHERE transaction_id IN (SELECT DISTINCT transaction_id FROM enriched_transactions WHERE transaction_id IS NOT NULL)
-    GROUP BY transaction_id
-),
-theoretical_fee_map AS (
-    SELECT transaction_id, MAX(fee_percentage) AS theoretical_fee_max
-    FROM analytics_schema.transactions_fact_table
-    WHERE transaction_id IN (SELECT DISTINCT transaction_id FROM enriched_transactions WHERE transaction_id IS NOT NULL)
-    GROUP BY transaction_id
-),
+{ctes_mapas}
 initial_calculation AS (
     SELECT
         et.*,
-        cm.mcc_code_fix,
-        CASE
-            WHEN et.transaction_type LIKE 'ANULACION%' AND et.variable_fee_rate <> 0
-            THEN tfm.theoretical_fee_max
-            ELSE NULL
-        END AS theoretical_fee_lookup,
+        {columnas_mapas},
         CASE
             WHEN et.card_brand = 'AMEX' THEN CASE WHEN et.issuer_name = '999999-BCO_GENERICO' THEN 'Internacional' ELSE 'Nacional' END
             ELSE et.transaction_origin
         END AS origin_plan_a
     FROM enriched_transactions AS et
-    LEFT JOIN corrected_mcc_map AS cm ON et.transaction_id = cm.transaction_id
-    LEFT JOIN theoretical_fee_map AS tfm ON et.transaction_id = tfm.transaction_id
+    {joins_mapas}
 )
 SELECT
     ic.card_present_flag,
-    CASE WHEN ic.transaction_type LIKE 'ANULACION%' THEN ic.mcc_code_fix ELSE ic.original_mcc END AS mcc_code_corrected,
+    CASE WHEN ic.transaction_type LIKE 'ANULACION%%' THEN ic.mcc_code_fix ELSE ic.original_mcc END AS mcc_code_corrected,
     COUNT(DISTINCT(ic.transaction_code)) AS trx_count,
     SUM(ic.gross_amount) AS sales_volume,
     SUM(ROUND(ic.commission_amount / 1.19)) AS total_fee,
@@ -181,48 +235,47 @@ SELECT
     ic.merchant_id,
     TO_CHAR(ic.transaction_date, 'YYYY-MM-DD') AS trx_date,
     ic.card_brand,
-    CASE WHEN ic.origin_plan_a = '-' THEN com.origin_fix ELSE ic.origin_plan_a END AS transaction_origin,
-    CASE WHEN (CASE WHEN ic.origin_plan_a = '-' THEN com.origin_fix ELSE ic.origin_plan_a END) = 'Internacional' THEN 'INTERNACIONAL' ELSE ic.product_category END AS category,
+    CASE WHEN ic.origin_plan_a = '-' THEN ic.origin_fix ELSE ic.origin_plan_a END AS transaction_origin,
+    CASE WHEN (CASE WHEN ic.origin_plan_a = '-' THEN ic.origin_fix ELSE ic.origin_plan_a END) = 'Internacional' THEN 'INTERNACIONAL' ELSE ic.product_category END AS category,
     ic.transaction_type,
     ic.is_installment,
     (ic.variable_fee_rate * 100) AS applied_var_fee,
     ic.fixed_fee_rate AS applied_fixed_fee,
-    ic.theoretical_fee_lookup,
+    CASE
+        WHEN ic.transaction_type LIKE 'ANULACION%%' AND ic.variable_fee_rate <> 0
+        THEN ic.theoretical_fee_max
+        ELSE NULL
+    END AS theoretical_fee_lookup,
     LEFT(ic.merchant_id, LENGTH(ic.merchant_id) - 2)
-        || '-' || (CASE WHEN ic.transaction_type LIKE 'ANULACION%' THEN ic.mcc_code_fix ELSE ic.original_mcc END)
+        || '-' || (CASE WHEN ic.transaction_type LIKE 'ANULACION%%' THEN ic.mcc_code_fix ELSE ic.original_mcc END)
         || '-' || ic.card_brand
-        || '-' || (CASE WHEN (CASE WHEN ic.origin_plan_a = '-' THEN com.origin_fix ELSE ic.origin_plan_a END) = 'Internacional' THEN 'INTERNACIONAL' ELSE ic.product_category END) AS join_key
+        || '-' || (CASE WHEN (CASE WHEN ic.origin_plan_a = '-' THEN ic.origin_fix ELSE ic.origin_plan_a END) = 'Internacional' THEN 'INTERNACIONAL' ELSE ic.product_category END) AS join_key,
+    ic.grupo_alcance
 FROM initial_calculation AS ic
-LEFT JOIN corrected_origin_map AS com ON ic.transaction_id = com.transaction_id
-GROUP BY 1, 2, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16
+GROUP BY 1, 2, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 18
 LIMIT 1000000;
 """
 
-RED_SHIFT_QUERY_MTD = """
--- =========================================================================================
--- NOTA DE ANONIMIZACIÓN: Los nombres de esquemas, tablas y campos han sido reemplazados
--- por nombres genéricos para proteger la confidencialidad del negocio.
--- La lógica y estructura de la consulta se mantienen intactas.
--- =========================================================================================
-WITH max_date AS (
-    SELECT MAX(CAST(settlement_date AS DATE)) AS ld FROM analytics_schema.settlements_table
-),
-filtered_settlements AS (
-    SELECT st.*
-    FROM analytics_schema.settlements_table st
-    JOIN max_date ON 1=1
-    WHERE CAST(st.settlement_date AS DATE) BETWEEN DATE_TRUNC('month', ld)::date AND ld
-    AND (
-        merchant_id IN ('11111111-1', '22222222-2', '33333333-3')
-        OR (merchant_id = '99999999-9' AND store_id IN ('100001', '100002', '100003'))
-    )
-),
-enriched_transactions AS (
-    SELECT st.*, f.transaction_id, f.card_present_flag, f.mcc_code AS original_mcc, f.transaction_origin, f.fee_percentage
-    FROM filtered_settlements AS st
-    LEFT JOIN analytics_schema.transactions_fact_table AS f ON st.transaction_code = f.transaction_code
-),
-corrected_mcc_map AS (
+# Los tres mapas por transaction_id (MCC corregido, origen corregido y tarifa teórica)
+# salen de un único recorrido agrupado de transactions_fact_table.
+MAPAS_UNA_PASADA = {
+    "ctes_mapas": """transaction_maps AS (
+    SELECT
+        transaction_id,
+        COALESCE(MAX(NULLIF(mcc_code, '0')), '0') AS mcc_code_fix,
+        COALESCE(MAX(NULLIF(transaction_origin, '-')), '-') AS origin_fix,
+        MAX(fee_percentage) AS theoretical_fee_max
+    FROM analytics_schema.transactions_fact_table
+    WHERE transaction_id IN (SELECT DISTINCT transaction_id FROM enriched_transactions WHERE transaction_id IS NOT NULL)
+    GROUP BY transaction_id
+),""",
+    "columnas_mapas": "tm.mcc_code_fix, tm.origin_fix, tm.theoretical_fee_max",
+    "joins_mapas": "LEFT JOIN transaction_maps AS tm ON et.transaction_id = tm.transaction_id",
+}
+
+# Versión original: un recorrido de transactions_fact_table por cada mapa
+MAPAS_SEPARADOS = {
+    "ctes_mapas": """corrected_mcc_map AS (
     SELECT transaction_id, COALESCE(MAX(NULLIF(mcc_code, '0')), '0') AS mcc_code_fix
     FROM analytics_schema.transactions_fact_table
     WHERE transaction_id IN (SELECT DISTINCT transaction_id FROM enriched_transactions WHERE transaction_id IS NOT NULL)
@@ -239,85 +292,98 @@ theoretical_fee_map AS (
     FROM analytics_schema.transactions_fact_table
     WHERE transaction_id IN (SELECT DISTINCT transaction_id FROM enriched_transactions WHERE transaction_id IS NOT NULL)
     GROUP BY transaction_id
-),
-initial_calculation AS (
-    SELECT
-        et.*,
-        cm.mcc_code_fix,
-        CASE
-            WHEN et.transaction_type LIKE 'ANULACION%' AND et.variable_fee_rate <> 0
-            THEN tfm.theoretical_fee_max
-            ELSE NULL
-        END AS theoretical_fee_lookup,
-        CASE
-            WHEN et.card_brand = 'AMEX' THEN CASE WHEN et.issuer_name = '999999-BCO_GENERICO' THEN 'Internacional' ELSE 'Nacional' END
-            ELSE et.transaction_origin
-        END AS origin_plan_a
-    FROM enriched_transactions AS et
-    LEFT JOIN corrected_mcc_map AS cm ON et.transaction_id = cm.transaction_id
-    LEFT JOIN theoretical_fee_map AS tfm ON et.transaction_id = tfm.transaction_id
-)
-SELECT
-    ic.card_present_flag,
-    CASE WHEN ic.transaction_type LIKE 'ANULACION%' THEN ic.mcc_code_fix ELSE ic.original_mcc END AS mcc_code_corrected,
-    COUNT(DISTINCT(ic.transaction_code)) AS trx_count,
-    SUM(ic.gross_amount) AS sales_volume,
-    SUM(ROUND(ic.commission_amount / 1.19)) AS total_fee,
-    ic.applied_exchange_rate,
-    ic.merchant_id,
-    TO_CHAR(ic.transaction_date, 'YYYY-MM-DD') AS trx_date,
-    ic.card_brand,
-    CASE WHEN ic.origin_plan_a = '-' THEN com.origin_fix ELSE ic.origin_plan_a END AS transaction_origin,
-    CASE WHEN (CASE WHEN ic.origin_plan_a = '-' THEN com.origin_fix ELSE ic.origin_plan_a END) = 'Internacional' THEN 'INTERNACIONAL' ELSE ic.product_category END AS category,
-    ic.transaction_type,
-    ic.is_installment,
-    (ic.variable_fee_rate * 100) AS applied_var_fee,
-    ic.fixed_fee_rate AS applied_fixed_fee,
-    ic.theoretical_fee_lookup,
-    LEFT(ic.merchant_id, LENGTH(ic.merchant_id) - 2)
-        || '-' || (CASE WHEN ic.transaction_type LIKE 'ANULACION%' THEN ic.mcc_code_fix ELSE ic.original_mcc END)
-        || '-' || ic.card_brand
-        || '-' || (CASE WHEN (CASE WHEN ic.origin_plan_a = '-' THEN com.origin_fix ELSE ic.origin_plan_a END) = 'Internacional' THEN 'INTERNACIONAL' ELSE ic.product_category END) AS join_key
-FROM initial_calculation AS ic
-LEFT JOIN corrected_origin_map AS com ON ic.transaction_id = com.transaction_id
-GROUP BY 1, 2, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16
-LIMIT 1000000;
-"""
+),""",
+    "columnas_mapas": "cm.mcc_code_fix, com.origin_fix, tfm.theoretical_fee_max",
+    "joins_mapas": """LEFT JOIN corrected_mcc_map AS cm ON et.transaction_id = cm.transaction_id
+    LEFT JOIN corrected_origin_map AS com ON et.transaction_id = com.transaction_id
+    LEFT JOIN theoretical_fee_map AS tfm ON et.transaction_id = tfm.transaction_id""",
+}
+
+RED_SHIFT_QUERY_TARIFAS = PLANTILLA_QUERY_TARIFAS.format(**MAPAS_UNA_PASADA)
+
+
+def ultima_fecha_settlement() -> date:
+    """Última fecha de settlement disponible; ancla de las variantes Día y MTD."""
+    with conexion(DB_CONFIG) as conn:
+        ld = consultar_df(conn, QUERY_ULTIMA_FECHA, nombre="tarifas_ultima_fecha").iloc[0, 0]
+    if ld is None or pd.isna(ld):
+        raise ValueError("settlements_table no tiene fechas de settlement")
+    return ld
+
+
+def construir_query_tarifas(variante: str, ultima_fecha: Optional[date] = None,
+                            desde: Optional[date] = None, hasta: Optional[date] = None,
+                            una_pasada: bool = True) -> Tuple[str, dict]:
+    """Retorna (sql, params) para la variante 'dia', 'mtd' o 'rango' a partir de la plantilla única."""
+    if variante == "dia":
+        params = {"fecha_desde": ultima_fecha, "fecha_hasta": ultima_fecha}
+    elif variante == "mtd":
+        params = {"fecha_desde": ultima_fecha.replace(day=1), "fecha_hasta": ultima_fecha}
+    elif variante == "rango":
+        params = {"fecha_desde": desde, "fecha_hasta": hasta}
+    else:
+        raise ValueError(f"Variante de query desconocida: {variante}")
+    if None in params.values():
+        raise ValueError(f"Faltan fechas para la variante '{variante}'")
+    sql = RED_SHIFT_QUERY_TARIFAS if una_pasada else PLANTILLA_QUERY_TARIFAS.format(**MAPAS_SEPARADOS)
+    return sql, params
+
+
+# Nombres de las consultas en el historial de planes (PLAN_CAPTURE=1, ver plan_consultas.py)
+NOMBRES_DIA_MTD = ["tarifas_dia", "tarifas_mtd"]
+
+
+def consultas_dia_mtd() -> Tuple[List[str], List[dict]]:
+    """SQL y parámetros de las variantes Día y MTD anclados a la última fecha de settlement."""
+    ld = ultima_fecha_settlement()
+    print(f"Última fecha de settlement: {ld}")
+    sql_dia, params_dia = construir_query_tarifas("dia", ultima_fecha=ld)
+    sql_mtd, params_mtd = construir_query_tarifas("mtd", ultima_fecha=ld)
+    return [sql_dia, sql_mtd], [params_dia, params_mtd]
+
+
+def registrar_costos_explain() -> List[dict]:
+    """Compara con EXPLAIN la query de una pasada vs la original (tres recorridos) y guarda el resultado."""
+    ld = ultima_fecha_settlement()
+    registros = []
+    with conexion(DB_CONFIG) as conn:
+        cargar_alcance(conn, normalizar_alcance(MERCHANT_SCOPE))
+        for variante in ("dia", "mtd"):
+            sql_nuevo, params = construir_query_tarifas(variante, ultima_fecha=ld)
+            sql_orig, _ = construir_query_tarifas(variante, ultima_fecha=ld, una_pasada=False)
+            costo_nuevo = costo_explain(conn, sql_nuevo, params)
+            costo_orig = costo_explain(conn, sql_orig, params)
+            ahorro = 100.0 * (1 - costo_nuevo / costo_orig) if costo_orig else 0.0
+            print(f"EXPLAIN {variante}: original {costo_orig:,.0f} | una pasada {costo_nuevo:,.0f} | ahorro {ahorro:.1f}%")
+            registros.append({
+                "ts": datetime.now().isoformat(timespec="seconds"), "variante": variante,
+                "ultima_fecha": str(ld), "costo_original": costo_orig,
+                "costo_una_pasada": costo_nuevo, "ahorro_pct": round(ahorro, 2),
+            })
+    with open(EXPLAIN_LOG, "a", encoding="utf-8") as fh:
+        for r in registros:
+            fh.write(json.dumps(r) + "\n")
+    return registros
 
 # ===============================
 # ✉️ CORREO (HTML)
 # ===============================
-def format_miles(val) -> str:
-    try:
-        return ("{:,.0f}".format(float(val))).replace(",", ".")
-    except Exception:
-        return str(val)
-
-
-def build_html_report(resumen: pd.DataFrame, fecha_min: Optional[pd.Timestamp], fecha_max: Optional[pd.Timestamp]) -> str:
+def build_html_report(resumen: pd.DataFrame, fecha_min: Optional[pd.Timestamp], fecha_max: Optional[pd.Timestamp],
+                      nota_adjuntos: Optional[str] = None) -> str:
     fecha_rango = "N/D"
     if pd.notna(fecha_min) and pd.notna(fecha_max):
         fecha_rango = f"{fecha_min.strftime('%Y-%m-%d')} a {fecha_max.strftime('%Y-%m-%d')}"
 
-    resumen_html = resumen.to_html(index=False, border=0)
-    resumen_html = resumen_html.replace(
-        '<table border="0" class="dataframe">',
-        '<table border="1" cellpadding="6" cellspacing="0" style="border-collapse:collapse;border:1px solid #cccccc;">'
-    )
-    resumen_html = resumen_html.replace(
-        '<th>',
-        '<th style="border:1px solid #cccccc;padding:6px 8px;background:#f6f8fa;text-align:center;">'
-    )
-    resumen_html = resumen_html.replace(
-        '<td>',
-        '<td style="border:1px solid #cccccc;padding:6px 8px;">'
+    # Montos con separador de miles; la clasificación del error se deja como texto
+    resumen_html = tabla_html(
+        resumen, estilo=ESTILO_REPORTE, miles=[c for c in resumen.columns if c != 'error_classification']
     )
 
     html = f"""
     <html>
     <body style="font-family: Arial, sans-serif;">
         <h2>Resumen de errores de Tarifa ({fecha_rango})</h2>
-        <p>Se adjuntan <b>dos archivos CSV</b>: detalle <b>diario</b> y detalle <b>acumulado MTD</b>.</p>
+        <p>{nota_adjuntos or "Se adjuntan <b>dos archivos CSV</b>: detalle <b>diario</b> y detalle <b>acumulado MTD</b>."}</p>
         <h3>Resumen</h3>
         {resumen_html}
         <br/>
@@ -328,10 +394,19 @@ def build_html_report(resumen: pd.DataFrame, fecha_min: Optional[pd.Timestamp],
     return html
 
 
-def send_email(subject: str, html_body: str, recipients: List[str], attachments: Optional[List[tuple]] = None) -> None:
+def send_email(subject: str, html_body: str, recipients: List[str],
+               attachments: Optional[List[tuple]] = None) -> Optional[Future]:
+    """Encola el correo; retorna el Future del envío (None si no hay destinatarios)."""
     if not recipients:
         print("[WARN] No hay destinatarios definidos, omitiendo envío de correo.")
-        return
+        return None
+
+    # Imports diferidos: el correo sólo se arma cuando hay algo que enviar
+    from email import encoders
+    from email.mime.base import MIMEBase
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    from envio_correos import encolar
 
     msg = MIMEMultipart("mixed")
     msg["From"] = MAIL_SENDER
@@ -350,11 +425,8 @@ def send_email(subject: str, html_body: str, recipients: List[str], attachments:
             part.add_header("Content-Disposition", f'attachment; filename="{filename}"')
             msg.attach(part)
 
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as srv:
-        srv.starttls()
-        srv.login(MAIL_SENDER, MAIL_PASSWORD)
-        srv.sendmail(MAIL_SENDER, recipients, msg.as_string())
-    print(f"✉️ Correo enviado a: {', '.join(recipients)}")
+    # Se encola: una sesión SMTP por lote, envío en segundo plano (ver envio_correos.py)
+    return encolar(SMTP_CONFIG, msg, recipients)
 
 # ===============================
 # 🧮 LÓGICA DE NEGOCIO
@@ -425,7 +497,8 @@ def procesar(df_liq: pd.DataFrame, df_bo: pd.DataFrame) -> Tuple[pd.DataFrame, p
     sel_cols = [
         'merchant_id','mcc_code_corrected','card_brand','category','transaction_origin','transaction_type',
         'card_present_flag','is_installment','trx_date','start_date','end_date','sales_volume','trx_count','total_fee',
-        'applied_var_fee','applied_fixed_fee','fee_card_present','fee_card_not_present', md_col,'fee_comparison','fee_difference'
+        'applied_var_fee','applied_fixed_fee','fee_card_present','fee_card_not_present', md_col,'fee_comparison','fee_difference',
+        'join_key'
     ]
     sel_cols = [c for c in sel_cols if c in df_combinado.columns]
 
@@ -457,6 +530,12 @@ def procesar(df_liq: pd.DataFrame, df_bo: pd.DataFrame) -> Tuple[pd.DataFrame, p
     df_final['error_classification'] = np.select(condiciones, categorias, default='No clasificados')
     df_final = df_final[df_final['error_classification'] != 'NO Error 6: MCC 4511 – MD particular']
 
+    resumen_fmt, resumen = resumir_errores(df_final)
+    return resumen_fmt, df_final, resumen
+
+
+def resumir_errores(df_final: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Agrupa el detalle de discrepancias por clasificación y agrega la fila TOTAL GENERAL."""
     resumen = df_final.groupby('error_classification', dropna=False).agg(
         affected_transactions=('trx_count','sum'),
         affected_sales=('sales_volume','sum'),
@@ -476,9 +555,9 @@ def procesar(df_liq: pd.DataFrame, df_bo: pd.DataFrame) -> Tuple[pd.DataFrame, p
 
     resumen_fmt = resumen.copy()
     for c in ['affected_transactions','affected_sales','total_quantified_error']:
-        resumen_fmt[c] = resumen_fmt[c].apply(format_miles)
+        resumen_fmt[c] = formato_miles(resumen_fmt[c])
 
-    return resumen_fmt, df_final, resumen
+    return resumen_fmt, resumen
 
 # ===============================
 # 🔗 COMBINAR RESÚMENES (DÍA vs MTD)
@@ -528,60 +607,497 @@ def combinar_resumenes(res_dia: pd.DataFrame, res_mtd: pd.DataFrame) -> pd.DataF
     return merged
 
 # ===============================
-# 🏁 MAIN
+# 📎 ADJUNTOS COMPRIMIDOS
 # ===============================
-def main() -> int:
+EXTENSIONES_ADJUNTO = {"csv.gz": ".csv.gz", "zip": ".zip", "parquet": ".parquet"}
+
+
+def _nueva_parte(formato: str, nombre_base: str, df: pd.DataFrame):
+    """Abre un archivo comprimido en memoria; retorna (buffer, escribir_bloque, cerrar)."""
+    buf = io.BytesIO()
+    if formato == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        writer = pq.ParquetWriter(buf, schema, compression="snappy")
+
+        def escribir(bloque: pd.DataFrame) -> None:
+            writer.write_table(pa.Table.from_pandas(bloque, schema=schema, preserve_index=False))
+
+        def cerrar() -> bytes:
+            writer.close()
+            return buf.getvalue()
+        return buf, escribir, cerrar
+
+    if formato == "csv.gz":
+        raw = gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=6)
+    elif formato == "zip":
+        zf = zipfile.ZipFile(buf, mode="w", compression=zipfile.ZIP_DEFLATED)
+        raw = zf.open(f"{nombre_base}.csv", mode="w", force_zip64=True)
+    else:
+        raise ValueError(f"Formato de adjunto no soportado: {formato}")
+    texto = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    texto.write("\ufeff")  # BOM para que Excel abra bien los acentos
+    estado = {"encabezado": True}
+
+    def escribir(bloque: pd.DataFrame) -> None:
+        bloque.to_csv(texto, index=False, header=estado["encabezado"])
+        estado["encabezado"] = False
+        texto.flush()
+
+    def cerrar() -> bytes:
+        texto.close()  # cierra también el stream gzip / la entrada del zip
+        if formato == "zip":
+            zf.close()
+        return buf.getvalue()
+    return buf, escribir, cerrar
+
+
+def serializar_adjunto(df: pd.DataFrame, nombre_base: str, formato: str = ATTACHMENT_FORMAT,
+                       max_bytes: Optional[int] = ATTACHMENT_MAX_BYTES,
+                       chunk_rows: int = ATTACHMENT_CHUNK_ROWS) -> List[Tuple[str, bytes]]:
+    """Serializa `df` por bloques en formato comprimido, sin armar el CSV completo en memoria.
+
+    Si una parte se acerca a `max_bytes` se cierra y se abre la siguiente, de modo que cada
+    archivo resultante (…_parte1, …_parte2) quede bajo el tope de forma aproximada.
+    """
+    ext = EXTENSIONES_ADJUNTO[formato]
+    partes: List[bytes] = []
+    buf = escribir = cerrar = None
+    tam_bloque = 0
+    n = len(df)
+    for inicio in range(0, max(n, 1), chunk_rows):
+        if buf is None:
+            buf, escribir, cerrar = _nueva_parte(formato, nombre_base, df)
+        antes = buf.tell()
+        escribir(df.iloc[inicio:inicio + chunk_rows])
+        tam_bloque = max(tam_bloque, buf.tell() - antes)
+        quedan = inicio + chunk_rows < n
+        if max_bytes and quedan and buf.tell() + tam_bloque > max_bytes:
+            partes.append(cerrar())
+            buf = None
+    if buf is not None:
+        partes.append(cerrar())
+
+    if len(partes) == 1:
+        return [(f"{nombre_base}{ext}", partes[0])]
+    return [(f"{nombre_base}_parte{i}{ext}", p) for i, p in enumerate(partes, start=1)]
+
+
+def derramar_adjunto(filename: str, content: bytes, destino: str = ATTACHMENT_SPILL_PATH) -> str:
+    """Guarda un adjunto demasiado grande en S3 (URL prefirmada) o en carpeta local; retorna el enlace."""
+    if destino.startswith("s3://"):
+        bucket, prefix = parse_s3_url(destino)
+        key = f"{prefix}{filename}"
+        cliente_s3().put_object(Bucket=bucket, Key=key, Body=content)
+        return cliente_s3().generate_presigned_url(
+            "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=ATTACHMENT_LINK_EXPIRATION
+        )
+    os.makedirs(destino, exist_ok=True)
+    path = os.path.abspath(os.path.join(destino, filename))
+    with open(path, "wb") as fh:
+        fh.write(content)
+    return f"file://{path}"
+
+
+def agrupar_por_tope(adjuntos: List[Tuple[str, bytes]], max_bytes: int) -> List[List[Tuple[str, bytes]]]:
+    """Agrupa los adjuntos en lotes (uno por correo) cuyo tamaño total no supere `max_bytes`."""
+    lotes: List[List[Tuple[str, bytes]]] = [[]]
+    tam = 0
+    for adj in adjuntos:
+        if lotes[-1] and tam + len(adj[1]) > max_bytes:
+            lotes.append([])
+            tam = 0
+        lotes[-1].append(adj)
+        tam += len(adj[1])
+    return lotes
+
+# ===============================
+# 📤 BO Y REPORTE
+# ===============================
+def cargar_bo(s3_input: str) -> Tuple[pd.DataFrame, str]:
+    """Lee y prepara la BO más reciente del prefijo; retorna (df_bo, key)."""
+    bucket, prefix = parse_s3_url(s3_input)
+    key = get_latest_object(bucket, prefix, suffixes=(".csv",".CSV"))
+    if not key:
+        raise FileNotFoundError(f"No se encontró CSV en s3://{bucket}/{prefix}")
+    print(f"BO encontrada: s3://{bucket}/{key}")
+    df_bo_raw = read_csv_from_s3(bucket, key)
+    df_bo = preparar_bo(df_bo_raw)
+    print(f"BO OK – filas: {len(df_bo)}")
+    return df_bo, key
+
+
+def enviar_reporte(df_final_dia: pd.DataFrame, df_final_mtd: pd.DataFrame,
+                   resumen_raw_dia: pd.DataFrame, resumen_raw_mtd: pd.DataFrame,
+                   recipients: List[str] = MAIL_RECIPIENTS, cartera: Optional[str] = None) -> None:
+    """Arma el resumen combinado Día/MTD, adjunta los detalles comprimidos y envía el correo.
+
+    Espera la entrega de todas las partes: si alguna falla propaga el error del envío.
+    """
+    resumen_comb = combinar_resumenes(resumen_raw_dia, resumen_raw_mtd)
+
+    if not df_final_mtd.empty:
+        fecha_min = pd.to_datetime(df_final_mtd['trx_date']).min()
+        fecha_max = pd.to_datetime(df_final_mtd['trx_date']).max()
+    elif not df_final_dia.empty:
+        fecha_min = fecha_max = pd.to_datetime(df_final_dia['trx_date']).max()
+    else:
+        fecha_min = fecha_max = None
+
+    subject = f"Validación de Tarifas – Resumen de errores ({datetime.now().strftime('%Y-%m-%d')})"
+    sufijo = f"{cartera}_" if cartera else ""
+    if cartera:
+        subject = f"{subject} – {cartera}"
+
+    t0 = time.perf_counter()
+    fecha_archivo = datetime.now().strftime('%Y%m%d')
+    adjuntos: List[Tuple[str, bytes]] = []
+    for etiqueta, df in (("diario", df_final_dia), ("MTD", df_final_mtd)):
+        # join_key sólo se conserva en el detalle para la re-validación incremental
+        adjuntos.extend(serializar_adjunto(
+            df.drop(columns=['join_key'], errors='ignore'),
+            f"detalles_validacion_tarifas_{etiqueta}_{sufijo}{fecha_archivo}",
+        ))
+    total_bytes = sum(len(c) for _, c in adjuntos)
+
+    lotes = [adjuntos]
+    nota = (f"Se adjunta el detalle <b>diario</b> y el <b>acumulado MTD</b> "
+            f"({ATTACHMENT_FORMAT}, {total_bytes / 1e6:.1f} MB).")
+    if total_bytes > ATTACHMENT_MAX_BYTES and ATTACHMENT_OVERFLOW == "spill":
+        enlaces = [(fn, derramar_adjunto(fn, c)) for fn, c in adjuntos]
+        lotes = [[]]
+        items = "".join(f'<li><a href="{url}">{fn}</a></li>' for fn, url in enlaces)
+        nota = (f"El detalle ({total_bytes / 1e6:.1f} MB) supera el tope de adjuntos; "
+                f"puede descargarse aquí:<ul>{items}</ul>")
+    elif total_bytes > ATTACHMENT_MAX_BYTES:
+        lotes = agrupar_por_tope(adjuntos, ATTACHMENT_MAX_BYTES)
+        nota += f" Por tamaño, los archivos se envían en {len(lotes)} correos."
+
+    html = build_html_report(resumen_comb, fecha_min, fecha_max, nota_adjuntos=nota)
+    t_armado = time.perf_counter() - t0
+    metricas.observar("correo_armado_segundos", t_armado, correo="tarifas")
+
+    t0 = time.perf_counter()
+    futuros = [send_email(subject, html, recipients, attachments=lotes[0])]
+    for i, lote in enumerate(lotes[1:], start=2):
+        html_parte = f"<html><body><p>Adjuntos del reporte ({i}/{len(lotes)}).</p></body></html>"
+        futuros.append(send_email(f"{subject} (adjuntos {i}/{len(lotes)})", html_parte, recipients, attachments=lote))
+    t_encolado = time.perf_counter() - t0
+    # El reporte sólo cuenta como enviado (y la caché sólo se guarda) si salieron todas las partes
+    latencias = [fut.result()["latencia_s"] for fut in futuros if fut is not None]
+    print(f"📎 Adjuntos: {len(adjuntos)} archivos, {total_bytes / 1e6:.2f} MB ({ATTACHMENT_FORMAT}) "
+          f"– armado {t_armado:.2f}s | encolado {t_encolado:.2f}s | entrega {max(latencias, default=0.0):.2f}s")
+
+
+# ===============================
+# ♻️ RE-VALIDACIÓN INCREMENTAL
+# ===============================
+CACHE_TABLAS = ("liq_dia", "liq_mtd", "bo", "detalle_dia", "detalle_mtd")
+
+
+def guardar_cache(tablas: dict, bo_key: str) -> None:
+    """Persiste liquidaciones, BO aplicada y detalle de discrepancias para re-validar sin Redshift."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    for nombre in CACHE_TABLAS:
+        tablas[nombre].to_pickle(os.path.join(CACHE_DIR, f"{nombre}.pkl"))
+    meta = {"bo_key": bo_key, "fecha": datetime.now().strftime("%Y-%m-%d")}
+    with open(os.path.join(CACHE_DIR, "meta.json"), "w", encoding="utf-8") as fh:
+        json.dump(meta, fh)
+
+
+def cargar_cache() -> Optional[dict]:
+    """Retorna la caché de la última ejecución, o None si no existe o es de otro día."""
+    meta_path = os.path.join(CACHE_DIR, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, encoding="utf-8") as fh:
+        meta = json.load(fh)
+    # Las liquidaciones en caché sólo sirven mientras no llegue un nuevo día de settlement
+    if meta.get("fecha") != datetime.now().strftime("%Y-%m-%d"):
+        return None
+    cache = {"meta": meta}
+    for nombre in CACHE_TABLAS:
+        path = os.path.join(CACHE_DIR, f"{nombre}.pkl")
+        if not os.path.exists(path):
+            return None
+        cache[nombre] = pd.read_pickle(path)
+    return cache
+
+
+def claves_bo_modificadas(bo_prev: pd.DataFrame, bo_new: pd.DataFrame) -> set:
+    """Compara dos versiones de la BO por clave y vigencia; retorna las `join_key` que cambiaron."""
+    cols = ['join_key', 'start_date', 'end_date', 'fee_card_present', 'fee_card_not_present']
+    comp = pd.merge(
+        bo_prev[cols].drop_duplicates(), bo_new[cols].drop_duplicates(),
+        on=cols, how='outer', indicator=True
+    )
+    return set(comp.loc[comp['_merge'] != 'both', 'join_key'])
+
+
+def parchar_detalle(detalle_prev: pd.DataFrame, df_liq: pd.DataFrame, df_bo: pd.DataFrame, claves: set) -> pd.DataFrame:
+    """Re-procesa sólo las liquidaciones de `claves` y reemplaza su parte del detalle previo."""
+    conservado = detalle_prev[~detalle_prev['join_key'].isin(claves)]
+    _, nuevo, _ = procesar(df_liq[df_liq['join_key'].isin(claves)], df_bo)
+    return pd.concat([conservado, nuevo], ignore_index=True)
+
+
+def revalidar_incremental() -> bool:
+    """Re-valida contra la BO más reciente usando la caché. Retorna False si se requiere corrida completa."""
+    cache = cargar_cache()
+    if cache is None:
+        print("[WARN] Sin caché vigente; se ejecuta la validación completa.")
+        return False
+
+    df_bo, key = cargar_bo(S3_INPUT)
+    claves = claves_bo_modificadas(cache["bo"], df_bo)
+    if not claves:
+        print(f"BO sin cambios respecto a la aplicada ({cache['meta']['bo_key']}); nada que re-validar.")
+        return True
+    print(f"♻️ BO modificada – {len(claves)} join_key a re-procesar")
+
+    df_final_dia = parchar_detalle(cache["detalle_dia"], cache["liq_dia"], df_bo, claves)
+    df_final_mtd = parchar_detalle(cache["detalle_mtd"], cache["liq_mtd"], df_bo, claves)
+    _, resumen_raw_dia = resumir_errores(df_final_dia)
+    _, resumen_raw_mtd = resumir_errores(df_final_mtd)
+    print(f"Discrepancias día: {len(df_final_dia)} filas | MTD: {len(df_final_mtd)} filas")
+
+    enviar_reporte(df_final_dia, df_final_mtd, resumen_raw_dia, resumen_raw_mtd)
+    guardar_cache({
+        "liq_dia": cache["liq_dia"], "liq_mtd": cache["liq_mtd"], "bo": df_bo,
+        "detalle_dia": df_final_dia, "detalle_mtd": df_final_mtd,
+    }, key)
+    return True
+
+# ===============================
+# 🗂️ MODO BATCH (VARIAS CARTERAS)
+# ===============================
+def cargar_carteras(path: str) -> List[dict]:
+    """Lee definiciones de cartera desde JSON (lista de objetos como PORTFOLIOS)."""
+    with open(path, encoding="utf-8") as fh:
+        carteras = json.load(fh)
+    for c in carteras:
+        faltantes = {"nombre", "alcance", "s3_input", "destinatarios"} - set(c)
+        if faltantes:
+            raise ValueError(f"Cartera sin campos requeridos: {faltantes}")
+    return carteras
+
+
+def procesar_cartera(df_liq: pd.DataFrame, df_liq_mtd: pd.DataFrame, df_bo: pd.DataFrame) -> Tuple[pd.DataFrame, ...]:
+    """Procesa Día y MTD de una cartera; se ejecuta en un proceso del pool."""
+    _, df_final_dia, resumen_raw_dia = procesar(df_liq, df_bo)
+    _, df_final_mtd, resumen_raw_mtd = procesar(df_liq_mtd, df_bo)
+    return df_final_dia, df_final_mtd, resumen_raw_dia, resumen_raw_mtd
+
+
+def _validar_carteras(carteras: List[dict], workers: int) -> List[tuple]:
+    """Extrae una vez para la unión de comercios y reporta por cartera; retorna las carteras fallidas."""
+    filas = alcance_por_grupo({c["nombre"]: c["alcance"] for c in carteras})
+    consultas, params = consultas_dia_mtd()
+    df_liq, df_liq_mtd = consultar_con_alcance(
+        DB_CONFIG, consultas, filas, params=params, conexiones=SCOPE_CONNECTIONS,
+        nombres=NOMBRES_DIA_MTD
+    )
+    print(f"SQL OK – filas día: {len(df_liq)} | filas MTD: {len(df_liq_mtd)} | alcance: {len(filas)} filas")
+
+    fallidas = []
+    futuros = {}
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(carteras)))) as pool:
+        for c in carteras:
+            try:
+                df_bo, _ = cargar_bo(c["s3_input"])
+            except Exception:
+                print(f"[ERROR] Cartera {c['nombre']}: no se pudo leer la BO")
+                fallidas.append((c, traceback.format_exc()))
+                continue
+            futuros[c["nombre"]] = (c, pool.submit(
+                procesar_cartera,
+                df_liq[df_liq['grupo_alcance'] == c["nombre"]],
+                df_liq_mtd[df_liq_mtd['grupo_alcance'] == c["nombre"]],
+                df_bo,
+            ))
+
+        for nombre, (c, fut) in futuros.items():
+            try:
+                df_final_dia, df_final_mtd, resumen_raw_dia, resumen_raw_mtd = fut.result()
+                print(f"[{nombre}] Discrepancias día: {len(df_final_dia)} filas | MTD: {len(df_final_mtd)} filas")
+                enviar_reporte(df_final_dia, df_final_mtd, resumen_raw_dia, resumen_raw_mtd,
+                               recipients=c["destinatarios"], cartera=nombre)
+            except Exception:
+                print(f"[ERROR] Cartera {nombre}: falló el procesamiento")
+                fallidas.append((c, traceback.format_exc()))
+    return fallidas
+
+
+@perfilado.perfilar("validador_tarifas_batch")
+def main_batch(carteras_path: Optional[str] = None, workers: int = BATCH_WORKERS) -> int:
+    """Modo batch: PORTFOLIOS (o el JSON indicado). Retorna 1 si alguna cartera falla."""
     start_ts = datetime.now()
-    print(f"🚀 Inicio: {start_ts}")
+    print(f"🚀 Inicio batch: {start_ts}")
     try:
-        conn = connect_redshift()
+        carteras = cargar_carteras(carteras_path) if carteras_path else PORTFOLIOS
+        fallidas = _validar_carteras(carteras, workers)
+    except Exception:
+        print("[ERROR] Falló la ejecución batch:")
+        tb = traceback.format_exc()
+        print(tb)
         try:
-            df_liq = pd.read_sql(RED_SHIFT_QUERY, conn)
-            df_liq_mtd = pd.read_sql(RED_SHIFT_QUERY_MTD, conn)
-        finally:
-            conn.close()
-        print(f"SQL OK – filas día: {len(df_liq)} | filas MTD: {len(df_liq_mtd)}")
+            html_err = f"<html><body><h3>Fallo en Validación de Tarifas (batch)</h3><pre>{tb}</pre></body></html>"
+            send_email("[ERROR] Proceso de Validación de Tarifas (batch)", html_err, MAIL_RECIPIENTS)
+        except Exception as mail_err:
+            print(f"No se pudo enviar el correo de error: {mail_err}")
+        return 1
 
-        bucket, prefix = parse_s3_url(S3_INPUT)
-        key = get_latest_object(bucket, prefix, suffixes=(".csv",".CSV"))
-        if not key:
-            raise FileNotFoundError(f"No se encontró CSV en s3://{bucket}/{prefix}")
-        print(f"BO encontrada: s3://{bucket}/{key}")
-        df_bo_raw = read_csv_from_s3(bucket, key)
-        df_bo = preparar_bo(df_bo_raw)
-        print(f"BO OK – filas: {len(df_bo)}")
-
-        resumen_fmt_dia, df_final_dia, resumen_raw_dia = procesar(df_liq, df_bo)
-        resumen_fmt_mtd, df_final_mtd, resumen_raw_mtd = procesar(df_liq_mtd, df_bo)
-        print(f"Discrepancias día: {len(df_final_dia)} filas | MTD: {len(df_final_mtd)} filas")
+    for c, tb in fallidas:
+        print(tb)
+        try:
+            html_err = f"<html><body><h3>Fallo en Validación de Tarifas – {c['nombre']}</h3><pre>{tb}</pre></body></html>"
+            send_email(f"[ERROR] Proceso de Validación de Tarifas – {c['nombre']}", html_err, c["destinatarios"])
+        except Exception as mail_err:
+            print(f"No se pudo enviar el correo de error: {mail_err}")
+
+    print(f"⏱️ Fin batch en {datetime.now() - start_ts} – {len(carteras) - len(fallidas)}/{len(carteras)} carteras OK")
+    return 1 if fallidas else 0
+
+# ===============================
+# 🕰️ BACKFILL HISTÓRICO
+# ===============================
+def unidades_backfill(desde: date, hasta: date, granularidad: str = "mes") -> List[Tuple[str, date, date]]:
+    """Divide [desde, hasta] en unidades diarias o mensuales: (etiqueta, inicio, fin) inclusivos.
 
-        resumen_comb = combinar_resumenes(resumen_raw_dia, resumen_raw_mtd)
-        resumen_comb_fmt = resumen_comb.copy()
-        for c in resumen_comb_fmt.columns:
-            if c != 'error_classification':
-                resumen_comb_fmt[c] = resumen_comb_fmt[c].apply(format_miles)
-
-        if not df_final_mtd.empty:
-            fecha_min = pd.to_datetime(df_final_mtd['trx_date']).min()
-            fecha_max = pd.to_datetime(df_final_mtd['trx_date']).max()
-        elif not df_final_dia.empty:
-            fecha_min = fecha_max = pd.to_datetime(df_final_dia['trx_date']).max()
+    Solo los meses completos usan la etiqueta "YYYY-MM"; los parciales de los extremos
+    se etiquetan "YYYY-MM-DD_YYYY-MM-DD" y se guardan en su propia partición.
+    """
+    if granularidad not in ("dia", "mes"):
+        raise ValueError("granularidad debe ser 'dia' o 'mes'")
+    unidades = []
+    actual = desde
+    while actual <= hasta:
+        if granularidad == "dia":
+            fin = actual
+            etiqueta = actual.strftime("%Y-%m-%d")
         else:
-            fecha_min = fecha_max = None
+            siguiente = (actual.replace(day=1) + timedelta(days=32)).replace(day=1)
+            fin = min(siguiente - timedelta(days=1), hasta)
+            if actual.day == 1 and fin == siguiente - timedelta(days=1):
+                etiqueta = actual.strftime("%Y-%m")
+            else:
+                # Mes parcial: la etiqueta lleva los límites reales para que un backfill
+                # posterior del mes completo no lo dé por hecho
+                etiqueta = f"{actual:%Y-%m-%d}_{fin:%Y-%m-%d}"
+        unidades.append((etiqueta, actual, fin))
+        actual = fin + timedelta(days=1)
+    return unidades
+
+
+def ruta_unidad(etiqueta: str) -> str:
+    return os.path.join(BACKFILL_DIR, f"unidad={etiqueta}")
+
+
+def unidad_completa(etiqueta: str) -> bool:
+    return os.path.exists(os.path.join(ruta_unidad(etiqueta), "_SUCCESS"))
+
+
+def procesar_unidad(etiqueta: str, desde: date, hasta: date, df_bo: pd.DataFrame) -> int:
+    """Extrae y procesa una unidad; escribe detalle y resumen en Parquet y marca _SUCCESS al final."""
+    sql, params = construir_query_tarifas("rango", desde=desde, hasta=hasta)
+    df_liq = consultar_con_alcance(DB_CONFIG, [sql], MERCHANT_SCOPE, params=params, nombres=["tarifas_rango"])[0]
+    _, df_final, resumen = procesar(df_liq, df_bo)
+
+    ruta = ruta_unidad(etiqueta)
+    os.makedirs(ruta, exist_ok=True)
+    # Se escribe a un temporal y se renombra para no dejar archivos a medias si se interrumpe
+    for nombre, df in (("detalle", df_final), ("resumen", resumen)):
+        tmp = os.path.join(ruta, f"{nombre}.parquet.tmp")
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, os.path.join(ruta, f"{nombre}.parquet"))
+    with open(os.path.join(ruta, "_SUCCESS"), "w", encoding="utf-8") as fh:
+        fh.write(datetime.now().isoformat())
+    return len(df_final)
+
+
+def resumen_acumulado(etiquetas: List[str]) -> pd.DataFrame:
+    """Suma los resúmenes de las unidades completadas y recalcula TOTAL GENERAL."""
+    partes = [
+        pd.read_parquet(os.path.join(ruta_unidad(e), "resumen.parquet"))
+        for e in etiquetas if unidad_completa(e)
+    ]
+    cols = ['affected_transactions', 'affected_sales', 'total_quantified_error']
+    if not partes:
+        return pd.DataFrame(columns=['error_classification'] + cols)
+    todo = pd.concat(partes, ignore_index=True)
+    todo = todo[todo['error_classification'] != 'TOTAL GENERAL']
+    resumen = todo.groupby('error_classification', dropna=False)[cols].sum().reset_index()
+    resumen = resumen.sort_values('total_quantified_error', ascending=False)
+    tot = {'error_classification': 'TOTAL GENERAL', **{c: resumen[c].sum() for c in cols}}
+    return pd.concat([resumen, pd.DataFrame([tot])], ignore_index=True)
+
+
+@perfilado.perfilar("validador_tarifas_backfill")
+def main_backfill(desde: date, hasta: date, granularidad: str = "mes", workers: int = BACKFILL_WORKERS) -> int:
+    """Backfill de [desde, hasta] con concurrencia acotada. Retorna 1 si alguna unidad falla."""
+    start_ts = datetime.now()
+    unidades = unidades_backfill(desde, hasta, granularidad)
+    pendientes = [u for u in unidades if not unidad_completa(u[0])]
+    print(f"🚀 Inicio backfill {desde} → {hasta}: {len(unidades)} unidades, {len(pendientes)} pendientes")
+
+    df_bo, _ = cargar_bo(S3_INPUT)
+    fallidas = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futuros = {pool.submit(procesar_unidad, e, d, h, df_bo): e for e, d, h in pendientes}
+        for fut in as_completed(futuros):
+            etiqueta = futuros[fut]
+            try:
+                print(f"✓ Unidad {etiqueta}: {fut.result()} filas con discrepancia")
+            except Exception:
+                print(f"[ERROR] Unidad {etiqueta} falló:")
+                print(traceback.format_exc())
+                fallidas.append(etiqueta)
+
+    resumen = resumen_acumulado([u[0] for u in unidades])
+    path = os.path.join(BACKFILL_DIR, f"resumen_acumulado_{desde:%Y%m%d}_{hasta:%Y%m%d}.csv")
+    os.makedirs(BACKFILL_DIR, exist_ok=True)
+    resumen.to_csv(path, index=False)
+    print(f"Resumen acumulado: {path}")
+    print(f"⏱️ Fin backfill en {datetime.now() - start_ts} – {len(fallidas)} unidades fallidas")
+    return 1 if fallidas else 0
 
-        html = build_html_report(resumen_comb_fmt, fecha_min, fecha_max)
-        subject = f"Validación de Tarifas – Resumen de errores ({datetime.now().strftime('%Y-%m-%d')})"
+# ===============================
+# 🏁 MAIN
+# ===============================
+@perfilado.perfilar("validador_tarifas")
+def main(incremental: bool = False) -> int:
+    start_ts = datetime.now()
+    print(f"🚀 Inicio: {start_ts}")
+    try:
+        if incremental and revalidar_incremental():
+            print(f"⏱️ Fin OK (incremental) en {datetime.now() - start_ts}")
+            return 0
+
+        with perfilado.etapa("consultas"):
+            consultas, params = consultas_dia_mtd()
+            df_liq, df_liq_mtd = consultar_con_alcance(
+                DB_CONFIG, consultas, MERCHANT_SCOPE, params=params, conexiones=SCOPE_CONNECTIONS,
+                nombres=NOMBRES_DIA_MTD
+            )
+        print(f"SQL OK – filas día: {len(df_liq)} | filas MTD: {len(df_liq_mtd)}")
 
-        csv_name_dia = f"detalles_validacion_tarifas_diario_{datetime.now().strftime('%Y%m%d')}.csv"
-        csv_text_dia = df_final_dia.to_csv(index=False)
-        csv_bytes_dia = ("\ufeff" + csv_text_dia).encode("utf-8")
+        with perfilado.etapa("bo"):
+            df_bo, key = cargar_bo(S3_INPUT)
 
-        csv_name_mtd = f"detalles_validacion_tarifas_MTD_{datetime.now().strftime('%Y%m%d')}.csv"
-        csv_text_mtd = df_final_mtd.to_csv(index=False)
-        csv_bytes_mtd = ("\ufeff" + csv_text_mtd).encode("utf-8")
+        with perfilado.etapa("procesar_dia"):
+            resumen_fmt_dia, df_final_dia, resumen_raw_dia = procesar(df_liq, df_bo)
+        with perfilado.etapa("procesar_mtd"):
+            resumen_fmt_mtd, df_final_mtd, resumen_raw_mtd = procesar(df_liq_mtd, df_bo)
+        print(f"Discrepancias día: {len(df_final_dia)} filas | MTD: {len(df_final_mtd)} filas")
 
-        attachments = [(csv_name_dia, csv_bytes_dia), (csv_name_mtd, csv_bytes_mtd)]
-        send_email(subject, html, MAIL_RECIPIENTS, attachments=attachments)
+        with perfilado.etapa("reporte"):
+            enviar_reporte(df_final_dia, df_final_mtd, resumen_raw_dia, resumen_raw_mtd)
+        with perfilado.etapa("cache"):
+            guardar_cache({
+                "liq_dia": df_liq, "liq_mtd": df_liq_mtd, "bo": df_bo,
+                "detalle_dia": df_final_dia, "detalle_mtd": df_final_mtd,
+            }, key)
 
         print(f"⏱️ Fin OK en {datetime.now() - start_ts}")
         return 0
@@ -598,4 +1114,34 @@ def main() -> int:
         return 1
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Validador de tarifas (BO vs liquidaciones Redshift)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Re-procesa sólo las join_key cambiadas en la BO usando la caché local")
+    parser.add_argument("--batch", action="store_true",
+                        help="Valida todas las carteras de PORTFOLIOS (o de --carteras) en una sola corrida")
+    parser.add_argument("--carteras", metavar="JSON",
+                        help="Archivo JSON con definiciones de cartera para --batch")
+    parser.add_argument("--backfill", action="store_true",
+                        help="Re-valida el rango --desde/--hasta por unidades (Parquet en BACKFILL_DIR)")
+    parser.add_argument("--desde", type=date.fromisoformat, help="Fecha inicial del backfill (AAAA-MM-DD)")
+    parser.add_argument("--hasta", type=date.fromisoformat, help="Fecha final del backfill (AAAA-MM-DD)")
+    parser.add_argument("--granularidad", choices=("dia", "mes"), default="mes",
+                        help="Tamaño de cada unidad del backfill")
+    parser.add_argument("--workers", type=int,
+                        help=f"Unidades del backfill (por defecto {BACKFILL_WORKERS}) o carteras del batch "
+                             f"(por defecto {BATCH_WORKERS}) procesadas en paralelo")
+    parser.add_argument("--explain", action="store_true",
+                        help="Registra costos EXPLAIN de la query de una pasada vs la original y termina")
+    args = parser.parse_args()
+    if args.explain:
+        registrar_costos_explain()
+        sys.exit(0)
+    if args.backfill:
+        if not (args.desde and args.hasta):
+            parser.error("--backfill requiere --desde y --hasta")
+        sys.exit(main_backfill(args.desde, args.hasta, args.granularidad, args.workers or BACKFILL_WORKERS))
+    if args.batch or args.carteras:
+        sys.exit(main_batch(args.carteras, args.workers or BATCH_WORKERS))
+    if args.workers:
+        parser.error("--workers sólo aplica a --backfill y --batch")
+    sys.exit(main(incremental=args.incremental))
@@ -0,0 +1,232 @@
+# El objetivo de este módulo es centralizar el acceso a Redshift de todos los scripts:
+# un pool de conexiones por credencial (varias revisiones en un mismo proceso reutilizan la sesión
+# en vez de repetir TLS + autenticación), timeout y cancelación por consulta, lectura por bloques
+# con cursor del lado del servidor y hooks de tiempo por consulta.
+# Con GRABACION=grabar|reproducir las consultas se graban en fixtures o se leen de ellos (ver grabacion.py).
+# -*- coding: utf-8 -*-
+# ═════════════════════════════════════════════════════════════════════════════
+# 1) IMPORTS Y CONFIGURACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+import os
+import time
+import uuid
+import atexit
+import threading
+import psycopg2
+import pandas as pd
+from contextlib import contextmanager
+from psycopg2 import pool as pg_pool
+from typing import Callable, Dict, Iterator, List, Optional
+from plan_consultas import ejecutar_consulta
+import grabacion
+import metricas
+
+# -- Tamaño máximo del pool por credencial y timeout por defecto de cada consulta (0 = sin límite)
+POOL_MAX_CONEXIONES = int(os.environ.get("DB_POOL_MAX", "8"))
+# Espera máxima por una conexión libre cuando el pool está completo (0 = sin límite)
+ESPERA_CONEXION_S = float(os.environ.get("DB_POOL_ESPERA_S", "300"))
+TIMEOUT_CONSULTA_S = float(os.environ.get("DB_TIMEOUT_CONSULTA_S", "0"))
+# Filas por bloque en la lectura con cursor del servidor
+TAMANO_BLOQUE = 50_000
+
+_pools: Dict[tuple, pg_pool.ThreadedConnectionPool] = {}
+# Un cupo por conexión del pool: getconn lanza PoolError al agotarse, así que se espera antes
+_cupos: Dict[tuple, threading.BoundedSemaphore] = {}
+_pools_lock = threading.Lock()
+_en_curso: Dict[int, object] = {}
+_en_curso_lock = threading.Lock()
+_hooks: List[Callable] = []
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2) POOL DE CONEXIONES
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _clave(cfg: Dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in cfg.items()))
+
+
+def obtener_pool(cfg: Dict) -> pg_pool.ThreadedConnectionPool:
+    """Retorna (creándolo la primera vez) el pool asociado a las credenciales `cfg`."""
+    clave = _clave(cfg)
+    with _pools_lock:
+        if clave not in _pools:
+            try:
+                _pools[clave] = pg_pool.ThreadedConnectionPool(1, POOL_MAX_CONEXIONES, **cfg)
+            except psycopg2.OperationalError as e:
+                print(f"❌ No se pudo conectar a {cfg.get('host')}: {getattr(e, 'pgerror', None) or e}")
+                raise
+            _cupos[clave] = threading.BoundedSemaphore(POOL_MAX_CONEXIONES)
+            print(f"✓ Pool de conexiones a {cfg.get('host')} listo (máx. {POOL_MAX_CONEXIONES})")
+        return _pools[clave]
+
+
+@contextmanager
+def conexion(cfg: Dict) -> Iterator[psycopg2.extensions.connection]:
+    """Presta una conexión del pool; al salir hace rollback de lo no confirmado y la devuelve.
+
+    Con el pool completo espera hasta ESPERA_CONEXION_S a que se libere una (luego PoolError).
+    Si la conexión quedó rota (error de red, cancelación fallida) se descarta en vez de reutilizarse.
+    Al reproducir fixtures entrega una conexión falsa sin red.
+    """
+    if grabacion.reproduciendo():
+        yield grabacion.conexion_reproduccion()
+        return
+    pool = obtener_pool(cfg)
+    cupo = _cupos[_clave(cfg)]
+    if not cupo.acquire(timeout=ESPERA_CONEXION_S or None):
+        raise pg_pool.PoolError(
+            f"Sin conexiones libres a {cfg.get('host')} tras {ESPERA_CONEXION_S:g}s "
+            f"(DB_POOL_MAX={POOL_MAX_CONEXIONES}, DB_POOL_ESPERA_S)"
+        )
+    try:
+        conn = pool.getconn()
+        if conn.closed:
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+    except BaseException:
+        cupo.release()
+        raise
+    descartar = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        descartar = True
+        raise
+    finally:
+        try:
+            if not conn.closed and not descartar:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    descartar = True
+            pool.putconn(conn, close=descartar or bool(conn.closed))
+        finally:
+            cupo.release()
+
+
+def cerrar_pools() -> None:
+    """Cierra todas las conexiones abiertas (se llama solo al terminar el proceso)."""
+    with _pools_lock:
+        for p in _pools.values():
+            p.closeall()
+        _pools.clear()
+        _cupos.clear()
+
+
+atexit.register(cerrar_pools)
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 3) HOOKS, TIMEOUT Y CANCELACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+
+def registrar_hook(fn: Callable) -> None:
+    """Registra `fn(nombre, duracion_s, filas, error)`; se llama al terminar cada consulta."""
+    _hooks.append(fn)
+
+
+def _notificar(nombre: Optional[str], duracion: float, filas: int, error: Optional[BaseException]) -> None:
+    for fn in _hooks:
+        try:
+            fn(nombre, duracion, filas, error)
+        except Exception as e:
+            print(f"[WARN] Hook de consulta falló: {e}")
+
+
+# Latencia y filas por consulta para Prometheus (ver metricas.py)
+registrar_hook(metricas.al_consultar)
+
+
+def cancelar(conn) -> None:
+    """Cancela la consulta en curso de `conn` (seguro de llamar desde otro hilo)."""
+    try:
+        conn.cancel()
+    except psycopg2.Error as e:
+        print(f"[WARN] No se pudo cancelar la consulta: {e}")
+
+
+def cancelar_todo() -> int:
+    """Cancela todas las consultas en curso del proceso; retorna cuántas se cancelaron."""
+    with _en_curso_lock:
+        conns = list(_en_curso.values())
+    for conn in conns:
+        cancelar(conn)
+    return len(conns)
+
+
+@contextmanager
+def _vigilar(conn, timeout_s: Optional[float]):
+    """Registra la consulta como en curso y la cancela si excede `timeout_s`."""
+    timer = None
+    if timeout_s:
+        timer = threading.Timer(timeout_s, cancelar, args=(conn,))
+        timer.daemon = True
+        timer.start()
+    with _en_curso_lock:
+        _en_curso[id(conn)] = conn
+    try:
+        yield
+    finally:
+        if timer:
+            timer.cancel()
+        with _en_curso_lock:
+            _en_curso.pop(id(conn), None)
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 4) CONSULTAS
+# ═════════════════════════════════════════════════════════════════════════════
+
+def consultar_df(conn, sql: str, params: Optional[dict] = None, nombre: Optional[str] = None,
+                 timeout_s: Optional[float] = None) -> pd.DataFrame:
+    """Ejecuta `sql` y retorna un DataFrame, con timeout, captura de plan (si `nombre`) y hooks."""
+    timeout_s = timeout_s if timeout_s is not None else TIMEOUT_CONSULTA_S
+    t0 = time.perf_counter()
+    try:
+        with _vigilar(conn, timeout_s):
+            df = grabacion.consulta(sql, params, nombre, lambda: ejecutar_consulta(conn, nombre, sql, params=params))
+    except psycopg2.extensions.QueryCanceledError as e:
+        _notificar(nombre, time.perf_counter() - t0, 0, e)
+        raise TimeoutError(f"Consulta '{nombre or 'sin nombre'}' cancelada tras {timeout_s}s") from e
+    except Exception as e:
+        _notificar(nombre, time.perf_counter() - t0, 0, e)
+        raise
+    _notificar(nombre, time.perf_counter() - t0, len(df), None)
+    return df
+
+
+def consultar_por_bloques(conn, sql: str, params: Optional[dict] = None, nombre: Optional[str] = None,
+                          tamano: int = TAMANO_BLOQUE, timeout_s: Optional[float] = None) -> Iterator[pd.DataFrame]:
+    """Lee `sql` con un cursor del servidor y entrega DataFrames de hasta `tamano` filas.
+
+    Evita traer todo el resultado a memoria de una vez; el timeout aplica a la lectura completa.
+    """
+    timeout_s = timeout_s if timeout_s is not None else TIMEOUT_CONSULTA_S
+    t0 = time.perf_counter()
+    filas = 0
+    cur = conn.cursor(name=f"cur_{uuid.uuid4().hex[:12]}")
+    cur.itersize = tamano
+
+    def leer() -> Iterator[pd.DataFrame]:
+        cur.execute(sql, params)
+        while True:
+            bloque = cur.fetchmany(tamano)
+            if not bloque:
+                break
+            yield pd.DataFrame(bloque, columns=[d[0] for d in cur.description])
+
+    try:
+        with _vigilar(conn, timeout_s):
+            for df in grabacion.consulta_por_bloques(sql, params, nombre, tamano, leer):
+                filas += len(df)
+                yield df
+    except psycopg2.extensions.QueryCanceledError as e:
+        _notificar(nombre, time.perf_counter() - t0, filas, e)
+        raise TimeoutError(f"Consulta '{nombre or 'sin nombre'}' cancelada tras {timeout_s}s") from e
+    except Exception as e:
+        _notificar(nombre, time.perf_counter() - t0, filas, e)
+        raise
+    finally:
+        try:
+            cur.close()
+        except psycopg2.Error:
+            pass  # transacción abortada: el cursor muere con el rollback de `conexion`
+    _notificar(nombre, time.perf_counter() - t0, filas, None)
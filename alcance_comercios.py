@@ -0,0 +1,139 @@
+# El objetivo de este módulo es acotar las consultas a una lista de comercios (y opcionalmente locales)
+# cargándola en una tabla temporal de sesión, en vez de armar listas IN ('...') dentro del texto SQL.
+# Así el texto de la query (y su tiempo de parseo) no crece con la cantidad de comercios a validar.
+# -*- coding: utf-8 -*-
+# ═════════════════════════════════════════════════════════════════════════════
+# 1) IMPORTS Y CONFIGURACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2.extras import execute_values
+from acceso_datos import conexion, consultar_df
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# Nombre de la tabla temporal; las queries hacen JOIN contra ella
+TABLA_ALCANCE = "tmp_alcance_comercios"
+
+# Un elemento del alcance es un comercio (todas sus sucursales) o una tupla (comercio, local)
+ElementoAlcance = Union[str, Tuple[str, Optional[str]]]
+
+# Fila cargada en la tabla temporal: (id_comercio, id_local, grupo)
+FilaAlcance = Tuple[str, Optional[str], Optional[str]]
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2) NORMALIZACIÓN Y PARTICIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+
+def normalizar_alcance(alcance: Iterable[ElementoAlcance], grupo: Optional[str] = None) -> List[FilaAlcance]:
+    """Convierte el alcance a filas (id_comercio, id_local, grupo) sin duplicados.
+
+    Si un comercio aparece completo (local None) se descartan sus filas por local,
+    para que el JOIN no duplique transacciones dentro del grupo.
+    """
+    filas = []
+    for elem in alcance:
+        if isinstance(elem, str):
+            filas.append((elem, None))
+        else:
+            comercio, local = elem
+            filas.append((str(comercio), None if local is None else str(local)))
+
+    completos = {c for c, l in filas if l is None}
+    vistos, resultado = set(), []
+    for comercio, local in filas:
+        if local is not None and comercio in completos:
+            continue
+        if (comercio, local) in vistos:
+            continue
+        vistos.add((comercio, local))
+        resultado.append((comercio, local, grupo))
+    return resultado
+
+
+def alcance_por_grupo(grupos: Dict[str, Iterable[ElementoAlcance]]) -> List[FilaAlcance]:
+    """Une varios alcances con nombre; un comercio presente en dos grupos genera una fila por grupo."""
+    filas: List[FilaAlcance] = []
+    for grupo, alcance in grupos.items():
+        filas.extend(normalizar_alcance(alcance, grupo=grupo))
+    return filas
+
+
+def dividir_alcance(filas: Sequence[FilaAlcance], partes: int) -> List[List[FilaAlcance]]:
+    """Reparte las filas en `partes` grupos sin separar las filas de un mismo comercio."""
+    por_comercio: Dict[str, list] = {}
+    for fila in filas:
+        por_comercio.setdefault(fila[0], []).append(fila)
+
+    grupos: List[list] = [[] for _ in range(max(1, partes))]
+    for i, comercio in enumerate(sorted(por_comercio)):
+        grupos[i % len(grupos)].extend(por_comercio[comercio])
+    return [g for g in grupos if g]
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 3) CARGA Y CONSULTA
+# ═════════════════════════════════════════════════════════════════════════════
+
+def cargar_alcance(conn, filas: Sequence[FilaAlcance], tabla: str = TABLA_ALCANCE) -> int:
+    """Crea la tabla temporal en la sesión de `conn` y carga las filas en bloque."""
+    cur = conn.cursor()
+    try:
+        cur.execute(f"DROP TABLE IF EXISTS {tabla};")
+        cur.execute(f"CREATE TEMP TABLE {tabla} (id_comercio VARCHAR(64), id_local VARCHAR(64), grupo VARCHAR(128));")
+        if filas:
+            execute_values(
+                cur,
+                f"INSERT INTO {tabla} (id_comercio, id_local, grupo) VALUES %s",
+                list(filas),
+                page_size=1000
+            )
+    finally:
+        cur.close()
+    return len(filas)
+
+
+def _consultar_en_conexion(cfg: Dict, consultas: Sequence[str], filas, params_por_consulta, nombres) -> List[pd.DataFrame]:
+    with conexion(cfg) as conn:
+        cargar_alcance(conn, filas)
+        return [
+            consultar_df(conn, sql, params=p, nombre=nombre)
+            for sql, p, nombre in zip(consultas, params_por_consulta, nombres)
+        ]
+
+
+def consultar_con_alcance(
+    cfg: Dict,
+    consultas: Sequence[str],
+    alcance: Union[Iterable[ElementoAlcance], Sequence[FilaAlcance]],
+    params: Union[None, dict, Sequence[Optional[dict]]] = None,
+    conexiones: int = 1,
+    nombres: Optional[Sequence[str]] = None,
+) -> List[pd.DataFrame]:
+    """Ejecuta `consultas` acotadas por el alcance y retorna un DataFrame por consulta.
+
+    `cfg` son las credenciales de la base; las conexiones salen del pool de acceso_datos.py.
+
+    `alcance` puede ser una lista simple (ver `normalizar_alcance`) o filas ya armadas
+    con grupo (ver `alcance_por_grupo`). `params` es un dict común a todas las consultas
+    o una lista con los parámetros de cada una; `nombres` identifica cada consulta en el
+    historial de planes (ver plan_consultas.py). Con `conexiones > 1` el alcance se reparte por
+    comercio entre conexiones paralelas (cada una con su propia tabla temporal) y los
+    resultados se concatenan. Sólo es válido para consultas que agrupan por comercio,
+    como las de este repositorio.
+    """
+    alcance = list(alcance)
+    es_filas = bool(alcance) and all(isinstance(e, tuple) and len(e) == 3 for e in alcance)
+    filas = alcance if es_filas else normalizar_alcance(alcance)
+    if params is None or isinstance(params, dict):
+        params = [params] * len(consultas)
+    nombres = list(nombres) if nombres else [None] * len(consultas)
+    if conexiones <= 1 or len(filas) <= 1:
+        return _consultar_en_conexion(cfg, consultas, filas, params, nombres)
+
+    grupos = dividir_alcance(filas, conexiones)
+    print(f"⚙️  Alcance de {len(filas)} filas repartido en {len(grupos)} conexiones...")
+    with ThreadPoolExecutor(max_workers=len(grupos)) as pool:
+        parciales = list(pool.map(lambda g: _consultar_en_conexion(cfg, consultas, g, params, nombres), grupos))
+    return [
+        pd.concat([p[i] for p in parciales], ignore_index=True)
+        for i in range(len(consultas))
+    ]
@@ -0,0 +1,70 @@
+# El objetivo de este script es ser el punto de entrada único de las automatizaciones: cada
+# subcomando corre el script correspondiente tal como si se invocara directo (mismos argumentos),
+# pero el módulo sólo se importa al despachar ese subcomando. Así `--help`, la lista de comandos o un
+# comando liviano no pagan los imports de pandas, psycopg2, boto3 ni de los módulos de correo.
+# Con --perfilar (antes del comando) la corrida deja perfiles de cProfile/tracemalloc (ver perfilado.py).
+# Uso: python automatizaciones.py [--perfilar] <comando> [argumentos del script]
+#      python automatizaciones.py alertas --sin-envio
+#      python automatizaciones.py --perfilar tarifas --incremental
+# -*- coding: utf-8 -*-
+# ═════════════════════════════════════════════════════════════════════════════
+# 1) IMPORTS Y COMANDOS
+# ═════════════════════════════════════════════════════════════════════════════
+import os
+import sys
+import runpy
+from typing import Dict, List, Optional, Tuple
+
+# -- Comando -> (módulo, descripción). Agregar aquí los scripts nuevos.
+COMANDOS: Dict[str, Tuple[str, str]] = {
+    "alertas":       ("ejecutar_alertas", "Corre todas las alertas en paralelo"),
+    "descuadratura": ("Alerta_descuadratura", "Descuadres entre la fuente consolidada y las originales"),
+    "clasificacion": ("Alerta_x_comercios_mal_clasificado", "Clasificación de comercios por lista"),
+    "margen":        ("Alerta_comercios_margen_incorrecto", "Objetivo nulo o menor a 1 por comercio"),
+    "tarifas":       ("Validador_tarifas", "Validación de tarifas (BO vs liquidaciones)"),
+    "etl":           ("ETL_Sencillo", "Carga de la tabla consolidada"),
+    "orquestador":   ("orquestador", "ETL y chequeos según dependencias"),
+    "programador":   ("programador", "Programador con workers calientes"),
+    "planes":        ("plan_consultas", "Historial de planes y costos de consultas"),
+    "correo":        ("envio_correos", "Prueba del despachador de correos"),
+    "datos":         ("datos_sinteticos", "Datos sintéticos y fixtures para GRABACION=reproducir"),
+}
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2) DESPACHO
+# ═════════════════════════════════════════════════════════════════════════════
+
+def ayuda() -> str:
+    lineas = ["Uso: python automatizaciones.py [--perfilar] <comando> [argumentos]", "", "Comandos:"]
+    lineas += [f"  {c:<15} {desc}" for c, (_, desc) in COMANDOS.items()]
+    lineas += ["", "Cada comando acepta los mismos argumentos que su script (<comando> --help).",
+               "--perfilar equivale a PERFILAR=1: perfiles en PERFILAR_DIR (por defecto ./perfiles)."]
+    return "\n".join(lineas)
+
+
+def despachar(comando: str, argumentos: List[str]) -> None:
+    """Ejecuta el módulo del comando como `__main__` con sus argumentos (import recién aquí)."""
+    modulo = COMANDOS[comando][0]
+    # run_module reemplaza sys.argv[0] por la ruta del script; el resto son sus argumentos
+    sys.argv = [modulo] + list(argumentos)
+    runpy.run_module(modulo, run_name="__main__", alter_sys=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "--perfilar":
+        # Por entorno, para que también lo vean los workers y subprocesos del comando
+        os.environ["PERFILAR"] = "1"
+        argv = argv[1:]
+    if not argv or argv[0] in ("-h", "--help"):
+        print(ayuda())
+        return 0
+    if argv[0] not in COMANDOS:
+        print(f"❌ Comando desconocido: {argv[0]}\n\n{ayuda()}")
+        return 2
+    despachar(argv[0], argv[1:])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+# El objetivo de este script es vigilar el costo de arranque de los scripts: importa cada módulo en un
+# proceso nuevo con `python -X importtime`, informa el tiempo de import (mejor de N) y los imports más
+# pesados, y falla si un módulo carga algo que no debe en el camino sin hallazgos (p. ej. boto3 al
+# importar Validador_tarifas o los módulos de correo al importar una alerta) o si el tiempo empeora
+# respecto de una línea base guardada.
+# Uso: python benchmarks/bench_arranque.py [--repeticiones 5] [--guardar-base] [--tolerancia 0.25]
+# -*- coding: utf-8 -*-
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "arranque_base.json")
+
+CORREO = ["smtplib", "email.mime.multipart", "envio_correos"]
+
+# -- Módulo -> imports que no deben aparecer al importarlo (se cargan recién al usarlos)
+OBJETIVOS: Dict[str, List[str]] = {
+    "automatizaciones":                   ["pandas", "numpy", "psycopg2", "boto3"] + CORREO,
+    "ejecutar_alertas":                   ["boto3"] + CORREO,
+    "Alerta_descuadratura":               ["boto3"] + CORREO,
+    "Alerta_x_comercios_mal_clasificado": ["boto3"] + CORREO,
+    "Alerta_comercios_margen_incorrecto": ["boto3"] + CORREO,
+    "Validador_tarifas":                  ["boto3", "botocore"] + CORREO,
+}
+
+# Margen absoluto (ms) que se suma a la tolerancia relativa al comparar con la línea base
+MARGEN_MS = 30.0
+
+LINEA = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def medir_import(modulo: str) -> Tuple[float, Dict[str, float]]:
+    """Importa `modulo` en un proceso nuevo; retorna (ms acumulados del módulo, ms por import)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=RAIZ, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    imports = {}
+    for m in LINEA.finditer(proc.stderr):
+        imports[m.group(4)] = int(m.group(2)) / 1000
+    return imports.get(modulo, 0.0), imports
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Costo de arranque (-X importtime) de los scripts")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Empeoramiento relativo permitido")
+    parser.add_argument("--guardar-base", action="store_true", help=f"Guarda los tiempos en {os.path.basename(BASE)}")
+    parser.add_argument("--top", type=int, default=5, help="Imports más pesados a mostrar por módulo")
+    args = parser.parse_args()
+
+    # Se lee siempre: --guardar-base actualiza sólo los módulos medidos y conserva el resto
+    base = {}
+    if os.path.exists(BASE):
+        with open(BASE, encoding="utf-8") as fh:
+            base = json.load(fh)
+    comparar = {} if args.guardar_base else base
+
+    tiempos, fallas = {}, []
+    print(f"📊 Arranque por módulo (mejor de {args.repeticiones})")
+    for modulo, prohibidos in OBJETIVOS.items():
+        try:
+            mediciones = [medir_import(modulo) for _ in range(args.repeticiones)]
+        except RuntimeError as e:
+            print(f"   {modulo:<36} ❌ no se pudo importar: {e}")
+            fallas.append(modulo)
+            continue
+        ms, imports = min(mediciones, key=lambda m: m[0])
+        tiempos[modulo] = ms
+        pesados = sorted(((n, t) for n, t in imports.items() if n != modulo and "." not in n),
+                         key=lambda x: -x[1])[:args.top]
+        print(f"   {modulo:<36} {ms:8.1f} ms   " + ", ".join(f"{n} {t:.0f}" for n, t in pesados))
+
+        cargados = [p for p in prohibidos if p in imports]
+        if cargados:
+            print(f"      ❌ carga al importar: {', '.join(cargados)}")
+            fallas.append(modulo)
+        if modulo in comparar and ms > comparar[modulo] * (1 + args.tolerancia) + MARGEN_MS:
+            print(f"      ❌ regresión: {ms:.1f} ms vs base {comparar[modulo]:.1f} ms")
+            fallas.append(modulo)
+
+    if args.guardar_base:
+        base.update(tiempos)
+        with open(BASE, "w", encoding="utf-8") as fh:
+            json.dump(base, fh, indent=2, sort_keys=True)
+        print(f"💾 Línea base guardada en {BASE}")
+    elif not comparar:
+        print("ℹ️  Sin línea base: sólo se revisan los imports prohibidos (usar --guardar-base)")
+
+    if fallas:
+        print(f"❌ {len(set(fallas))} módulos fallan el control de arranque")
+        return 1
+    print("✅ Arranque dentro de lo esperado")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+# El objetivo de este script es medir las etapas de transformación y carga de ETL_Sencillo con datos
+# sintéticos de varios tamaños: normalizar (renombres + completar_columnas + concat), completar_columnas
+# (sobre las fuentes crudas) y concat (de las partes que arma normalizar) por separado, agregar_fechas, el billing_date_2 fila a fila, y cargar (DELETE + execute_values)
+# contra un PostgreSQL local desechable. Informa tiempo (mejor de N), filas/s y memoria peak (tracemalloc,
+# en una corrida aparte) por etapa, y escribe JSON comparable entre corridas para evaluar cambios en la
+# estrategia de carga (--comparar con un JSON anterior).
+# PostgreSQL: --dsn / BENCH_PG_DSN apunta a una base desechable (la tabla schema_x.tabla_destino se
+# recrea); sin DSN, si initdb y pg_ctl están en el PATH se levanta un cluster temporal que se borra al
+# final; si no hay ninguno, la etapa de carga se omite.
+# Uso: python benchmarks/bench_etl.py [--filas 10000,100000,1000000] [--json etl.json] [--comparar base.json]
+# -*- coding: utf-8 -*-
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import ETL_Sencillo as etl  # noqa: E402
+from acceso_datos import cerrar_pools, conexion  # noqa: E402
+
+TABLA_DESTINO = "schema_x.tabla_destino"
+
+# Proporción de filas por fuente (ADQ, RECHAZOS, CHECKIN)
+PROPORCION_FUENTES = (0.6, 0.25, 0.15)
+
+TIPOS_PG = {"i": "BIGINT", "u": "BIGINT", "f": "DOUBLE PRECISION", "M": "TIMESTAMP", "b": "BOOLEAN"}
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 1) DATOS SINTÉTICOS
+# ═════════════════════════════════════════════════════════════════════════════
+
+def fuentes(filas: int, semilla: int = 7) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Tres frames con las columnas de query1, query2 y query3 de ETL_Sencillo."""
+    rng = np.random.default_rng(semilla)
+    n1, n2 = int(filas * PROPORCION_FUENTES[0]), int(filas * PROPORCION_FUENTES[1])
+    tamanos = (n1, n2, filas - n1 - n2)
+    fechas = pd.date_range("2025-01-01", "2025-12-31").strftime("%Y-%m-%d").to_numpy()
+
+    def base(n: int, marca: str, conteo: str, costos: int) -> pd.DataFrame:
+        df = pd.DataFrame({
+            "nacionalidad_tx": rng.choice(["Nacional", "Internacional"], n, p=[0.9, 0.1]),
+            "tarjeta_presente": rng.choice(["Si", "No"], n),
+            marca: rng.choice(["VISA", "MASTERCARD", "AMEX", "MAGNA"], n),
+            "fecha_tx": rng.choice(fechas, n),
+            "monto_venta": rng.integers(1_000, 50_000_000, n).astype(float),
+            conteo: rng.integers(1, 5_000, n),
+        })
+        for i in range(1, costos + 1):
+            df[f"costo_{i}"] = np.round(rng.random(n) * 10_000, 2)
+        return df
+
+    df1 = base(tamanos[0], "marca", "cant_trx", 10)
+    df1.insert(0, "tipo_tx", rng.choice(["VENTA", "ANULACION"], tamanos[0]))
+    return df1, base(tamanos[1], "tx_codigo_mandante", "cant_tx", 6), base(tamanos[2], "tx_codigo_mandante", "cant_tx", 6)
+
+
+def copias(dfs: Tuple[pd.DataFrame, ...]) -> Tuple[pd.DataFrame, ...]:
+    """normalizar y agregar_fechas modifican sus entradas: cada repetición trabaja sobre copias."""
+    return tuple(df.copy() for df in dfs)
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2) POSTGRESQL DESECHABLE
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def postgres_desechable(dsn: Optional[str]) -> Iterator[Optional[Dict]]:
+    """Credenciales (formato de conexion()) de la base de prueba; levanta un cluster temporal si no hay DSN."""
+    if dsn:
+        yield {"dsn": dsn}
+        return
+    if not (shutil.which("initdb") and shutil.which("pg_ctl")):
+        print("⚠️ Sin --dsn ni initdb/pg_ctl en el PATH: se omite la etapa de carga")
+        yield None
+        return
+    directorio = tempfile.mkdtemp(prefix="bench_etl_pg_")
+    datos, puerto = os.path.join(directorio, "datos"), _puerto_libre()
+    try:
+        subprocess.run(["initdb", "-D", datos, "-U", "postgres", "--auth=trust"],
+                       check=True, capture_output=True)
+        subprocess.run(["pg_ctl", "-D", datos, "-l", os.path.join(directorio, "pg.log"), "-w", "start",
+                        "-o", f"-p {puerto} -k {directorio} -c listen_addresses='' -c fsync=off"],
+                       check=True, capture_output=True)
+        print(f"✓ PostgreSQL temporal en {directorio} (puerto {puerto})")
+        yield {"host": directorio, "port": puerto, "dbname": "postgres", "user": "postgres"}
+    finally:
+        cerrar_pools()
+        subprocess.run(["pg_ctl", "-D", datos, "-m", "immediate", "stop"], capture_output=True)
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+@contextmanager
+def _sin_pg() -> Iterator[None]:
+    """Reemplazo de postgres_desechable con --sin-carga."""
+    yield None
+
+
+def recrear_tabla(cfg: Dict, df: pd.DataFrame) -> None:
+    """(Re)crea la tabla destino con los tipos de `df` en la base desechable."""
+    columnas = ", ".join(f"{c} {TIPOS_PG.get(df[c].dtype.kind, 'TEXT')}" for c in df.columns)
+    with conexion(cfg) as conn:
+        with conn.cursor() as cur:
+            cur.execute("CREATE SCHEMA IF NOT EXISTS schema_x;")
+            cur.execute(f"DROP TABLE IF EXISTS {TABLA_DESTINO};")
+            cur.execute(f"CREATE TABLE {TABLA_DESTINO} ({columnas});")
+        conn.commit()
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 3) MEDICIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+
+def medir(fn: Callable, repeticiones: int) -> Tuple[float, float]:
+    """(mejor tiempo en s, memoria peak en MB). El peak se mide en una corrida aparte."""
+    tiempos = []
+    with redirect_stdout(io.StringIO()):  # sin los mensajes de progreso de ETL_Sencillo
+        for _ in range(repeticiones):
+            t0 = time.perf_counter()
+            fn()
+            tiempos.append(time.perf_counter() - t0)
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return min(tiempos), peak / 1024 ** 2
+
+
+def cargar_silencioso(df: pd.DataFrame, cfg: Dict) -> None:
+    """etl.cargar sin sus mensajes de progreso; una carga fallida corta el benchmark."""
+    salida = io.StringIO()
+    with redirect_stdout(salida):
+        ok = etl.cargar(df, cfg=cfg)
+    if not ok:
+        raise RuntimeError(salida.getvalue().strip().splitlines()[-1])
+
+
+def etapas(filas: int, repeticiones: int, cfg: Optional[Dict]) -> Dict[str, Dict]:
+    """Mide cada etapa sobre `filas` filas sintéticas; retorna {etapa: {s, mb, filas_s}}."""
+    crudos = fuentes(filas)
+    with redirect_stdout(io.StringIO()):
+        unido = etl.normalizar(*copias(crudos))
+    # Las partes ya completas que normalizar concatena, recuperadas de su propia salida
+    completos = [parte for _, parte in unido.groupby("fuente", sort=False)]
+    final = etl.agregar_fechas(unido.copy())
+
+    casos: List[Tuple[str, Callable]] = [
+        ("normalizar", lambda: etl.normalizar(*copias(crudos))),
+        ("completar_columnas", lambda: [etl.completar_columnas(df) for df in copias(crudos)]),
+        ("concat", lambda: pd.concat(completos, ignore_index=True)),
+        ("agregar_fechas", lambda: etl.agregar_fechas(unido.copy())),
+        ("billing_date_2", lambda: final["fecha_tx"].apply(etl.calcular_billing_date_2)),
+    ]
+    if cfg is not None:
+        recrear_tabla(cfg, final)
+        casos.append(("cargar", lambda: cargar_silencioso(final, cfg)))
+
+    medidas: Dict[str, Dict] = {}
+    for nombre, fn in casos:
+        s, mb = medir(fn, repeticiones)
+        medidas[nombre] = {"s": s, "mb": mb, "filas_s": filas / s if s else 0.0}
+    return medidas
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 4) PUNTO DE ENTRADA
+# ═════════════════════════════════════════════════════════════════════════════
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de transformación y carga de ETL_Sencillo")
+    parser.add_argument("--filas", default="10000,100000,1000000", help="Tamaños, separados por coma")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--dsn", default=os.getenv("BENCH_PG_DSN"), help="PostgreSQL desechable (se recrea la tabla destino)")
+    parser.add_argument("--sin-carga", action="store_true", help="Omite la etapa de carga")
+    parser.add_argument("--json", help="Escribe los resultados en este archivo")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior para mostrar la variación")
+    args = parser.parse_args()
+
+    previo = {}
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as fh:
+            previo = json.load(fh)["resultados"]
+
+    resultados: Dict[str, Dict] = {}
+    with (_sin_pg() if args.sin_carga else postgres_desechable(args.dsn)) as cfg:
+        print(f"📊 ETL_Sencillo por etapa (mejor de {args.repeticiones}; memoria peak con tracemalloc)")
+        for filas in [int(float(x)) for x in args.filas.split(",") if x.strip()]:
+            medidas = etapas(filas, args.repeticiones, cfg)
+            resultados[str(filas)] = medidas
+            print(f"\n   {filas:,} filas")
+            for etapa, m in medidas.items():
+                linea = f"      {etapa:<20} {m['s']:8.3f}s  {m['mb']:9.1f} MB  {m['filas_s']:14,.0f} filas/s"
+                antes = previo.get(str(filas), {}).get(etapa)
+                if antes:
+                    linea += f"  ({(m['s'] / antes['s'] - 1):+.0%} vs {antes['s']:.3f}s)"
+                print(linea)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"repeticiones": args.repeticiones, "carga": cfg is not None,
+                       "pandas": pd.__version__, "resultados": resultados}, fh, indent=2, sort_keys=True)
+        print(f"\n💾 Resultados en {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
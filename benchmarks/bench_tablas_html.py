@@ -0,0 +1,94 @@
+# El objetivo de este script es medir el render de tablas HTML de los correos sobre DataFrames grandes
+# (50.000 filas por defecto): compara el recorrido con iterrows() que usaba Alerta_descuadratura,
+# `to_html` + `str.replace` como en Validador_tarifas, y el renderer vectorizado de tablas_html.py.
+# Uso: python benchmarks/bench_tablas_html.py [--filas 50000] [--repeticiones 3]
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from tablas_html import tabla_html  # noqa: E402
+
+
+def datos_descuadre(filas: int, semilla: int = 7) -> pd.DataFrame:
+    """Frame con la forma del resultado de Alerta_descuadratura."""
+    rng = np.random.default_rng(semilla)
+    venta_c = rng.integers(0, 50_000_000, filas)
+    venta_o = venta_c + rng.integers(-5_000, 5_000, filas)
+    trx_c = rng.integers(0, 200_000, filas)
+    trx_o = trx_c + rng.integers(-50, 50, filas)
+    return pd.DataFrame({
+        "periodo": pd.date_range("2020-01-01", periods=filas, freq="h").strftime("%Y-%m"),
+        "fuente": rng.choice(["SOURCE_A", "SOURCE_B", "ADQ", "RECHAZOS"], filas),
+        "venta_creada": venta_c, "trx_creada": trx_c,
+        "venta_original": venta_o, "trx_original": trx_o,
+        "diferencia_venta": venta_o - venta_c, "diferencia_trx": trx_o - trx_c,
+    })
+
+
+def render_iterrows(df: pd.DataFrame) -> str:
+    """Implementación anterior de Alerta_descuadratura.dataframe_to_html (referencia)."""
+    header_style = "background:#002B49; color:#fff; padding:8px; border:1px solid #ddd; text-align:left;"
+    cell_style = "padding:8px; border:1px solid #ddd; text-align:left;"
+    html = '<table style="border-collapse:collapse; width:100%; font-family:Arial,sans-serif;">'
+    html += '<thead><tr>'
+    for col in df.columns:
+        html += f'<th style="{header_style}">{col}</th>'
+    html += '</tr></thead><tbody>'
+    for i, row in df.iterrows():
+        bg = "#f9f9f9" if i % 2 == 0 else "#ffffff"
+        html += f'<tr style="background:{bg}">'
+        for col in df.columns:
+            html += f'<td style="{cell_style}">{row[col]}</td>'
+        html += '</tr>'
+    html += '</tbody></table>'
+    return html
+
+
+def render_to_html_replace(df: pd.DataFrame) -> str:
+    """Estilo anterior de Validador_tarifas: to_html y reemplazo de etiquetas."""
+    html = df.to_html(index=False, border=0)
+    html = html.replace('<table border="0" class="dataframe">',
+                        '<table border="1" cellpadding="6" cellspacing="0" style="border-collapse:collapse;">')
+    html = html.replace('<th>', '<th style="border:1px solid #cccccc;padding:6px 8px;">')
+    return html.replace('<td>', '<td style="border:1px solid #cccccc;padding:6px 8px;">')
+
+
+def medir(fn, df: pd.DataFrame, repeticiones: int) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn(df)
+        tiempos.append(time.perf_counter() - t0)
+    return min(tiempos)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark del render de tablas HTML")
+    parser.add_argument("--filas", type=int, default=50_000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    df = datos_descuadre(args.filas)
+    casos = [
+        ("iterrows (anterior)", render_iterrows, 1),
+        ("to_html + replace", render_to_html_replace, args.repeticiones),
+        ("tabla_html", lambda d: tabla_html(d), args.repeticiones),
+        ("tabla_html miles", lambda d: tabla_html(d, miles=True), args.repeticiones),
+        ("tabla_html tope 500", lambda d: tabla_html(d, miles=True, max_filas=500), args.repeticiones),
+    ]
+    print(f"📊 Render de {args.filas:,} filas x {len(df.columns)} columnas (mejor de {args.repeticiones})")
+    base = None
+    for nombre, fn, rep in casos:
+        t = medir(fn, df, rep)
+        base = base or t
+        print(f"   {nombre:<22} {t:8.3f}s   x{base / t:6.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+# El objetivo de este script es medir cómo escala el núcleo de Validador_tarifas: preparar_bo, procesar
+# (cruce con la BO por join_key y vigencia), combinar_resumenes y la serialización de los adjuntos CSV
+# del correo (serializar_adjunto), que a fin de mes pesa tanto como el cruce. Genera liquidaciones y BO
+# sintéticas (datos_sinteticos.py) para cada combinación de filas, claves y versiones de vigencia, e
+# informa tiempo (mejor de N), memoria peak (tracemalloc, en una corrida aparte) y filas/s por función.
+# Con --guardar-base deja los tiempos como línea base (suma los casos medidos a los ya guardados); después
+# falla si alguno empeora más que la tolerancia.
+# La línea base depende de la máquina y no se versiona: se crea una vez en cada equipo donde se compare
+# (misma invocación más --guardar-base) y luego se corre sin ella antes de integrar un cambio:
+#   python benchmarks/bench_tarifas.py --filas 10000,100000 --guardar-base
+#   python benchmarks/bench_tarifas.py --filas 10000,100000
+# Uso: python benchmarks/bench_tarifas.py [--filas 10000,100000,1000000] [--claves 5000] [--versiones 1,3]
+#      python benchmarks/bench_tarifas.py --filas 10000000 --repeticiones 1
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from datetime import date
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from datos_sinteticos import bo, claves_tarifa, liquidaciones  # noqa: E402
+from Validador_tarifas import combinar_resumenes, preparar_bo, procesar, serializar_adjunto  # noqa: E402
+
+BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tarifas_base.json")
+
+# Margen absoluto (s) que se suma a la tolerancia relativa: evita falsos positivos en casos de milisegundos
+MARGEN_S = 0.05
+
+FECHA_FIN = date(2024, 6, 30)
+
+
+def lista_enteros(texto: str) -> List[int]:
+    return [int(float(x)) for x in texto.split(",") if x.strip()]
+
+
+def medir(fn: Callable, repeticiones: int) -> Tuple[float, float, object]:
+    """(mejor tiempo en s, memoria peak en MB, resultado). El peak se mide en una corrida aparte."""
+    tiempos, resultado = [], None
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = fn()
+        tiempos.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(tiempos), peak / 1024 ** 2, resultado
+
+
+def caso(filas: int, claves: int, versiones: int, repeticiones: int, dias: int) -> Dict[str, Dict]:
+    """Mide cada función sobre un juego sintético; retorna {función: {s, mb, filas_s}}."""
+    df_bo_crudo = bo(claves_tarifa(claves), versiones)
+    df_mtd = liquidaciones(df_bo_crudo, filas, FECHA_FIN, dias=dias)
+    df_dia = df_mtd[df_mtd["trx_date"] == FECHA_FIN.strftime("%Y-%m-%d")]
+
+    medidas: Dict[str, Dict] = {}
+
+    def anotar(nombre: str, n: int, fn: Callable):
+        s, mb, resultado = medir(fn, repeticiones)
+        medidas[nombre] = {"s": s, "mb": mb, "filas_s": n / s if s else 0.0}
+        return resultado
+
+    df_bo = anotar("preparar_bo", len(df_bo_crudo), lambda: preparar_bo(df_bo_crudo))
+    _, detalle_mtd, res_mtd = anotar("procesar", len(df_mtd), lambda: procesar(df_mtd, df_bo))
+    _, _, res_dia = procesar(df_dia, df_bo)
+    anotar("combinar_resumenes", len(res_mtd), lambda: combinar_resumenes(res_dia, res_mtd))
+    anotar("serializar_adjunto", len(detalle_mtd),
+           lambda: serializar_adjunto(detalle_mtd, "Detalle_MTD", formato="csv.gz"))
+    # Referencia: el CSV plano en memoria que se adjuntaba antes de serializar por bloques
+    anotar("csv_plano", len(detalle_mtd), lambda: detalle_mtd.to_csv(index=False).encode("utf-8-sig"))
+    medidas["procesar"]["detalle"] = len(detalle_mtd)
+    return medidas
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark del núcleo de Validador_tarifas")
+    parser.add_argument("--filas", default="10000,100000,1000000", help="Filas MTD, separadas por coma")
+    parser.add_argument("--claves", default="5000", help="Claves (join_key) de la BO, separadas por coma")
+    parser.add_argument("--versiones", default="1,3", help="Vigencias por clave, separadas por coma")
+    parser.add_argument("--dias", type=int, default=30, help="Días del mes simulado")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Empeoramiento relativo permitido")
+    parser.add_argument("--guardar-base", action="store_true", help=f"Guarda los tiempos en {os.path.basename(BASE)}")
+    parser.add_argument("--json", help="Escribe los resultados en este archivo")
+    args = parser.parse_args()
+
+    # Se lee siempre: --guardar-base actualiza sólo los casos medidos y conserva el resto
+    base = {}
+    if os.path.exists(BASE):
+        with open(BASE, encoding="utf-8") as fh:
+            base = json.load(fh)
+    comparar = {} if args.guardar_base else base
+
+    resultados: Dict[str, Dict] = {}
+    fallas: List[str] = []
+    print(f"📊 Núcleo de tarifas (mejor de {args.repeticiones}; memoria peak con tracemalloc)")
+    for filas in lista_enteros(args.filas):
+        for claves in lista_enteros(args.claves):
+            for versiones in lista_enteros(args.versiones):
+                etiqueta = f"{filas}f_{claves}c_{versiones}v"
+                medidas = caso(filas, claves, versiones, args.repeticiones, args.dias)
+                resultados[etiqueta] = medidas
+                print(f"\n   {filas:,} filas | {claves:,} claves | {versiones} versiones "
+                      f"→ {medidas['procesar']['detalle']:,} filas de detalle")
+                for funcion, m in medidas.items():
+                    linea = (f"      {funcion:<20} {m['s']:8.3f}s  {m['mb']:9.1f} MB  "
+                             f"{m['filas_s']:14,.0f} filas/s")
+                    previo = comparar.get(etiqueta, {}).get(funcion)
+                    if previo:
+                        linea += f"  (base {previo['s']:.3f}s)"
+                        if m["s"] > previo["s"] * (1 + args.tolerancia) + MARGEN_S:
+                            linea += "  ❌ regresión"
+                            fallas.append(f"{etiqueta}:{funcion}")
+                    print(linea)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(resultados, fh, indent=2, sort_keys=True)
+    if args.guardar_base:
+        base.update(resultados)
+        with open(BASE, "w", encoding="utf-8") as fh:
+            json.dump(base, fh, indent=2, sort_keys=True)
+        print(f"\n💾 Línea base guardada en {BASE}")
+    elif not comparar:
+        print("\nℹ️  Sin línea base: sólo se informan los tiempos (usar --guardar-base)")
+
+    if fallas:
+        print(f"\n❌ {len(fallas)} mediciones empeoran más de {args.tolerancia:.0%}: {', '.join(fallas)}")
+        return 1
+    print("\n✅ Núcleo de tarifas dentro de lo esperado")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
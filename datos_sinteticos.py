@@ -0,0 +1,235 @@
+# El objetivo de este script es generar datos sintéticos con la forma de los datos reales, a escala
+# configurable, para probar y medir los scripts sin acceso a Redshift ni S3: liquidaciones (resultado
+# de la query de Validador_tarifas), BO de tarifas (CSV de S3) y exportaciones de Tableau (planillas
+# que revisa Validador_Formulas_Tableau). Con `fixtures` deja todo listo para GRABACION=reproducir
+# (ver grabacion.py).
+# Uso: python datos_sinteticos.py fixtures --filas 200000 --claves 5000 --versiones 3 --dir fixtures
+#      python datos_sinteticos.py tableau --semana 30 --archivos 13 --dir fixtures/tableau
+# -*- coding: utf-8 -*-
+# ═════════════════════════════════════════════════════════════════════════════
+# 1) IMPORTS Y CONFIGURACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+import perfilado
+
+MARCAS = ["VISA", "MASTERCARD", "AMEX", "MAGNA"]
+CATEGORIAS = ["CREDITO", "DEBITO", "PREPAGO"]
+MCCS = ["5411", "5812", "5999", "4511", "5311", "7011", "0"]
+TIPOS_TX = ["VENTA", "VENTA", "VENTA", "ANULACION VENTA"]
+TARIFAS = np.array([0.0, 0.95, 1.0, 1.25, 1.49, 1.79, 2.1, 2.5])
+
+# Columnas de la exportación de Tableau: token que busca Validador_Formulas_Tableau y semanas con valor
+VENTANAS_TABLEAU = {
+    "52": 52, "Semestre": 24, "12": 12, "Ult. 3": 3, "Ult. 4": 4, "Ult. 5": 5,
+    "-1": 1, "-2": 1, "-3": 1, "YTD": None, "Ult. año (n) v": 1,
+}
+
+# Latencias por defecto de los fixtures sintéticos (segundos)
+LATENCIA_ULTIMA_FECHA_S = 0.2
+LATENCIA_FILAS_S = 2e-5
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2) TARIFAS: CLAVES, BO Y LIQUIDACIONES
+# ═════════════════════════════════════════════════════════════════════════════
+
+def claves_tarifa(n: int, semilla: int = 7) -> pd.DataFrame:
+    """`n` combinaciones únicas (comercio, MCC, marca, categoría) con su join_key."""
+    rng = np.random.default_rng(semilla)
+    comercios = max(1, n // 6)
+    df = pd.DataFrame({
+        "merchant_identifier": (rng.integers(10_000_000, 99_999_999, n * 2) % (comercios * 10) + 10_000_000).astype(str),
+        "mcc_code": rng.choice(MCCS, n * 2),
+        "card_brand": rng.choice(MARCAS, n * 2),
+        "product_category": rng.choice(CATEGORIAS, n * 2),
+    }).drop_duplicates().head(n).reset_index(drop=True)
+    df["join_key"] = (df["merchant_identifier"] + "-" + df["mcc_code"] + "-" + df["card_brand"]
+                      + "-" + df["product_category"])
+    return df
+
+
+def bo(claves: pd.DataFrame, versiones: int = 1, desde: date = date(2023, 1, 1),
+       semilla: int = 11) -> pd.DataFrame:
+    """BO con `versiones` vigencias consecutivas por clave; la última termina en 'inf' como en S3."""
+    rng = np.random.default_rng(semilla)
+    partes = []
+    for v in range(versiones):
+        inicio = pd.Timestamp(desde) + pd.Timedelta(days=180 * v)
+        fin = (pd.Timestamp(desde) + pd.Timedelta(days=180 * (v + 1) - 1)).strftime("%Y-%m-%d")
+        parte = claves.drop(columns=["join_key"]).copy()
+        parte["start_date"] = inicio.strftime("%Y-%m-%d")
+        parte["end_date"] = "inf" if v == versiones - 1 else fin
+        parte["fee_card_present"] = rng.choice(TARIFAS[1:], len(parte))
+        parte["fee_card_not_present"] = parte["fee_card_present"] + rng.choice([0.0, 0.2, 0.4], len(parte))
+        partes.append(parte)
+    return pd.concat(partes, ignore_index=True)
+
+
+def liquidaciones(df_bo: pd.DataFrame, filas: int, fecha_fin: date, dias: int = 30,
+                  tasa_error: float = 0.05, semilla: int = 13) -> pd.DataFrame:
+    """Filas con la forma del resultado de la query de tarifas, cruzables con `df_bo`.
+
+    Usa las tarifas de la versión vigente de la BO, salvo `tasa_error` de las filas con otra tarifa.
+    """
+    rng = np.random.default_rng(semilla)
+    vigente = df_bo[df_bo["end_date"] == "inf"].reset_index(drop=True)
+    idx = rng.integers(0, len(vigente), filas)
+    base = vigente.iloc[idx].reset_index(drop=True)
+    presente = rng.random(filas) < 0.6
+    tarifa = np.where(presente, base["fee_card_present"], base["fee_card_not_present"])
+    errores = rng.random(filas) < tasa_error
+    tarifa = np.where(errores, rng.choice(TARIFAS, filas), tarifa)
+    fechas = pd.Timestamp(fecha_fin) - pd.to_timedelta(rng.integers(0, dias, filas), unit="D")
+    ventas = rng.integers(1_000, 5_000_000, filas)
+    cuotas = (rng.random(filas) < 0.2).astype(int)
+    mcc = base["mcc_code"]
+    return pd.DataFrame({
+        "card_present_flag": np.where(presente, "Si", "No"),
+        "mcc_code_corrected": mcc,
+        "trx_count": rng.integers(1, 500, filas),
+        "sales_volume": ventas,
+        "total_fee": np.round(ventas * tarifa / 100 / 1.19),
+        "applied_exchange_rate": 1.0,
+        "merchant_id": base["merchant_identifier"] + rng.choice(["01", "02"], filas),
+        "trx_date": fechas.strftime("%Y-%m-%d"),
+        "card_brand": base["card_brand"],
+        "transaction_origin": rng.choice(["Nacional", "Internacional"], filas, p=[0.9, 0.1]),
+        "category": base["product_category"],
+        "transaction_type": rng.choice(TIPOS_TX, filas),
+        "is_installment": cuotas,
+        "applied_var_fee": tarifa,
+        "applied_fixed_fee": 0.0,
+        "theoretical_fee_lookup": np.where(rng.random(filas) < 0.02, tarifa, np.nan),
+        "join_key": (base["merchant_identifier"] + "-" + mcc + "-" + base["card_brand"]
+                     + "-" + base["product_category"]),
+        "grupo_alcance": None,
+    })
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 3) EXPORTACIÓN DE TABLEAU
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _semanas(ano: int, semana_eval: int, total: int) -> List[Tuple[int, int]]:
+    """Las `total` semanas (año, semana) que terminan en `semana_eval`, de 52 semanas por año."""
+    semanas, a, s = [], ano, semana_eval
+    for _ in range(total):
+        semanas.append((a, s))
+        a, s = (a, s - 1) if s > 1 else (a - 1, 52)
+    return semanas[::-1]
+
+
+def export_tableau(semana_eval: int, ano: Optional[int] = None, semanas_extra: int = 8,
+                   errores: int = 0, semilla: int = 17) -> pd.DataFrame:
+    """Planilla como ExportAll.xlsx: Año, Semana y una columna 'SUMA(Ventas) <ventana>' por ventana.
+
+    Cada ventana tiene valor sólo en las semanas que le corresponden; `errores` columnas quedan
+    con una semana de más, para que el validador tenga algo que detectar.
+    """
+    rng = np.random.default_rng(semilla)
+    ano = ano or date.today().year
+    semanas = _semanas(ano, semana_eval, 52 + 4 + semanas_extra)
+    df = pd.DataFrame(semanas, columns=["Año", "Semana"])
+    posicion_eval = len(df) - 1
+    for i, (token, largo) in enumerate(VENTANAS_TABLEAU.items()):
+        valores = np.zeros(len(df))
+        if token.startswith("-"):
+            filas = [posicion_eval - int(token[1:])]
+        elif token == "YTD":
+            filas = [j for j, (a, _) in enumerate(semanas) if a == ano and j <= posicion_eval]
+        else:
+            filas = list(range(posicion_eval - largo + 1, posicion_eval + 1))
+        if i < errores:
+            filas = [filas[0] - 1] + filas
+        valores[filas] = rng.integers(1_000, 1_000_000, len(filas))
+        df[f"SUMA(Ventas) {token}"] = valores
+    return df
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 4) FIXTURES PARA GRABACION=reproducir
+# ═════════════════════════════════════════════════════════════════════════════
+
+def escribir_fixtures_tarifas(directorio: str, filas: int, claves: int, versiones: int,
+                              fecha_fin: Optional[date] = None, s3_input: Optional[str] = None) -> None:
+    """Deja las consultas Día/MTD de Validador_tarifas y la BO en S3 como fixtures sintéticos."""
+    import grabacion
+    if s3_input is None:
+        from Validador_tarifas import S3_INPUT as s3_input
+    from Validador_tarifas import parse_s3_url
+
+    fecha_fin = fecha_fin or date.today() - timedelta(days=1)
+    grabacion.activar("", directorio)
+    df_claves = claves_tarifa(claves)
+    df_bo = bo(df_claves, versiones)
+    df_mtd = liquidaciones(df_bo, filas, fecha_fin, dias=fecha_fin.day)
+    df_dia = df_mtd[df_mtd["trx_date"] == fecha_fin.strftime("%Y-%m-%d")].reset_index(drop=True)
+
+    grabacion.guardar_consulta(pd.DataFrame({"max": [fecha_fin]}), nombre="tarifas_ultima_fecha",
+                               latencia_s=LATENCIA_ULTIMA_FECHA_S)
+    for nombre, df in (("tarifas_dia", df_dia), ("tarifas_mtd", df_mtd)):
+        grabacion.guardar_consulta(df, nombre=nombre, latencia_s=LATENCIA_FILAS_S * len(df))
+
+    bucket, prefijo = parse_s3_url(s3_input)
+    ruta_bo = os.path.join(directorio, "s3", bucket, prefijo, "bo_sintetica.csv")
+    os.makedirs(os.path.dirname(ruta_bo), exist_ok=True)
+    df_bo.to_csv(ruta_bo, index=False)
+    print(f"✓ Fixtures de tarifas en {directorio}: {len(df_dia):,} filas día, {len(df_mtd):,} MTD, "
+          f"BO de {len(df_bo):,} filas ({claves:,} claves x {versiones} versiones)")
+
+
+def escribir_tableau(directorio: str, semana_eval: int, archivos: int, errores: int = 0) -> List[str]:
+    """Escribe ExportAll.xlsx, ExportAll (2).xlsx, ... (CSV si no está instalado openpyxl)."""
+    os.makedirs(directorio, exist_ok=True)
+    try:
+        import openpyxl  # noqa: F401
+        extension = ".xlsx"
+    except ImportError:
+        print("[WARN] openpyxl no está instalado: las planillas se escriben como CSV")
+        extension = ".csv"
+    rutas = []
+    for i in range(archivos):
+        sufijo = "" if i == 0 else f" ({i + 1})"
+        df = export_tableau(semana_eval, errores=errores if i == 0 else 0, semilla=17 + i)
+        ruta = os.path.join(directorio, f"ExportAll{sufijo}{extension}")
+        if extension == ".xlsx":
+            df.to_excel(ruta, index=False)
+        else:
+            df.to_csv(ruta, index=False)
+        rutas.append(ruta)
+    print(f"✓ {archivos} exportaciones de Tableau en {directorio}")
+    return rutas
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 5) PUNTO DE ENTRADA
+# ═════════════════════════════════════════════════════════════════════════════
+
+@perfilado.perfilar("datos_sinteticos")
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos y fixtures para pruebas sin red")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_fix = sub.add_parser("fixtures", help="Consultas y BO de Validador_tarifas para GRABACION=reproducir")
+    p_fix.add_argument("--filas", type=int, default=200_000, help="Filas de liquidaciones MTD")
+    p_fix.add_argument("--claves", type=int, default=5_000, help="Claves (join_key) de la BO")
+    p_fix.add_argument("--versiones", type=int, default=2, help="Vigencias por clave en la BO")
+    p_fix.add_argument("--fecha", type=date.fromisoformat, help="Última fecha de settlement (AAAA-MM-DD)")
+    p_fix.add_argument("--dir", default="fixtures")
+    p_tab = sub.add_parser("tableau", help="Exportaciones de Tableau (ExportAll*.xlsx)")
+    p_tab.add_argument("--semana", type=int, required=True, help="Semana a evaluar")
+    p_tab.add_argument("--archivos", type=int, default=13)
+    p_tab.add_argument("--errores", type=int, default=0, help="Columnas con una semana de más")
+    p_tab.add_argument("--dir", default=os.path.join("fixtures", "tableau"))
+    args = parser.parse_args(argv)
+
+    if args.comando == "fixtures":
+        escribir_fixtures_tarifas(args.dir, args.filas, args.claves, args.versiones, fecha_fin=args.fecha)
+    else:
+        escribir_tableau(args.dir, args.semana, args.archivos, errores=args.errores)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
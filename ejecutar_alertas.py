@@ -0,0 +1,180 @@
+# El objetivo de este script es correr todas las alertas (Alerta_*.py) en un solo proceso:
+# importa pandas/psycopg2 una vez, comparte el pool de conexiones de acceso_datos.py y lanza las
+# consultas en paralelo, de modo que la ventana de revisión queda acotada por la consulta más lenta.
+# Cada script declara su alerta en un dict `ALERTA` (consultar, separar, enviar, destinatarios y,
+# opcionalmente, 'estado' para reportar sólo novedades; ver estado_alertas.py).
+# -*- coding: utf-8 -*-
+# ═════════════════════════════════════════════════════════════════════════════
+# 1) IMPORTS Y CONFIGURACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+import sys
+import time
+import argparse
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from estado_alertas import filtrar_por_estado, registrar_reportados
+import perfilado
+import metricas
+
+# -- Módulos que declaran una alerta (dict ALERTA); agregar aquí las nuevas
+ALERTAS_REGISTRADAS = [
+    "Alerta_descuadratura",
+    "Alerta_x_comercios_mal_clasificado",
+    "Alerta_comercios_margen_incorrecto",
+]
+
+# Consultas simultáneas (cada una toma una conexión del pool; ver DB_POOL_MAX)
+WORKERS_ALERTAS = 4
+
+CLAVES_ALERTA = ("nombre", "consultar", "separar", "enviar", "destinatarios")
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2) REGISTRO
+# ═════════════════════════════════════════════════════════════════════════════
+
+def cargar_alertas(modulos: List[str] = ALERTAS_REGISTRADAS) -> List[Dict]:
+    """Importa cada módulo y retorna su definición `ALERTA` validada."""
+    alertas = []
+    for nombre_modulo in modulos:
+        modulo = importlib.import_module(nombre_modulo)
+        alerta = getattr(modulo, "ALERTA", None)
+        if alerta is None:
+            raise ValueError(f"{nombre_modulo} no declara ALERTA")
+        faltantes = [k for k in CLAVES_ALERTA if k not in alerta]
+        if faltantes:
+            raise ValueError(f"ALERTA de {nombre_modulo} sin claves: {', '.join(faltantes)}")
+        alertas.append(alerta)
+    return alertas
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 3) EJECUCIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _correr_consulta(alerta: Dict) -> Dict:
+    t0 = time.perf_counter()
+    try:
+        with perfilado.etapa(f"consulta:{alerta['nombre']}"):
+            df = alerta["consultar"]()
+        return {"alerta": alerta, "df": df, "error": None, "consulta_s": time.perf_counter() - t0}
+    except Exception as e:
+        return {"alerta": alerta, "df": None, "error": e, "consulta_s": time.perf_counter() - t0}
+
+
+def ejecutar_alertas(alertas: List[Dict], workers: int = WORKERS_ALERTAS, enviar: bool = True) -> List[Dict]:
+    """Corre las consultas en paralelo, encola los correos de las alertas con hallazgos y espera su entrega.
+
+    Los correos salen en segundo plano por una sola sesión SMTP (ver envio_correos.py).
+    Con estado activo sólo se envían las alertas con novedades (casos nuevos o resueltos), y el estado
+    se guarda recién con el correo entregado; con `enviar=False` no se guarda.
+    Retorna una fila por alerta: nombre, estado, filas, nuevos, consulta_s, armado_s.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(alertas)))) as pool:
+        resultados = list(pool.map(_correr_consulta, alertas))
+
+    filas = []
+    por_confirmar = []  # (fila, resumen, futuro del correo)
+    for r in resultados:
+        alerta, df = r["alerta"], r["df"]
+        fila = {"nombre": alerta["nombre"], "filas": 0, "nuevos": 0,
+                "consulta_s": r["consulta_s"], "armado_s": 0.0}
+        if r["error"] is not None:
+            print(f"❌ [{alerta['nombre']}] Error en la consulta: {r['error']}")
+            fila["estado"] = "ERROR"
+            filas.append(fila)
+            continue
+        try:
+            df_reporte, resumen, novedades = filtrar_por_estado(alerta, df)
+        except Exception as e:
+            # Sin estado se reporta todo: mejor un correo repetido que perder una alerta
+            print(f"[WARN] [{alerta['nombre']}] No se pudo aplicar el estado: {e}")
+            df_reporte, resumen, novedades = df, None, not df.empty
+        fila["filas"], fila["nuevos"] = len(df), len(df_reporte)
+        if not novedades:
+            fila["estado"] = "OK" if df.empty else "SIN_CAMBIOS"
+            print(f"✅ [{alerta['nombre']}] " + ("Sin hallazgos." if df.empty else f"{len(df)} abiertos, sin novedades."))
+            if enviar:
+                por_confirmar.append((fila, resumen, None))
+        else:
+            fila["estado"] = "ALERTA"
+            print(f"🚨 [{alerta['nombre']}] {len(df_reporte)} registros -> {', '.join(alerta['destinatarios'])}")
+            if enviar:
+                try:
+                    extra = {"resumen_estado": resumen} if resumen else {}
+                    # separar puede lanzar consultas (drill-down): el armado se mide recién después
+                    partes = alerta["separar"](df_reporte)
+                    t0 = time.perf_counter()
+                    futuro = alerta["enviar"](*partes, **extra)
+                    fila["armado_s"] = time.perf_counter() - t0
+                    metricas.observar("correo_armado_segundos", fila["armado_s"], correo=alerta["nombre"])
+                    por_confirmar.append((fila, resumen, futuro))
+                except Exception as e:
+                    print(f"❌ [{alerta['nombre']}] Error al armar el correo: {e}")
+                    fila["estado"] = "ERROR_ENVIO"
+        filas.append(fila)
+
+    # Los correos ya salieron en paralelo; el estado sólo avanza para los entregados
+    for fila, resumen, futuro in por_confirmar:
+        try:
+            if futuro is not None:
+                futuro.result()
+        except Exception as e:
+            print(f"❌ [{fila['nombre']}] Error al enviar el correo: {e}")
+            fila["estado"] = "ERROR_ENVIO"
+            continue
+        try:
+            registrar_reportados(resumen)
+        except Exception as e:
+            print(f"[WARN] [{fila['nombre']}] No se pudo guardar el estado: {e}")
+    return filas
+
+
+def _esperar_envios() -> Dict:
+    """Espera los correos encolados; si ninguna alerta armó correo, envio_correos ni se importó."""
+    if "envio_correos" not in sys.modules:
+        return {"correos": 0, "errores": 0}
+    return sys.modules["envio_correos"].esperar_envios()
+
+
+def imprimir_latencias(filas: List[Dict], total_s: float) -> None:
+    print("\n⏱️  Latencia por alerta:")
+    for f in filas:
+        print(f"   {f['nombre']:<28} {f['estado']:<12} {f['filas']:>7} filas {f['nuevos']:>6} nuevos  "
+              f"consulta {f['consulta_s']:6.2f}s  armado {f['armado_s']:5.2f}s")
+    suma = sum(f["consulta_s"] for f in filas)
+    print(f"   Total {total_s:.2f}s (suma de consultas en serie: {suma:.2f}s)")
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 4) PUNTO DE ENTRADA
+# ═════════════════════════════════════════════════════════════════════════════
+
+@perfilado.perfilar("alertas")
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Ejecuta todas las alertas registradas en paralelo")
+    parser.add_argument("--solo", nargs="+", metavar="NOMBRE", help="Corre sólo las alertas indicadas")
+    parser.add_argument("--excluir", nargs="+", metavar="NOMBRE", default=[],
+                        help="Omite las alertas indicadas (p. ej. las que corre orquestador.py tras el ETL)")
+    parser.add_argument("--workers", type=int, default=WORKERS_ALERTAS)
+    parser.add_argument("--sin-envio", action="store_true", help="Consulta y reporta sin enviar correos")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    with perfilado.etapa("carga_alertas"):
+        alertas = cargar_alertas()
+    if args.solo:
+        alertas = [a for a in alertas if a["nombre"] in args.solo]
+        if not alertas:
+            print(f"❌ Ninguna alerta coincide con: {', '.join(args.solo)}")
+            return 2
+    alertas = [a for a in alertas if a["nombre"] not in args.excluir]
+    print(f"🚀 Ejecutando {len(alertas)} alertas con {args.workers} workers...")
+    with perfilado.etapa("alertas"):
+        filas = ejecutar_alertas(alertas, workers=args.workers, enviar=not args.sin_envio)
+    with perfilado.etapa("envio_correos"):
+        correos = _esperar_envios()
+    imprimir_latencias(filas, time.perf_counter() - t0)
+    return 1 if correos["errores"] or any(f["estado"].startswith("ERROR") for f in filas) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
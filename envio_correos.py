@@ -0,0 +1,237 @@
+# El objetivo de este módulo es centralizar el envío de correos de todos los scripts: los mensajes
+# se encolan y un hilo en segundo plano los despacha reutilizando una sola sesión SMTP autenticada
+# (STARTTLS + login una vez por lote, no por correo), con reintentos ante errores transitorios.
+# El script que encola no queda bloqueado por la latencia del servidor de correo; al terminar el
+# proceso se esperan los envíos pendientes y se informa la latencia de cada uno.
+# Para probar sin servidor real: `python -m aiosmtpd -n -l localhost:8025` y
+# `python envio_correos.py prueba --port 8025 --sin-tls`, o GRABACION=reproducir (los correos quedan como
+# .eml en los fixtures, ver grabacion.py).
+# -*- coding: utf-8 -*-
+# ═════════════════════════════════════════════════════════════════════════════
+# 1) IMPORTS Y CONFIGURACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+import sys
+import time
+import queue
+import atexit
+import smtplib
+import argparse
+import threading
+import statistics
+from concurrent.futures import Future
+from email.mime.text import MIMEText
+from typing import Callable, Dict, List, Optional
+import grabacion
+import metricas
+
+# Reintentos por mensaje ante errores transitorios (desconexión, 4xx) y espera base entre ellos
+REINTENTOS = 3
+ESPERA_REINTENTO_S = 2.0
+# Segundos sin mensajes tras los cuales se cierra la sesión SMTP
+SESION_INACTIVA_S = 5.0
+TIMEOUT_SMTP_S = 60
+
+# Cada configuración SMTP es un dict:
+# {'host', 'port', 'usuario', 'password', 'remitente', 'starttls' (opcional, True por defecto)}
+_despachadores: Dict[tuple, dict] = {}
+_despachadores_lock = threading.Lock()
+_hooks: List[Callable] = []
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2) SESIÓN SMTP
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _clave(cfg: Dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in cfg.items()))
+
+
+def _abrir_sesion(cfg: Dict) -> smtplib.SMTP:
+    if grabacion.reproduciendo():
+        return grabacion.sesion_smtp_reproduccion()
+    srv = smtplib.SMTP(cfg["host"], cfg["port"], timeout=TIMEOUT_SMTP_S)
+    if cfg.get("starttls", True):
+        srv.starttls()
+    if cfg.get("usuario"):
+        srv.login(cfg["usuario"], cfg["password"])
+    return srv
+
+
+def _cerrar_sesion(srv: Optional[smtplib.SMTP]) -> None:
+    if srv is None:
+        return
+    try:
+        srv.quit()
+    except (smtplib.SMTPException, OSError):
+        srv.close()
+
+
+def _es_transitorio(e: Exception) -> bool:
+    """Desconexiones, errores de red y respuestas 4xx se reintentan; 5xx, rechazos y auth fallida no.
+
+    SMTPException hereda de OSError: se clasifica antes para no reintentar un 550 o un 535.
+    """
+    if isinstance(e, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(e, smtplib.SMTPResponseException):
+        return 400 <= e.smtp_code < 500
+    if isinstance(e, smtplib.SMTPException):
+        return False
+    return isinstance(e, OSError)
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 3) DESPACHADOR EN SEGUNDO PLANO
+# ═════════════════════════════════════════════════════════════════════════════
+
+def registrar_hook(fn: Callable) -> None:
+    """Registra `fn(asunto, latencia_s, intentos, error)`; se llama al terminar cada envío."""
+    _hooks.append(fn)
+
+
+def _notificar(asunto: str, latencia: float, intentos: int, error: Optional[BaseException]) -> None:
+    for fn in _hooks:
+        try:
+            fn(asunto, latencia, intentos, error)
+        except Exception as e:
+            print(f"[WARN] Hook de correo falló: {e}")
+
+
+# Latencia y resultado de cada envío para Prometheus (ver metricas.py)
+registrar_hook(metricas.al_enviar)
+
+
+def _enviar_con_reintentos(desp: dict, item: dict) -> int:
+    """Envía `item` por la sesión del despachador (reconectando si hace falta); retorna los intentos."""
+    cfg = desp["cfg"]
+    for intento in range(1, REINTENTOS + 1):
+        try:
+            if desp["srv"] is None:
+                desp["srv"] = _abrir_sesion(cfg)
+                desp["sesiones"] += 1
+            t0 = time.perf_counter()
+            texto = item["mensaje"].as_string()
+            desp["srv"].sendmail(cfg["remitente"], item["destinatarios"], texto)
+            if grabacion.grabando():
+                grabacion.registrar_correo(texto, time.perf_counter() - t0)
+            return intento
+        except Exception as e:
+            _cerrar_sesion(desp["srv"])
+            desp["srv"] = None
+            if intento == REINTENTOS or not _es_transitorio(e):
+                raise
+            print(f"[WARN] Envío '{item['asunto']}' falló ({e}); reintento {intento}/{REINTENTOS - 1}")
+            time.sleep(ESPERA_REINTENTO_S * intento)
+    return REINTENTOS
+
+
+def _bucle(desp: dict) -> None:
+    cola: queue.Queue = desp["cola"]
+    while True:
+        try:
+            item = cola.get(timeout=SESION_INACTIVA_S if desp["srv"] else None)
+        except queue.Empty:
+            # Lote terminado: se libera la sesión hasta que llegue otro mensaje
+            _cerrar_sesion(desp["srv"])
+            desp["srv"] = None
+            continue
+        intentos, error = 0, None
+        try:
+            intentos = _enviar_con_reintentos(desp, item)
+        except Exception as e:
+            error = e
+        latencia = time.perf_counter() - item["t_encolado"]
+        if error is None:
+            item["futuro"].set_result({"intentos": intentos, "latencia_s": latencia})
+        else:
+            item["futuro"].set_exception(error)
+        desp["latencias"].append(latencia)
+        desp["errores"] += error is not None
+        _notificar(item["asunto"], latencia, intentos, error)
+        if error is None:
+            print(f"✉️ Correo '{item['asunto']}' enviado a: {', '.join(item['destinatarios'])} ({latencia:.2f}s)")
+        else:
+            print(f"❌ Error al enviar '{item['asunto']}': {error}")
+        cola.task_done()
+
+
+def _despachador(cfg: Dict) -> dict:
+    clave = _clave(cfg)
+    with _despachadores_lock:
+        if clave not in _despachadores:
+            desp = {"cfg": dict(cfg), "cola": queue.Queue(), "srv": None, "sesiones": 0, "errores": 0,
+                    "latencias": []}
+            desp["hilo"] = threading.Thread(target=_bucle, args=(desp,), name=f"smtp-{cfg['host']}", daemon=True)
+            desp["hilo"].start()
+            _despachadores[clave] = desp
+        return _despachadores[clave]
+
+
+def encolar(cfg: Dict, mensaje, destinatarios: List[str]) -> Future:
+    """Encola un mensaje MIME ya armado; retorna un Future con {'intentos', 'latencia_s'} (encolado a enviado)."""
+    futuro: Future = Future()
+    if not destinatarios:
+        print("[WARN] No hay destinatarios definidos, omitiendo envío de correo.")
+        futuro.set_result({"intentos": 0, "latencia_s": 0.0})
+        return futuro
+    _despachador(cfg)["cola"].put({
+        "mensaje": mensaje, "destinatarios": list(destinatarios), "asunto": mensaje.get("Subject", ""),
+        "futuro": futuro, "t_encolado": time.perf_counter(),
+    })
+    return futuro
+
+
+def enviar(cfg: Dict, mensaje, destinatarios: List[str]) -> Dict:
+    """Igual que `encolar` pero espera el resultado (propaga el error si el envío falla)."""
+    return encolar(cfg, mensaje, destinatarios).result()
+
+
+def esperar_envios() -> Dict[str, float]:
+    """Bloquea hasta vaciar todas las colas e imprime la latencia de lo enviado desde la última llamada."""
+    with _despachadores_lock:
+        despachadores = list(_despachadores.values())
+    latencias: List[float] = []
+    sesiones = errores = 0
+    for desp in despachadores:
+        desp["cola"].join()
+        latencias.extend(desp["latencias"])
+        sesiones += desp["sesiones"]
+        errores += desp["errores"]
+        desp["latencias"], desp["sesiones"], desp["errores"] = [], 0, 0
+    if latencias:
+        print(f"📬 {len(latencias)} correos ({errores} fallidos) en {sesiones} sesiones SMTP – latencia "
+              f"mediana {statistics.median(latencias):.2f}s | máx {max(latencias):.2f}s")
+    return {"correos": len(latencias), "errores": errores, "sesiones": sesiones,
+            "latencia_max_s": max(latencias) if latencias else 0.0}
+
+
+atexit.register(esperar_envios)
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 4) CLI: PRUEBA CONTRA UN SERVIDOR LOCAL
+# ═════════════════════════════════════════════════════════════════════════════
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Envía correos de prueba a través del despachador")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_prob = sub.add_parser("prueba", help="Encola N correos (p. ej. contra aiosmtpd local)")
+    p_prob.add_argument("--host", default="localhost")
+    p_prob.add_argument("--port", type=int, default=8025)
+    p_prob.add_argument("--sin-tls", action="store_true")
+    p_prob.add_argument("-n", type=int, default=10)
+    p_prob.add_argument("--para", default="prueba@localhost")
+    args = parser.parse_args()
+
+    cfg = {"host": args.host, "port": args.port, "remitente": "alertas@localhost",
+           "starttls": not args.sin_tls}
+    t0 = time.perf_counter()
+    for i in range(args.n):
+        msg = MIMEText(f"<p>Correo de prueba {i + 1}/{args.n}</p>", "html", "utf-8")
+        msg["From"], msg["To"], msg["Subject"] = cfg["remitente"], args.para, f"Prueba {i + 1}"
+        encolar(cfg, msg, [args.para])
+    print(f"⏱️  {args.n} correos encolados en {time.perf_counter() - t0:.3f}s")
+    resumen = esperar_envios()
+    print(f"⏱️  Total {time.perf_counter() - t0:.2f}s")
+    return 0 if resumen["errores"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+# El objetivo de este módulo es que las alertas (Alerta_*.py) recuerden qué ya reportaron:
+# guarda en SQLite local la marca de agua de cada revisión (hasta dónde se evaluó) y la huella de
+# cada hallazgo informado. Así cada corrida distingue hallazgos nuevos, los que siguen abiertos y los
+# resueltos, y el correo sólo se envía cuando hay novedades (nuevos o resueltos).
+# Se desactiva con la variable de entorno ALERTAS_ESTADO=0 (vuelve al comportamiento de reportar todo).
+# -*- coding: utf-8 -*-
+# ═════════════════════════════════════════════════════════════════════════════
+# 1) IMPORTS Y CONFIGURACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+import os
+import sqlite3
+import hashlib
+import pandas as pd
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from tablas_html import tabla_html
+
+USAR_ESTADO = os.environ.get("ALERTAS_ESTADO", "1") == "1"
+ESTADO_DB = os.environ.get("ALERTAS_ESTADO_DB", "estado_alertas.sqlite")
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2) ALMACÉN
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _abrir() -> sqlite3.Connection:
+    db = sqlite3.connect(ESTADO_DB, timeout=30)
+    db.execute("CREATE TABLE IF NOT EXISTS marcas (alerta TEXT PRIMARY KEY, marca TEXT, actualizado TEXT)")
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS hallazgos (
+            alerta TEXT, huella TEXT, ambito TEXT, primera_vez TEXT, ultima_vez TEXT,
+            abierto INTEGER, PRIMARY KEY (alerta, huella)
+        )
+    """)
+    return db
+
+
+def leer_marca(alerta: str) -> Optional[str]:
+    """Última marca de agua guardada para la alerta (p. ej. la fecha evaluada hasta), o None."""
+    db = _abrir()
+    try:
+        fila = db.execute("SELECT marca FROM marcas WHERE alerta = ?", (alerta,)).fetchone()
+    finally:
+        db.close()
+    return fila[0] if fila else None
+
+
+def guardar_marca(alerta: str, marca: str) -> None:
+    db = _abrir()
+    try:
+        with db:
+            db.execute("INSERT OR REPLACE INTO marcas VALUES (?, ?, ?)",
+                       (alerta, marca, datetime.now().isoformat(timespec="seconds")))
+    finally:
+        db.close()
+
+
+def ambito_abierto_mas_antiguo(alerta: str) -> Optional[str]:
+    """Ámbito más antiguo entre los hallazgos abiertos (para volver a revisarlos junto a lo nuevo)."""
+    db = _abrir()
+    try:
+        fila = db.execute("SELECT MIN(ambito) FROM hallazgos WHERE alerta = ? AND abierto = 1", (alerta,)).fetchone()
+    finally:
+        db.close()
+    return fila[0] if fila else None
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 3) HUELLAS Y CLASIFICACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+
+def huellas(df: pd.DataFrame, claves: List[str]) -> pd.Series:
+    """Huella estable de cada fila a partir de sus columnas clave."""
+    if df.empty:
+        return pd.Series([], index=df.index, dtype=object)
+    texto = df[claves].astype(str).agg("|".join, axis=1)
+    return texto.map(lambda t: hashlib.sha1(t.encode("utf-8")).hexdigest()[:16])
+
+
+def clasificar_hallazgos(alerta: str, df: pd.DataFrame, claves: List[str], columna_ambito: Optional[str] = None,
+                        rango_ambito: Optional[Tuple[str, str]] = None) -> Dict:
+    """Compara los hallazgos de esta corrida con los abiertos, sin modificar el almacén.
+
+    Un hallazgo abierto que no aparece en esta corrida cuenta como resuelto, pero sólo si su ámbito
+    cae dentro de `rango_ambito` [desde, hasta) (lo que realmente se evaluó); sin rango, se
+    considera evaluado todo. Retorna {'nuevos': df, 'nuevos_n', 'abiertos_n', 'resueltos_n'} más lo
+    que `registrar_hallazgos` necesita para persistir la corrida.
+    """
+    h = huellas(df, claves)
+    ambitos = df[columna_ambito].astype(str) if columna_ambito else pd.Series("", index=df.index)
+    db = _abrir()
+    try:
+        abiertos = dict(db.execute(
+            "SELECT huella, ambito FROM hallazgos WHERE alerta = ? AND abierto = 1", (alerta,)
+        ).fetchall())
+    finally:
+        db.close()
+    actuales = set(h)
+    es_nuevo = ~h.isin(abiertos.keys()) if len(h) else pd.Series([], dtype=bool)
+    resueltos = [
+        hu for hu, amb in abiertos.items()
+        if hu not in actuales and (rango_ambito is None or rango_ambito[0] <= amb < rango_ambito[1])
+    ]
+
+    nuevos = df[es_nuevo] if len(df) else df
+    resumen = {
+        "alerta": alerta,
+        "nuevos": nuevos,
+        "nuevos_n": len(nuevos),
+        "abiertos_n": len(df) - len(nuevos),
+        "resueltos_n": len(resueltos),
+        "huellas": list(zip(h, ambitos)),
+        "resueltos": resueltos,
+    }
+    print(f"🗂️  [{alerta}] nuevos: {resumen['nuevos_n']} | siguen abiertos: {resumen['abiertos_n']} "
+          f"| resueltos: {resumen['resueltos_n']}")
+    return resumen
+
+
+def registrar_hallazgos(resumen: Dict) -> None:
+    """Persiste lo clasificado por `clasificar_hallazgos`: abre los actuales y cierra los resueltos."""
+    ahora = datetime.now().isoformat(timespec="seconds")
+    alerta = resumen["alerta"]
+    db = _abrir()
+    try:
+        with db:
+            db.executemany(
+                "INSERT INTO hallazgos VALUES (?, ?, ?, ?, ?, 1) "
+                "ON CONFLICT (alerta, huella) DO UPDATE SET ultima_vez = excluded.ultima_vez, abierto = 1",
+                [(alerta, hu, amb, ahora, ahora) for hu, amb in resumen["huellas"]]
+            )
+            db.executemany(
+                "UPDATE hallazgos SET abierto = 0, ultima_vez = ? WHERE alerta = ? AND huella = ?",
+                [(ahora, alerta, hu) for hu in resumen["resueltos"]]
+            )
+    finally:
+        db.close()
+
+
+def hay_novedades(resumen: Dict) -> bool:
+    return resumen["nuevos_n"] > 0 or resumen["resueltos_n"] > 0
+
+
+def resumen_html(resumen: Optional[Dict]) -> str:
+    """Bloque HTML con los conteos de la corrida; vacío si no se usa el estado."""
+    if not resumen:
+        return ""
+    conteos = pd.DataFrame({
+        "Nuevos": [resumen["nuevos_n"]],
+        "Siguen abiertos": [resumen["abiertos_n"]],
+        "Resueltos": [resumen["resueltos_n"]],
+    })
+    return ("<p>Resumen respecto de la revisión anterior (el detalle incluye sólo los casos nuevos):</p>"
+            + tabla_html(conteos, miles=True) + "<br>")
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 4) INTEGRACIÓN CON LAS ALERTAS
+# ═════════════════════════════════════════════════════════════════════════════
+
+def filtrar_por_estado(alerta: Dict, df: pd.DataFrame,
+                       rango_ambito: Optional[Tuple[str, str]] = None) -> Tuple[pd.DataFrame, Optional[Dict], bool]:
+    """Aplica el estado a la definición `ALERTA` (clave opcional 'estado': {'claves', 'ambito'}).
+
+    Sólo lee el almacén: lo clasificado se guarda con `registrar_reportados` una vez confirmado el
+    envío, así un correo fallido vuelve a reportar lo mismo en la corrida siguiente.
+    Si la consulta acotó lo evaluado, lo informa en `df.attrs['rango_ambito']`, y la nueva marca de
+    agua en `df.attrs['marca']`.
+    Retorna (filas a reportar, resumen o None, si corresponde enviar el correo).
+    """
+    cfg = alerta.get("estado")
+    if not (USAR_ESTADO and cfg):
+        return df, None, not df.empty
+    rango_ambito = rango_ambito or df.attrs.get("rango_ambito")
+    resumen = clasificar_hallazgos(alerta["nombre"], df, cfg["claves"], cfg.get("ambito"), rango_ambito)
+    resumen["marca"] = df.attrs.get("marca")
+    return resumen["nuevos"], resumen, hay_novedades(resumen)
+
+
+def registrar_reportados(resumen: Optional[Dict]) -> None:
+    """Guarda la corrida clasificada por `filtrar_por_estado` y su marca de agua (sin estado no hace nada).
+
+    Llamar sólo con el correo entregado (o sin novedades que enviar); nunca en corridas sin envío.
+    """
+    if not resumen:
+        return
+    registrar_hallazgos(resumen)
+    if resumen.get("marca"):
+        guardar_marca(resumen["alerta"], resumen["marca"])
@@ -0,0 +1,375 @@
+# El objetivo de este módulo es poder correr y perfilar los scripts sin Redshift, S3 ni SMTP:
+# graba en fixtures lo que devuelven esos bordes (consultas a Parquet por huella de SQL + parámetros,
+# objetos S3 como archivos y correos como .eml) y luego lo reproduce, inyectando la latencia
+# registrada en la grabación para que los tiempos sean realistas.
+# Se activa con variables de entorno (sin ellas no cambia nada):
+#   GRABACION=grabar|reproducir   GRABACION_DIR=fixtures   GRABACION_LATENCIA=1.0 (0 = sin espera)
+#   GRABACION_ESTRICTO=1          (no usar la última grabación con el mismo nombre si cambió la huella)
+# Los fixtures sintéticos se generan con datos_sinteticos.py.
+# -*- coding: utf-8 -*-
+# ═════════════════════════════════════════════════════════════════════════════
+# 1) IMPORTS Y CONFIGURACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+import io
+import os
+import re
+import json
+import time
+import glob
+import hashlib
+import threading
+import statistics
+from datetime import date, datetime
+from typing import Callable, Dict, Iterator, Optional
+
+MODO = os.environ.get("GRABACION", "")
+DIRECTORIO = os.environ.get("GRABACION_DIR", "fixtures")
+FACTOR_LATENCIA = float(os.environ.get("GRABACION_LATENCIA", "1.0"))
+ESTRICTO = os.environ.get("GRABACION_ESTRICTO", "0") == "1"
+
+# Latencia por correo al reproducir si no hay correos grabados
+LATENCIA_SMTP_S = 0.3
+
+_lock = threading.Lock()
+_estadisticas: Dict[str, int] = {"consultas": 0, "escrituras": 0, "objetos_s3": 0, "correos": 0}
+
+
+def activar(modo: str, directorio: Optional[str] = None, factor_latencia: Optional[float] = None) -> None:
+    """Activa la grabación o reproducción desde código (p. ej. en benchmarks); modo '' la desactiva."""
+    global MODO, DIRECTORIO, FACTOR_LATENCIA
+    if modo not in ("", "grabar", "reproducir"):
+        raise ValueError(f"Modo de grabación desconocido: {modo}")
+    MODO = modo
+    DIRECTORIO = directorio or DIRECTORIO
+    FACTOR_LATENCIA = FACTOR_LATENCIA if factor_latencia is None else factor_latencia
+
+
+def grabando() -> bool:
+    return MODO == "grabar"
+
+
+def reproduciendo() -> bool:
+    return MODO == "reproducir"
+
+
+def estadisticas() -> Dict[str, int]:
+    return dict(_estadisticas)
+
+
+def _contar(clave: str, n: int = 1) -> None:
+    with _lock:
+        _estadisticas[clave] += n
+
+
+def _esperar(latencia_s: float) -> None:
+    if FACTOR_LATENCIA > 0 and latencia_s > 0:
+        time.sleep(latencia_s * FACTOR_LATENCIA)
+
+
+def _ruta(*partes: str) -> str:
+    ruta = os.path.join(DIRECTORIO, *partes)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    return ruta
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2) CONSULTAS
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _texto_param(v) -> str:
+    return v.isoformat() if isinstance(v, (date, datetime)) else repr(v)
+
+
+def huella_consulta(sql: Optional[str], params: Optional[dict] = None, nombre: Optional[str] = None) -> str:
+    """Huella estable de la consulta: SQL sin espacios redundantes + parámetros ordenados.
+
+    Sin SQL (fixtures sintéticos) la huella sale del nombre de la consulta.
+    """
+    if sql is None:
+        texto = f"nombre:{nombre}"
+    else:
+        texto = re.sub(r"\s+", " ", sql).strip()
+        if params:
+            texto += "|" + "|".join(f"{k}={_texto_param(v)}" for k, v in sorted(params.items()))
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()[:16]
+
+
+def guardar_consulta(df, sql: Optional[str] = None, params: Optional[dict] = None,
+                     nombre: Optional[str] = None, latencia_s: float = 0.0) -> str:
+    """Guarda el resultado como fixture Parquet (+ metadatos JSON); retorna la huella."""
+    huella = huella_consulta(sql, params, nombre)
+    df_guardar = df
+    try:
+        df.to_parquet(_ruta("consultas", f"{huella}.parquet"), index=False)
+    except Exception:
+        # Columnas object con tipos mezclados (p. ej. Decimal y None): se guardan como texto
+        df_guardar = df.copy()
+        for c in df_guardar.columns[df_guardar.dtypes == object]:
+            df_guardar[c] = df_guardar[c].map(lambda v: v if v is None else str(v))
+        df_guardar.to_parquet(_ruta("consultas", f"{huella}.parquet"), index=False)
+    meta = {
+        "huella": huella, "nombre": nombre, "sql": sql,
+        "params": {k: _texto_param(v) for k, v in (params or {}).items()},
+        "filas": len(df), "latencia_s": round(latencia_s, 4),
+        "grabado": datetime.now().isoformat(timespec="seconds"),
+    }
+    with open(_ruta("consultas", f"{huella}.json"), "w", encoding="utf-8") as fh:
+        json.dump(meta, fh, ensure_ascii=False, indent=1)
+    return huella
+
+
+def _buscar_fixture(sql: Optional[str], params: Optional[dict], nombre: Optional[str]) -> Dict:
+    huella = huella_consulta(sql, params, nombre)
+    ruta = os.path.join(DIRECTORIO, "consultas", f"{huella}.json")
+    if os.path.exists(ruta):
+        with open(ruta, encoding="utf-8") as fh:
+            return json.load(fh)
+    if nombre and not ESTRICTO:
+        # Las fechas de los parámetros cambian cada día: se usa la última grabación con el mismo nombre
+        candidatos = []
+        for r in glob.glob(os.path.join(DIRECTORIO, "consultas", "*.json")):
+            with open(r, encoding="utf-8") as fh:
+                meta = json.load(fh)
+            if meta.get("nombre") == nombre:
+                candidatos.append(meta)
+        if candidatos:
+            return max(candidatos, key=lambda m: m["grabado"])
+    raise FileNotFoundError(
+        f"Sin fixture para la consulta '{nombre or 'sin nombre'}' (huella {huella}) en {DIRECTORIO}/consultas"
+    )
+
+
+def reproducir_consulta(sql: Optional[str], params: Optional[dict] = None, nombre: Optional[str] = None):
+    """Retorna el DataFrame grabado, esperando la latencia registrada (por GRABACION_LATENCIA)."""
+    import pandas as pd
+    meta = _buscar_fixture(sql, params, nombre)
+    df = pd.read_parquet(os.path.join(DIRECTORIO, "consultas", f"{meta['huella']}.parquet"))
+    _esperar(meta.get("latencia_s", 0.0))
+    _contar("consultas")
+    return df
+
+
+def consulta(sql: str, params: Optional[dict], nombre: Optional[str], ejecutar: Callable):
+    """Borde de consultas (lo usa acceso_datos.consultar_df): ejecuta, graba o reproduce."""
+    if reproduciendo():
+        return reproducir_consulta(sql, params, nombre)
+    if not grabando():
+        return ejecutar()
+    t0 = time.perf_counter()
+    df = ejecutar()
+    guardar_consulta(df, sql, params, nombre, time.perf_counter() - t0)
+    _contar("consultas")
+    return df
+
+
+def consulta_por_bloques(sql: str, params: Optional[dict], nombre: Optional[str], tamano: int,
+                         leer: Callable[[], Iterator]) -> Iterator:
+    """Igual que `consulta` para la lectura por bloques: reproduce en bloques de `tamano` filas."""
+    if reproduciendo():
+        df = reproducir_consulta(sql, params, nombre)
+        for i in range(0, len(df), tamano):
+            yield df.iloc[i:i + tamano].reset_index(drop=True)
+        return
+    if not grabando():
+        yield from leer()
+        return
+    import pandas as pd
+    t0, bloques = time.perf_counter(), []
+    for bloque in leer():
+        bloques.append(bloque)
+        yield bloque
+    if bloques:
+        guardar_consulta(pd.concat(bloques, ignore_index=True), sql, params, nombre, time.perf_counter() - t0)
+        _contar("consultas")
+
+
+class _CursorReproduccion:
+    """Cursor sin base: acepta DDL/INSERT (temporales, cargas) y no retorna filas."""
+
+    def __init__(self, conexion):
+        self.connection = conexion
+        self.rowcount = 0
+        self.description = None
+        self.itersize = 0
+
+    def execute(self, sql, params=None):
+        _contar("escrituras")
+        self.rowcount = 0
+
+    def executemany(self, sql, filas):
+        _contar("escrituras")
+        self.rowcount = len(filas)
+
+    def mogrify(self, plantilla, args):
+        # Lo usa psycopg2.extras.execute_values para armar cada página del INSERT
+        return repr(tuple(args)).encode("utf-8")
+
+    def fetchall(self):
+        return []
+
+    def fetchmany(self, n=None):
+        return []
+
+    def fetchone(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class _ConexionReproduccion:
+    encoding = "UTF8"
+    closed = 0
+
+    def cursor(self, name=None, **kwargs):
+        return _CursorReproduccion(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def cancel(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def conexion_reproduccion() -> _ConexionReproduccion:
+    """Conexión falsa que entrega acceso_datos.conexion al reproducir (no abre red)."""
+    return _ConexionReproduccion()
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 3) S3
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _latencias(tipo: str) -> Dict[str, float]:
+    ruta = os.path.join(DIRECTORIO, tipo, "_latencias.json")
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _guardar_latencia(tipo: str, clave: str, latencia_s: float) -> None:
+    with _lock:
+        lat = _latencias(tipo)
+        lat[clave] = round(latencia_s, 4)
+        with open(_ruta(tipo, "_latencias.json"), "w", encoding="utf-8") as fh:
+            json.dump(lat, fh, indent=1)
+
+
+class _PaginadorS3:
+    def __init__(self, raiz: str):
+        self.raiz = raiz
+
+    def paginate(self, Bucket: str, Prefix: str = "", **kwargs):
+        base = os.path.join(self.raiz, Bucket)
+        contenidos = []
+        for ruta in glob.glob(os.path.join(base, "**", "*"), recursive=True):
+            key = os.path.relpath(ruta, base).replace(os.sep, "/")
+            if os.path.isfile(ruta) and key.startswith(Prefix) and not key.endswith("_latencias.json"):
+                contenidos.append({"Key": key, "Size": os.path.getsize(ruta),
+                                   "LastModified": datetime.fromtimestamp(os.path.getmtime(ruta))})
+        yield {"Contents": contenidos}
+
+
+class _S3Reproduccion:
+    """Cliente S3 mínimo sobre `fixtures/s3/<bucket>/<key>` (listar, leer, escribir, URL)."""
+
+    def __init__(self):
+        self.raiz = os.path.join(DIRECTORIO, "s3")
+        self.latencias = _latencias("s3")
+
+    def get_paginator(self, operacion: str):
+        return _PaginadorS3(self.raiz)
+
+    def get_object(self, Bucket: str, Key: str, **kwargs):
+        ruta = os.path.join(self.raiz, Bucket, Key)
+        if not os.path.exists(ruta):
+            raise FileNotFoundError(f"Sin fixture S3 para s3://{Bucket}/{Key} en {self.raiz}")
+        with open(ruta, "rb") as fh:
+            contenido = fh.read()
+        _esperar(self.latencias.get(f"{Bucket}/{Key}", 0.0))
+        _contar("objetos_s3")
+        return {"Body": io.BytesIO(contenido), "ContentLength": len(contenido)}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs):
+        with open(_ruta("s3", Bucket, Key), "wb") as fh:
+            fh.write(Body)
+        return {}
+
+    def generate_presigned_url(self, operacion: str, Params: Dict, ExpiresIn: int = 3600):
+        return "file://" + os.path.abspath(os.path.join(self.raiz, Params["Bucket"], Params["Key"]))
+
+
+class _S3Grabacion:
+    """Envuelve el cliente real y copia cada objeto leído (con su latencia) a los fixtures."""
+
+    def __init__(self, cliente):
+        self._cliente = cliente
+
+    def get_object(self, Bucket: str, Key: str, **kwargs):
+        t0 = time.perf_counter()
+        respuesta = self._cliente.get_object(Bucket=Bucket, Key=Key, **kwargs)
+        contenido = respuesta["Body"].read()
+        _guardar_latencia("s3", f"{Bucket}/{Key}", time.perf_counter() - t0)
+        with open(_ruta("s3", Bucket, Key), "wb") as fh:
+            fh.write(contenido)
+        _contar("objetos_s3")
+        return dict(respuesta, Body=io.BytesIO(contenido))
+
+    def __getattr__(self, nombre):
+        return getattr(self._cliente, nombre)
+
+
+def cliente_s3(crear: Callable):
+    """Borde S3: el cliente real (`crear()`), uno que graba lo leído o uno que lee de los fixtures."""
+    if reproduciendo():
+        return _S3Reproduccion()
+    if grabando():
+        return _S3Grabacion(crear())
+    return crear()
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 4) SMTP
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _guardar_eml(mensaje: str) -> str:
+    with _lock:
+        _estadisticas["correos"] += 1
+        n = _estadisticas["correos"]
+    ruta = _ruta("correos", f"{datetime.now():%Y%m%d_%H%M%S}_{n:04d}.eml")
+    with open(ruta, "w", encoding="utf-8") as fh:
+        fh.write(mensaje)
+    return ruta
+
+
+class _SMTPReproduccion:
+    """Sesión SMTP falsa: cada correo queda como .eml en fixtures/correos, con la latencia grabada."""
+
+    def __init__(self):
+        grabadas = list(_latencias("correos").values())
+        self.latencia_s = statistics.median(grabadas) if grabadas else LATENCIA_SMTP_S
+
+    def sendmail(self, remitente, destinatarios, mensaje: str):
+        _esperar(self.latencia_s)
+        _guardar_eml(mensaje)
+        return {}
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def sesion_smtp_reproduccion() -> _SMTPReproduccion:
+    return _SMTPReproduccion()
+
+
+def registrar_correo(mensaje: str, latencia_s: float) -> None:
+    """Al grabar, guarda una copia del correo enviado y su latencia."""
+    ruta = _guardar_eml(mensaje)
+    _guardar_latencia("correos", os.path.basename(ruta), latencia_s)
@@ -0,0 +1,234 @@
+# El objetivo de este módulo es dejar métricas de todas las automatizaciones en un formato que
+# Prometheus pueda leer, en vez de tener que parsear la consola: contadores e histogramas de latencia
+# por consulta (hooks de acceso_datos), por envío SMTP (hooks de envio_correos), por armado de correo
+# y por tarea del programador (hooks de programador). Con METRICAS_DIR definido, al terminar cada
+# corrida se escribe METRICAS_DIR/automatizaciones_<script>.prom para el textfile collector de
+# node_exporter (o un volcado OpenMetrics con METRICAS_FORMATO=openmetrics). Los valores se acumulan
+# entre corridas en un .json al lado, así contadores e histogramas son monótonos y se puede alertar por
+# regresiones del p95, p. ej. de la consulta MTD de tarifas o de SQL_VALIDACION de descuadratura:
+#   histogram_quantile(0.95, sum by (le) (rate(automatizaciones_consulta_segundos_bucket{consulta="tarifas_mtd"}[7d])))
+#   histogram_quantile(0.95, sum by (le) (rate(automatizaciones_consulta_segundos_bucket{consulta="descuadratura_validacion"}[7d])))
+# Sin METRICAS_DIR las mediciones sólo quedan en memoria (costo de un dict por evento).
+# -*- coding: utf-8 -*-
+# ═════════════════════════════════════════════════════════════════════════════
+# 1) IMPORTS Y CONFIGURACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+import os
+import re
+import sys
+import json
+import time
+import atexit
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Carpeta del textfile collector (vacío = no se escriben archivos) y formato de salida
+METRICAS_DIR = os.getenv("METRICAS_DIR", "")
+METRICAS_FORMATO = os.getenv("METRICAS_FORMATO", "prometheus")  # prometheus | openmetrics
+PREFIJO = "automatizaciones"
+
+# Límites superiores (s) de los buckets de todos los histogramas de latencia
+BUCKETS_S = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+# -- Familias: nombre -> (tipo, ayuda). Las series llevan además la etiqueta `script`.
+FAMILIAS: Dict[str, Tuple[str, str]] = {
+    "consulta_segundos":        ("histogram", "Duración de cada consulta a Redshift"),
+    "consultas_total":          ("counter", "Consultas ejecutadas por resultado"),
+    "consulta_filas_total":     ("counter", "Filas retornadas por consulta"),
+    "smtp_envio_segundos":      ("histogram", "Latencia de cada correo desde que se encola hasta que sale"),
+    "smtp_envios_total":        ("counter", "Correos enviados por resultado"),
+    "smtp_reintentos_total":    ("counter", "Reintentos de envío SMTP"),
+    "correo_armado_segundos":   ("histogram", "Tiempo de armado de cada correo (tablas, adjuntos)"),
+    "tarea_segundos":           ("histogram", "Duración de cada corrida de tarea del programador"),
+    "tarea_retraso_segundos":   ("histogram", "Retraso del inicio de cada tarea respecto de lo programado"),
+    "tareas_total":             ("counter", "Corridas de tareas del programador por estado"),
+}
+
+Clave = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_contadores: Dict[Clave, float] = {}
+_histogramas: Dict[Clave, List] = {}  # clave -> [conteos por bucket (+Inf al final), suma, cuenta]
+_lock = threading.Lock()
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2) REGISTRO EN MEMORIA
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _clave(nombre: str, etiquetas: Dict[str, str]) -> Clave:
+    if nombre not in FAMILIAS:
+        raise KeyError(f"Métrica no declarada en FAMILIAS: {nombre}")
+    return nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+
+def contar(nombre: str, valor: float = 1, **etiquetas) -> None:
+    clave = _clave(nombre, etiquetas)
+    with _lock:
+        _contadores[clave] = _contadores.get(clave, 0) + valor
+
+
+def observar(nombre: str, valor_s: float, **etiquetas) -> None:
+    clave = _clave(nombre, etiquetas)
+    with _lock:
+        h = _histogramas.get(clave)
+        if h is None:
+            h = _histogramas[clave] = [[0] * (len(BUCKETS_S) + 1), 0.0, 0]
+        h[0][bisect.bisect_left(BUCKETS_S, valor_s)] += 1
+        h[1] += valor_s
+        h[2] += 1
+
+
+@contextmanager
+def medir(nombre: str, **etiquetas) -> Iterator[None]:
+    """Observa la duración del bloque en el histograma `nombre` (también si el bloque falla)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar(nombre, time.perf_counter() - t0, **etiquetas)
+
+
+def reiniciar() -> None:
+    """Descarta lo no escrito (p. ej. lo heredado por fork en un worker del programador)."""
+    with _lock:
+        _contadores.clear()
+        _histogramas.clear()
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 3) HOOKS (ver registrar_hook en acceso_datos, envio_correos y programador)
+# ═════════════════════════════════════════════════════════════════════════════
+
+def al_consultar(nombre: Optional[str], duracion_s: float, filas: int, error: Optional[BaseException]) -> None:
+    consulta = nombre or "sin_nombre"
+    observar("consulta_segundos", duracion_s, consulta=consulta)
+    contar("consultas_total", consulta=consulta, resultado="ok" if error is None else "error")
+    contar("consulta_filas_total", filas, consulta=consulta)
+
+
+def al_enviar(asunto: str, latencia_s: float, intentos: int, error: Optional[BaseException]) -> None:
+    # El asunto lleva fechas: como etiqueta crearía una serie por día, basta con la del script
+    observar("smtp_envio_segundos", latencia_s)
+    contar("smtp_envios_total", resultado="ok" if error is None else "error")
+    if intentos > 1:
+        contar("smtp_reintentos_total", intentos - 1)
+
+
+def al_terminar_tarea(tarea: str, retraso_s: float, duracion_s: float, estado: str) -> None:
+    observar("tarea_segundos", duracion_s, tarea=tarea)
+    observar("tarea_retraso_segundos", max(0.0, retraso_s), tarea=tarea)
+    contar("tareas_total", tarea=tarea, estado=estado)
+    escribir()
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 4) ESCRITURA (TEXTFILE COLLECTOR / OPENMETRICS)
+# ═════════════════════════════════════════════════════════════════════════════
+
+def script_actual() -> str:
+    """Nombre del script en curso (sys.argv[0] sin ruta ni extensión; 'python' para -c o la consola)."""
+    nombre = os.path.splitext(os.path.basename(sys.argv[0] if sys.argv else ""))[0]
+    if nombre.startswith("-"):
+        nombre = ""
+    return re.sub(r"\W+", "_", nombre).strip("_") or "python"
+
+
+def _cargar_estado(ruta: str) -> Tuple[Dict[Clave, float], Dict[Clave, List]]:
+    if not os.path.exists(ruta):
+        return {}, {}
+    with open(ruta, encoding="utf-8") as fh:
+        datos = json.load(fh)
+    contadores = {(n, tuple(map(tuple, e))): v for n, e, v in datos["contadores"]}
+    histogramas = {(n, tuple(map(tuple, e))): h for n, e, *h in datos["histogramas"]
+                   if len(h[0]) == len(BUCKETS_S) + 1}  # buckets cambiados: la serie parte de cero
+    return contadores, histogramas
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas(pares: Tuple[Tuple[str, str], ...]) -> str:
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}" if pares else ""
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+
+def formatear(contadores: Dict[Clave, float], histogramas: Dict[Clave, List], script: str,
+              formato: str = METRICAS_FORMATO) -> str:
+    """Texto en formato de exposición de Prometheus u OpenMetrics, con la etiqueta `script` en cada serie."""
+    openmetrics = formato == "openmetrics"
+    lineas: List[str] = []
+    for familia, (tipo, ayuda) in FAMILIAS.items():
+        series_c = sorted((e, v) for (n, e), v in contadores.items() if n == familia)
+        series_h = sorted((e, h) for (n, e), h in histogramas.items() if n == familia)
+        if not series_c and not series_h:
+            continue
+        nombre = f"{PREFIJO}_{familia}"
+        base = nombre[:-len("_total")] if openmetrics and tipo == "counter" else nombre
+        lineas += [f"# HELP {base} {ayuda}", f"# TYPE {base} {tipo}"]
+        for etiquetas, valor in series_c:
+            lineas.append(f"{nombre}{_etiquetas((('script', script),) + etiquetas)} {_numero(valor)}")
+        for etiquetas, (conteos, suma, cuenta) in series_h:
+            pares = (("script", script),) + etiquetas
+            acumulado = 0
+            for limite, n in zip(list(BUCKETS_S) + ["+Inf"], conteos):
+                acumulado += n
+                le = limite if limite == "+Inf" else _numero(limite)
+                lineas.append(f"{nombre}_bucket{_etiquetas(pares + (('le', le),))} {acumulado}")
+            lineas.append(f"{nombre}_sum{_etiquetas(pares)} {_numero(suma)}")
+            lineas.append(f"{nombre}_count{_etiquetas(pares)} {cuenta}")
+    if openmetrics:
+        lineas.append("# EOF")
+    return "\n".join(lineas) + "\n"
+
+
+def escribir(script: Optional[str] = None, directorio: Optional[str] = None) -> Optional[str]:
+    """Suma lo medido al acumulado del script y reescribe su archivo; retorna la ruta (None si no hay destino).
+
+    Lo escrito se descuenta de memoria, así llamadas sucesivas (workers calientes) no cuentan dos veces.
+    """
+    directorio = directorio if directorio is not None else METRICAS_DIR
+    if not directorio:
+        return None
+    script = script or script_actual()
+    with _lock:
+        nuevos_c, nuevos_h = dict(_contadores), {k: [list(v[0]), v[1], v[2]] for k, v in _histogramas.items()}
+        _contadores.clear()
+        _histogramas.clear()
+    if not nuevos_c and not nuevos_h:
+        return None
+
+    os.makedirs(directorio, exist_ok=True)
+    base = os.path.join(directorio, f"{PREFIJO}_{script}")
+    contadores, histogramas = _cargar_estado(base + ".json")
+    for clave, valor in nuevos_c.items():
+        contadores[clave] = contadores.get(clave, 0) + valor
+    for clave, (conteos, suma, cuenta) in nuevos_h.items():
+        previo = histogramas.get(clave, [[0] * len(conteos), 0.0, 0])
+        histogramas[clave] = [[a + b for a, b in zip(previo[0], conteos)], previo[1] + suma, previo[2] + cuenta]
+
+    ruta = base + (".om.txt" if METRICAS_FORMATO == "openmetrics" else ".prom")
+    # Escritura atómica: el collector nunca debe leer un archivo a medio escribir
+    for destino, texto in (
+        (base + ".json", json.dumps({
+            "contadores": [[n, e, v] for (n, e), v in contadores.items()],
+            "histogramas": [[n, e, *h] for (n, e), h in histogramas.items()],
+        })),
+        (ruta, formatear(contadores, histogramas, script)),
+    ):
+        with open(destino + ".tmp", "w", encoding="utf-8") as fh:
+            fh.write(texto)
+        os.replace(destino + ".tmp", destino)
+    return ruta
+
+
+def _escribir_al_salir() -> None:
+    try:
+        escribir()
+    except Exception as e:
+        print(f"[WARN] No se pudieron escribir las métricas: {e}")
+
+
+atexit.register(_escribir_al_salir)
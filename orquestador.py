@@ -0,0 +1,182 @@
+# El objetivo de este script es encadenar el ETL y los chequeos que dependen de él según sus
+# dependencias, en vez de offsets fijos de cron: Alerta_descuadratura compara contra la tabla que carga
+# ETL_Sencillo, así que corre apenas el ETL termina bien (ni antes, con la tabla a medio cargar, ni
+# mucho después). Las tareas independientes corren en paralelo con un límite de concurrencia y, si una
+# tarea falla, las que dependen de ella se omiten.
+# Cada tarea corre en un worker aislado con timeout (ver programador.py). Al final se informa la ruta
+# crítica (la cadena de tareas que determinó la duración total) y el makespan.
+# Uso: python orquestador.py [--workers 3] [--plan]
+# -*- coding: utf-8 -*-
+# ═════════════════════════════════════════════════════════════════════════════
+# 1) IMPORTS Y CONFIGURACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+import sys
+import time
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from programador import cerrar_workers, ejecutar_tarea
+import perfilado
+
+# -- Tareas del DAG (mismo formato que programador.TAREAS) con 'depende_de' opcional
+DAG: Dict[str, Dict] = {
+    'etl': {
+        'funcion': 'ETL_Sencillo:main', 'timeout_s': 3600,
+    },
+    'descuadratura': {
+        'funcion': 'ejecutar_alertas:main', 'args': [['--solo', 'descuadratura']], 'timeout_s': 1800,
+        'depende_de': ['etl'],
+    },
+    'clasificacion_comercios': {
+        'funcion': 'ejecutar_alertas:main', 'args': [['--solo', 'clasificacion_comercios']], 'timeout_s': 1800,
+        'depende_de': ['descuadratura'],
+    },
+    'margen_objetivo': {
+        'funcion': 'ejecutar_alertas:main', 'args': [['--solo', 'margen_objetivo']], 'timeout_s': 1800,
+        'depende_de': ['descuadratura'],
+    },
+}
+
+# Tareas simultáneas como máximo
+WORKERS_DAG = 3
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2) VALIDACIÓN Y ORDEN
+# ═════════════════════════════════════════════════════════════════════════════
+
+def niveles(dag: Dict[str, Dict]) -> List[List[str]]:
+    """Orden topológico por niveles (cada nivel depende sólo de los anteriores); valida el DAG."""
+    desconocidas = {d for cfg in dag.values() for d in cfg.get('depende_de', []) if d not in dag}
+    if desconocidas:
+        raise ValueError(f"Dependencias no declaradas: {', '.join(sorted(desconocidas))}")
+    pendientes = {t: set(cfg.get('depende_de', [])) for t, cfg in dag.items()}
+    resultado: List[List[str]] = []
+    while pendientes:
+        nivel = sorted(t for t, deps in pendientes.items() if not deps)
+        if not nivel:
+            raise ValueError(f"El DAG tiene ciclos entre: {', '.join(sorted(pendientes))}")
+        resultado.append(nivel)
+        for t in nivel:
+            del pendientes[t]
+        for deps in pendientes.values():
+            deps.difference_update(nivel)
+    return resultado
+
+
+def descendientes(dag: Dict[str, Dict], tarea: str) -> List[str]:
+    """Tareas que dependen (directa o indirectamente) de `tarea`."""
+    hijos = [t for t, cfg in dag.items() if tarea in cfg.get('depende_de', [])]
+    resultado = list(hijos)
+    for h in hijos:
+        resultado.extend(d for d in descendientes(dag, h) if d not in resultado)
+    return resultado
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 3) EJECUCIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+
+def ejecutar_dag(dag: Dict[str, Dict] = DAG, workers: int = WORKERS_DAG,
+                 ejecutor: Callable = ejecutar_tarea) -> Dict[str, Dict]:
+    """Lanza cada tarea apenas terminan bien todas sus dependencias (hasta `workers` a la vez).
+
+    Retorna por tarea: estado (OK / ERROR / TIMEOUT / OMITIDA), listo_s, inicio_s, fin_s (segundos
+    desde el inicio del DAG) y la fila de `ejecutor`.
+    """
+    niveles(dag)
+    pendientes = {t: set(cfg.get('depende_de', [])) for t, cfg in dag.items()}
+    resultados: Dict[str, Dict] = {}
+    t0 = time.perf_counter()
+
+    def correr(tarea: str, listo: datetime, listo_s: float) -> Dict:
+        inicio_s = time.perf_counter() - t0
+        fila = ejecutor(tarea, listo, dag)
+        return {"estado": fila["estado"], "listo_s": listo_s, "inicio_s": inicio_s,
+                "fin_s": time.perf_counter() - t0, "fila": fila}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        en_vuelo: Dict = {}
+
+        def lanzar_listas() -> None:
+            for t in sorted(t for t, deps in pendientes.items() if not deps):
+                del pendientes[t]
+                en_vuelo[pool.submit(correr, t, datetime.now(), time.perf_counter() - t0)] = t
+
+        lanzar_listas()
+        while en_vuelo:
+            hechos, _ = wait(en_vuelo, return_when=FIRST_COMPLETED)
+            for futuro in hechos:
+                tarea = en_vuelo.pop(futuro)
+                resultados[tarea] = futuro.result()
+                if resultados[tarea]["estado"] == "OK":
+                    for deps in pendientes.values():
+                        deps.discard(tarea)
+                    continue
+                ahora_s = time.perf_counter() - t0
+                for d in descendientes(dag, tarea):
+                    if d in pendientes:
+                        del pendientes[d]
+                        resultados[d] = {"estado": "OMITIDA", "listo_s": None, "inicio_s": ahora_s,
+                                         "fin_s": ahora_s, "fila": None}
+                        print(f"⏭️  [{d}] omitida: falló {tarea}")
+            lanzar_listas()
+    return resultados
+
+
+def ruta_critica(dag: Dict[str, Dict], resultados: Dict[str, Dict]) -> List[str]:
+    """Desde la tarea que terminó última, retrocede por la dependencia que la liberó (la que terminó última)."""
+    corridas = {t: r for t, r in resultados.items() if r["estado"] != "OMITIDA"}
+    if not corridas:
+        return []
+    ruta = [max(corridas, key=lambda t: corridas[t]["fin_s"])]
+    while True:
+        deps = [d for d in dag[ruta[-1]].get('depende_de', []) if d in corridas]
+        if not deps:
+            break
+        ruta.append(max(deps, key=lambda d: corridas[d]["fin_s"]))
+    return ruta[::-1]
+
+
+def imprimir_resumen(dag: Dict[str, Dict], resultados: Dict[str, Dict]) -> float:
+    """Imprime la línea de tiempo, la ruta crítica y el makespan; retorna el makespan en segundos."""
+    makespan = max((r["fin_s"] for r in resultados.values()), default=0.0)
+    print("\n⏱️  Línea de tiempo del DAG:")
+    for t, r in sorted(resultados.items(), key=lambda x: x[1]["inicio_s"]):
+        espera = "" if r["listo_s"] is None else f"espera {r['inicio_s'] - r['listo_s']:6.1f}s  "
+        print(f"   {t:<26} {r['estado']:<8} {espera}inicio {r['inicio_s']:7.1f}s  fin {r['fin_s']:7.1f}s  "
+              f"({r['fin_s'] - r['inicio_s']:.1f}s)")
+    ruta = ruta_critica(dag, resultados)
+    if ruta:
+        tramos = " → ".join(f"{t} ({resultados[t]['fin_s'] - resultados[t]['inicio_s']:.1f}s)" for t in ruta)
+        print(f"🛤️  Ruta crítica: {tramos}")
+    serie = sum(r["fin_s"] - r["inicio_s"] for r in resultados.values())
+    print(f"   Makespan {makespan:.1f}s (suma de tareas en serie: {serie:.1f}s)")
+    return makespan
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 4) PUNTO DE ENTRADA
+# ═════════════════════════════════════════════════════════════════════════════
+
+@perfilado.perfilar("orquestador")
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Ejecuta el ETL y los chequeos según sus dependencias")
+    parser.add_argument("--workers", type=int, default=WORKERS_DAG)
+    parser.add_argument("--plan", action="store_true", help="Muestra el orden por niveles y termina")
+    args = parser.parse_args(argv)
+
+    if args.plan:
+        for i, nivel in enumerate(niveles(DAG), 1):
+            print(f"   Nivel {i}: {', '.join(nivel)}")
+        return 0
+
+    print(f"🚀 Ejecutando DAG de {len(DAG)} tareas con {args.workers} workers...")
+    try:
+        resultados = ejecutar_dag(workers=args.workers)
+    finally:
+        cerrar_workers()
+    imprimir_resumen(DAG, resultados)
+    return 0 if all(r["estado"] == "OK" for r in resultados.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
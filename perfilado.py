@@ -0,0 +1,239 @@
+# El objetivo de este módulo es perfilar una corrida sin copiar ni tocar el script: con PERFILAR=1 (o
+# `python automatizaciones.py --perfilar <comando>`) cada main() decorado con @perfilar y cada bloque
+# `with etapa("...")` registra tiempo de pared y de CPU, memoria (peak y neta) con los mayores
+# asignadores según tracemalloc, y estadísticas de cProfile. Al terminar el main se escribe en
+# PERFILAR_DIR/<script>_<fecha>_<pid>/ un .pstats por etapa (sin sus sub-etapas), total.pstats con la
+# suma y resumen.json. Desactivado, @perfilar y etapa() sólo consultan una variable: no importan
+# cProfile ni tracemalloc y no agregan costo medible.
+# Uso:  PERFILAR=1 python Validador_tarifas.py
+#       python -m pstats perfiles/validador_tarifas_20250101_060000_1234/total.pstats
+# -*- coding: utf-8 -*-
+# ═════════════════════════════════════════════════════════════════════════════
+# 1) IMPORTS Y CONFIGURACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+import os
+import re
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional
+
+# Carpeta donde se guardan los perfiles (una subcarpeta por corrida)
+DIRECTORIO = os.getenv("PERFILAR_DIR", "perfiles")
+
+# Líneas con más memoria asignada a informar por etapa, y funciones (tiempo propio) en el resumen
+TOP_ASIGNADORES = 10
+TOP_FUNCIONES = 20
+
+MB = 1024 ** 2
+
+# Corrida en curso (sólo una por proceso: el main perfilado más externo)
+_corrida: Optional[Dict] = None
+
+
+def activo() -> bool:
+    """El perfilado se activa con PERFILAR=1; se lee en cada main (los workers heredan el entorno)."""
+    return os.getenv("PERFILAR", "") not in ("", "0")
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2) ETAPAS
+# ═════════════════════════════════════════════════════════════════════════════
+
+@contextmanager
+def etapa(nombre: str) -> Iterator[None]:
+    """Mide el bloque como una etapa de la corrida perfilada; sin corrida activa no hace nada.
+
+    En el hilo del main se mide todo; en otros hilos (consultas en paralelo) sólo pared y CPU del hilo,
+    porque cProfile y los snapshots de tracemalloc son del proceso completo.
+    """
+    corrida = _corrida
+    if corrida is None:
+        yield
+        return
+    if threading.get_ident() != corrida["hilo"]:
+        t0, cpu0 = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            corrida["etapas"].append({
+                "etapa": nombre, "hilo": threading.current_thread().name,
+                "pared_s": time.perf_counter() - t0, "cpu_s": time.thread_time() - cpu0,
+            })
+        return
+    _abrir(corrida, nombre)
+    try:
+        yield
+    finally:
+        _cerrar(corrida)
+
+
+def _abrir(corrida: Dict, nombre: str) -> None:
+    import cProfile
+    import tracemalloc
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    pila = corrida["pila"]
+    if pila:
+        # El perfil de la etapa padre se pausa: cada .pstats queda con el costo propio de su etapa
+        _pausar(pila[-1])
+    n = corrida["conteo"][nombre] = corrida["conteo"].get(nombre, 0) + 1
+    marco = {
+        "etiqueta": nombre if n == 1 else f"{nombre}#{n}",
+        "snapshot": _snapshot(),
+        "mem0": tracemalloc.get_traced_memory()[0],
+        "peak": 0,
+        "perfil": cProfile.Profile(),
+        "sobrecosto": [0.0, 0.0],
+    }
+    _descontar(pila, t0, cpu0)
+    pila.append(marco)
+    tracemalloc.reset_peak()
+    marco["t0"], marco["cpu0"] = time.perf_counter(), time.process_time()
+    _reanudar(marco)
+
+
+def _cerrar(corrida: Dict) -> None:
+    import tracemalloc
+    pila = corrida["pila"]
+    marco = pila.pop()
+    _pausar(marco)
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    pared = t0 - marco["t0"] - marco["sobrecosto"][0]
+    cpu = cpu0 - marco["cpu0"] - marco["sobrecosto"][1]
+    actual, peak = tracemalloc.get_traced_memory()
+    peak = max(peak, marco["peak"])
+    diferencias = _snapshot().compare_to(marco["snapshot"], "lineno")[:TOP_ASIGNADORES]
+    corrida["etapas"].append({
+        "etapa": marco["etiqueta"], "padre": pila[-1]["etiqueta"] if pila else None,
+        "pared_s": pared, "cpu_s": cpu,
+        "peak_mb": peak / MB, "neta_mb": (actual - marco["mem0"]) / MB,
+        "asignadores": [{"linea": str(d.traceback[0]), "kb": d.size_diff / 1024, "bloques": d.count_diff}
+                        for d in diferencias if d.size_diff > 0],
+    })
+    if marco["perfil"] is not None:
+        corrida["perfiles"][marco["etiqueta"]] = marco["perfil"]
+    _descontar(pila, t0, cpu0)
+    if pila:
+        pila[-1]["peak"] = max(pila[-1]["peak"], peak)
+        tracemalloc.reset_peak()
+        _reanudar(pila[-1])
+
+
+def _descontar(pila: List[Dict], t0: float, cpu0: float) -> None:
+    """Los snapshots de tracemalloc de una sub-etapa no se cuentan en el tiempo de las etapas que la contienen."""
+    pared, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+    for marco in pila:
+        marco["sobrecosto"][0] += pared
+        marco["sobrecosto"][1] += cpu
+
+
+def _pausar(marco: Dict) -> None:
+    if marco["perfil"] is not None:
+        marco["perfil"].disable()
+        import tracemalloc
+        marco["peak"] = max(marco["peak"], tracemalloc.get_traced_memory()[1])
+
+
+def _reanudar(marco: Dict) -> None:
+    if marco["perfil"] is None:
+        return
+    try:
+        marco["perfil"].enable()
+    except ValueError:
+        # Otro profiler activo (p. ej. python -m cProfile): se sigue sin cProfile en esta etapa
+        marco["perfil"] = None
+
+
+def _snapshot():
+    import tracemalloc
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 3) CORRIDA Y RESULTADOS
+# ═════════════════════════════════════════════════════════════════════════════
+
+def perfilar(nombre: str) -> Callable:
+    """Decorador para los main(): con PERFILAR=1 perfila la corrida y deja los archivos al terminar.
+
+    Un main perfilado llamado desde otro (p. ej. en el mismo proceso) se registra como una etapa más.
+    """
+    def decorador(fn: Callable) -> Callable:
+        @wraps(fn)
+        def envoltura(*args, **kwargs):
+            if not activo():
+                return fn(*args, **kwargs)
+            if _corrida is not None:
+                with etapa(nombre):
+                    return fn(*args, **kwargs)
+            propio = _iniciar(nombre)
+            try:
+                with etapa("main"):
+                    return fn(*args, **kwargs)
+            finally:
+                _terminar(propio)
+        return envoltura
+    return decorador
+
+
+def _iniciar(nombre: str) -> bool:
+    """Abre la corrida; retorna si tracemalloc se inició aquí (para detenerlo al final)."""
+    global _corrida
+    import tracemalloc
+    propio = not tracemalloc.is_tracing()
+    if propio:
+        tracemalloc.start()
+    _corrida = {"nombre": nombre, "inicio": datetime.now(), "hilo": threading.get_ident(),
+                "pila": [], "conteo": {}, "etapas": [], "perfiles": {}}
+    return propio
+
+
+def _terminar(propio: bool) -> None:
+    global _corrida
+    import tracemalloc
+    corrida, _corrida = _corrida, None
+    try:
+        carpeta = escribir_resultados(corrida)
+        print(f"🔬 Perfil de {corrida['nombre']} en {carpeta} ({len(corrida['etapas'])} etapas)")
+    except Exception as e:
+        # El perfilado nunca debe hacer fallar la corrida
+        print(f"[WARN] No se pudo guardar el perfil de {corrida['nombre']}: {e}")
+    finally:
+        if propio:
+            tracemalloc.stop()
+
+
+def _archivo(etiqueta: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", etiqueta)
+
+
+def escribir_resultados(corrida: Dict, directorio: Optional[str] = None) -> str:
+    """Escribe un .pstats por etapa, total.pstats y resumen.json; retorna la carpeta de la corrida."""
+    import pstats
+    carpeta = os.path.join(directorio or DIRECTORIO,
+                           f"{corrida['nombre']}_{corrida['inicio']:%Y%m%d_%H%M%S}_{os.getpid()}")
+    os.makedirs(carpeta, exist_ok=True)
+
+    total = None
+    for etiqueta, perfil in corrida["perfiles"].items():
+        ruta = os.path.join(carpeta, f"{_archivo(etiqueta)}.pstats")
+        perfil.dump_stats(ruta)
+        total = pstats.Stats(ruta) if total is None else total.add(ruta)
+    funciones: List[Dict] = []
+    if total is not None:
+        total.dump_stats(os.path.join(carpeta, "total.pstats"))
+        mayores = sorted(total.stats.items(), key=lambda x: -x[1][2])[:TOP_FUNCIONES]
+        funciones = [{"funcion": f"{func} ({os.path.basename(archivo)}:{linea})", "llamadas": nc,
+                      "propio_s": tt, "acumulado_s": ct}
+                     for (archivo, linea, func), (_, nc, tt, ct, _) in mayores]
+
+    with open(os.path.join(carpeta, "resumen.json"), "w", encoding="utf-8") as fh:
+        json.dump({"script": corrida["nombre"], "inicio": corrida["inicio"].isoformat(timespec="seconds"),
+                   "pid": os.getpid(), "argv": sys.argv, "etapas": corrida["etapas"],
+                   "funciones": funciones}, fh, ensure_ascii=False, indent=2)
+    return carpeta
@@ -0,0 +1,188 @@
+# El objetivo de este módulo es dejar registro de qué hizo el planner con las consultas pesadas
+# (Validador_tarifas, Alerta_descuadratura, ETL_Sencillo) para poder explicar cuando se ponen lentas
+# sin cambios de código. Antes de ejecutar cada consulta registrada corre EXPLAIN, guarda el plan,
+# su costo estimado, el tiempo real y las filas devueltas, y avisa si el costo o el tiempo saltan
+# respecto del historial. Es opcional: se activa con la variable de entorno PLAN_CAPTURE=1.
+# Funciona igual contra Redshift que contra un PostgreSQL local (EXPLAIN en formato texto).
+# -*- coding: utf-8 -*-
+# ═════════════════════════════════════════════════════════════════════════════
+# 1) IMPORTS Y CONFIGURACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+import os
+import re
+import sys
+import time
+import sqlite3
+import hashlib
+import argparse
+import statistics
+import pandas as pd
+from datetime import datetime
+from typing import List, Optional
+import perfilado
+
+# -- Activación y umbrales (variables de entorno para no tocar los scripts)
+PLAN_CAPTURE = os.environ.get("PLAN_CAPTURE", "0") == "1"
+HISTORIAL_PLANES = os.environ.get("PLAN_CAPTURE_DB", "historial_planes.sqlite")
+UMBRAL_COSTO = float(os.environ.get("PLAN_UMBRAL_COSTO", "1.5"))
+UMBRAL_DURACION = float(os.environ.get("PLAN_UMBRAL_DURACION", "1.5"))
+# Corridas previas mínimas para comparar, y cuántas se usan para la mediana
+MIN_HISTORIAL = 3
+VENTANA_HISTORIAL = 20
+
+PATRON_COSTO = re.compile(r"cost=([0-9.]+)\.\.([0-9.]+)")
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2) EXPLAIN E HISTORIAL
+# ═════════════════════════════════════════════════════════════════════════════
+
+def explicar(conn, sql: str, params: Optional[dict] = None) -> str:
+    """Retorna el plan de EXPLAIN en texto (una línea por nodo)."""
+    cur = conn.cursor()
+    try:
+        cur.execute("EXPLAIN " + sql, params)
+        return "\n".join(fila[0] for fila in cur.fetchall())
+    finally:
+        cur.close()
+
+
+def costo_plan(plan: str) -> float:
+    """Costo total estimado del nodo raíz (primera línea: cost=inicio..total)."""
+    m = PATRON_COSTO.search(plan)
+    if not m:
+        raise ValueError("No se encontró 'cost=' en el plan")
+    return float(m.group(2))
+
+
+def costo_explain(conn, sql: str, params: Optional[dict] = None) -> float:
+    return costo_plan(explicar(conn, sql, params))
+
+
+def _abrir_historial() -> sqlite3.Connection:
+    db = sqlite3.connect(HISTORIAL_PLANES, timeout=30)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS planes (
+            ts TEXT, nombre TEXT, hash_plan TEXT, costo REAL,
+            duracion_s REAL, filas INTEGER, plan TEXT
+        )
+    """)
+    return db
+
+
+def _historial(db: sqlite3.Connection, nombre: str) -> List[tuple]:
+    return db.execute(
+        "SELECT costo, duracion_s, hash_plan FROM planes WHERE nombre = ? ORDER BY ts DESC LIMIT ?",
+        (nombre, VENTANA_HISTORIAL)
+    ).fetchall()
+
+
+def detectar_regresion(nombre: str, costo: Optional[float], duracion: float, hash_plan: str,
+                       previos: List[tuple]) -> List[str]:
+    """Compara la corrida contra la mediana del historial; retorna los avisos a emitir."""
+    if len(previos) < MIN_HISTORIAL:
+        return []
+    avisos = []
+    costos = [p[0] for p in previos if p[0] is not None]
+    if costo is not None and costos:
+        med = statistics.median(costos)
+        if med > 0 and costo > med * UMBRAL_COSTO:
+            avisos.append(f"costo estimado x{costo / med:.1f} vs mediana ({costo:,.0f} vs {med:,.0f})")
+    med_dur = statistics.median(p[1] for p in previos)
+    if med_dur > 0 and duracion > med_dur * UMBRAL_DURACION:
+        avisos.append(f"duración x{duracion / med_dur:.1f} vs mediana ({duracion:.1f}s vs {med_dur:.1f}s)")
+    if avisos and hash_plan != previos[0][2]:
+        avisos.append("el plan cambió respecto de la corrida anterior")
+    return [f"[WARN] Regresión en '{nombre}': {a}" for a in avisos]
+
+
+def registrar_corrida(nombre: str, plan: str, costo: Optional[float], duracion: float, filas: int) -> List[str]:
+    """Guarda la corrida en el historial y retorna los avisos de regresión."""
+    # El hash ignora las estimaciones (cost/rows/width) para que sólo cambie si cambia la forma del plan
+    hash_plan = hashlib.sha1(re.sub(r"\(cost=[^)]*\)", "", plan).encode("utf-8")).hexdigest()[:12]
+    db = _abrir_historial()
+    try:
+        avisos = detectar_regresion(nombre, costo, duracion, hash_plan, _historial(db, nombre))
+        db.execute(
+            "INSERT INTO planes VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (datetime.now().isoformat(timespec="seconds"), nombre, hash_plan, costo, duracion, filas, plan)
+        )
+        db.commit()
+    finally:
+        db.close()
+    return avisos
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 3) EJECUCIÓN INSTRUMENTADA
+# ═════════════════════════════════════════════════════════════════════════════
+
+def ejecutar_consulta(conn, nombre: Optional[str], sql: str, params: Optional[dict] = None) -> pd.DataFrame:
+    """Ejecuta `sql` y la retorna como DataFrame.
+
+    Si PLAN_CAPTURE está activo y la consulta tiene `nombre`, antes corre EXPLAIN y después
+    registra plan, costo, duración y filas. Desactivado equivale a `pd.read_sql`.
+    """
+    if not (PLAN_CAPTURE and nombre):
+        return pd.read_sql(sql, conn, params=params)
+
+    plan = explicar(conn, sql, params)
+    try:
+        costo = costo_plan(plan)
+    except ValueError:
+        costo = None
+    t0 = time.perf_counter()
+    df = pd.read_sql(sql, conn, params=params)
+    duracion = time.perf_counter() - t0
+
+    for aviso in registrar_corrida(nombre, plan, costo, duracion, len(df)):
+        print(aviso)
+    costo_txt = f"{costo:,.0f}" if costo is not None else "N/D"
+    print(f"📐 {nombre}: costo {costo_txt} | {duracion:.2f}s | {len(df)} filas")
+    return df
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 4) CLI: HISTORIAL Y PRUEBA LOCAL
+# ═════════════════════════════════════════════════════════════════════════════
+
+@perfilado.perfilar("plan_consultas")
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Historial de planes de consultas")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_hist = sub.add_parser("historial", help="Muestra las últimas corridas registradas")
+    p_hist.add_argument("nombre", nargs="?", help="Filtra por nombre de consulta")
+    p_hist.add_argument("--plan", action="store_true", help="Incluye el texto del plan")
+    p_prob = sub.add_parser("probar", help="Ejecuta una consulta instrumentada (p. ej. contra PostgreSQL local)")
+    p_prob.add_argument("--dsn", required=True, help="DSN psycopg2, p. ej. 'dbname=postgres host=localhost'")
+    p_prob.add_argument("--nombre", default="prueba")
+    p_prob.add_argument("sql")
+    args = parser.parse_args()
+
+    if args.comando == "probar":
+        import psycopg2
+        global PLAN_CAPTURE
+        PLAN_CAPTURE = True
+        conn = psycopg2.connect(args.dsn)
+        try:
+            print(ejecutar_consulta(conn, args.nombre, args.sql).head())
+        finally:
+            conn.close()
+        return 0
+
+    db = _abrir_historial()
+    try:
+        sql = "SELECT ts, nombre, hash_plan, costo, duracion_s, filas, plan FROM planes"
+        params: tuple = ()
+        if args.nombre:
+            sql += " WHERE nombre = ?"
+            params = (args.nombre,)
+        filas = db.execute(sql + " ORDER BY ts DESC LIMIT 50", params).fetchall()
+    finally:
+        db.close()
+    for ts, nombre, hash_plan, costo, dur, n, plan in filas:
+        print(f"{ts}  {nombre:<35} plan={hash_plan} costo={costo or 0:,.0f} {dur:.2f}s {n} filas")
+        if args.plan:
+            print(plan + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
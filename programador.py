@@ -0,0 +1,370 @@
+# El objetivo de este script es reemplazar las invocaciones sueltas de cron por un proceso programador
+# de larga duración: cada tarea (ETL, alertas, validador) corre según su expresión cron dentro de un
+# proceso worker propio que sigue vivo entre corridas, así los imports (pandas, numpy, boto3, psycopg2),
+# el cliente S3, los pools de acceso_datos.py y las cachés en memoria quedan calientes.
+# Cada corrida tiene un tiempo máximo: si lo excede, el worker se termina y se levanta uno nuevo en la
+# siguiente. Por corrida se registra el retraso en cola (desde la hora programada hasta que parte) y la
+# duración, en SQLite local y en consola.
+# Los cambios de código de las tareas se toman al reiniciar el programador.
+# Uso: python programador.py [--listar] [--ahora TAREA ...]
+# -*- coding: utf-8 -*-
+# ═════════════════════════════════════════════════════════════════════════════
+# 1) IMPORTS Y CONFIGURACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+import os
+import sys
+import time
+import signal
+import sqlite3
+import argparse
+import importlib
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set
+import metricas
+
+# -- Tareas: 'funcion' es "modulo:funcion" (retorna 0/None si terminó bien), con 'args'/'kwargs'
+#    opcionales; 'cron' usa los 5 campos clásicos (minuto hora día mes día_semana, 0 = domingo).
+TAREAS: Dict[str, Dict] = {
+    # ETL y chequeos que dependen de él, encadenados por dependencias (ver orquestador.py)
+    'cadena_etl': {
+        'funcion': 'orquestador:main', 'args': [[]], 'cron': '0 6 * * *', 'timeout_s': 3 * 3600,
+    },
+    # Descuadratura compara contra la tabla que carga el ETL: corre sólo dentro de cadena_etl
+    'alertas': {
+        'funcion': 'ejecutar_alertas:main', 'args': [['--excluir', 'descuadratura']], 'cron': '15 * * * *',
+        'timeout_s': 1800,
+    },
+    'tarifas': {
+        'funcion': 'Validador_tarifas:main', 'cron': '0 8 * * 1-5', 'timeout_s': 3600,
+    },
+    'tarifas_incremental': {
+        'funcion': 'Validador_tarifas:main', 'kwargs': {'incremental': True}, 'cron': '30 9-19 * * 1-5',
+        'timeout_s': 900,
+    },
+}
+
+# Tareas simultáneas (cada una en su propio worker)
+WORKERS_PROGRAMADOR = 3
+
+# Librerías que el servidor de forks importa una sola vez: cada worker nace con ellas ya cargadas
+PRECARGAR = ["pandas", "numpy", "psycopg2"]
+
+PROGRAMADOR_DB = os.environ.get("PROGRAMADOR_DB", "programador.sqlite")
+
+_workers: Dict[str, dict] = {}
+_hooks: List[Callable] = []
+_detener = threading.Event()
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2) EXPRESIONES CRON
+# ═════════════════════════════════════════════════════════════════════════════
+
+LIMITES_CRON = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def _campo_cron(texto: str, minimo: int, maximo: int) -> Set[int]:
+    valores: Set[int] = set()
+    for parte in texto.split(","):
+        paso = 1
+        if "/" in parte:
+            parte, paso_txt = parte.split("/")
+            paso = int(paso_txt)
+        if parte == "*":
+            ini, fin = minimo, maximo
+        elif "-" in parte:
+            ini, fin = (int(x) for x in parte.split("-"))
+        else:
+            ini = int(parte)
+            fin = maximo if paso > 1 else ini
+        if not (minimo <= ini <= fin <= maximo) or paso < 1:
+            raise ValueError(f"Campo cron fuera de rango: '{texto}'")
+        valores.update(range(ini, fin + 1, paso))
+    return valores
+
+
+def parsear_cron(expr: str) -> Dict:
+    """Convierte 'm h dom mes dow' en conjuntos de valores permitidos por campo."""
+    campos = expr.split()
+    if len(campos) != 5:
+        raise ValueError(f"Expresión cron inválida (se esperan 5 campos): '{expr}'")
+    minutos, horas, dias, meses, dias_semana = (
+        _campo_cron(c, lo, hi) for c, (lo, hi) in zip(campos, LIMITES_CRON)
+    )
+    return {
+        "minutos": minutos, "horas": horas, "dias": dias, "meses": meses,
+        "dias_semana": {d % 7 for d in dias_semana},
+        # Como en cron: si día del mes y día de semana están restringidos, basta con cumplir uno
+        "dia_o_semana": campos[2] != "*" and campos[4] != "*",
+    }
+
+
+def _dia_valido(cron: Dict, t: datetime) -> bool:
+    en_dia = t.day in cron["dias"]
+    en_semana = (t.weekday() + 1) % 7 in cron["dias_semana"]
+    return (en_dia or en_semana) if cron["dia_o_semana"] else (en_dia and en_semana)
+
+
+def proxima_ejecucion(cron: Dict, desde: datetime) -> datetime:
+    """Primer minuto estrictamente posterior a `desde` que cumple la expresión."""
+    t = desde.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    limite = t + timedelta(days=366 * 4)
+    while t < limite:
+        if t.month not in cron["meses"]:
+            t = (t.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+        elif not _dia_valido(cron, t):
+            t = (t + timedelta(days=1)).replace(hour=0, minute=0)
+        elif t.hour not in cron["horas"]:
+            t = (t + timedelta(hours=1)).replace(minute=0)
+        elif t.minute not in cron["minutos"]:
+            t += timedelta(minutes=1)
+        else:
+            return t
+    raise ValueError("La expresión cron no tiene ejecuciones en los próximos 4 años")
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 3) WORKERS CALIENTES
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _resolver(funcion: str) -> Callable:
+    modulo, nombre = funcion.split(":")
+    return getattr(importlib.import_module(modulo), nombre)
+
+
+def _bucle_worker(canal) -> None:
+    """Proceso worker: recibe (funcion, args, kwargs), la ejecuta y responde (estado, error)."""
+    # El programador maneja Ctrl+C; SIGTERM (timeout) debe terminar el worker aunque se haya heredado el handler
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Si el worker hereda estado del padre (fork), sus workers pertenecen al programador: una tarea que
+    # usa ejecutar_tarea (p. ej. orquestador.py) crea los suyos; las métricas sin escribir tampoco son del worker
+    _workers.clear()
+    metricas.reiniciar()
+    tarea = multiprocessing.current_process().name.replace("tarea-", "", 1)
+    while True:
+        try:
+            pedido = canal.recv()
+        except EOFError:
+            break
+        if pedido is None:
+            break
+        funcion, args, kwargs = pedido
+        try:
+            rc = _resolver(funcion)(*args, **kwargs)
+            estado, error = ("OK", None) if not rc else ("ERROR", f"código de salida {rc}")
+        except SystemExit as e:
+            estado, error = ("OK", None) if not e.code else ("ERROR", f"código de salida {e.code}")
+        except Exception as e:
+            estado, error = "ERROR", repr(e)
+        finally:
+            # Los correos encolados deben salir dentro de la corrida, no al cerrar el worker
+            if "envio_correos" in sys.modules:
+                sys.modules["envio_correos"].esperar_envios()
+            # El worker no termina entre corridas: las métricas de consultas y correos se escriben aquí
+            metricas.escribir(tarea)
+            sys.stdout.flush()
+        canal.send((estado, error))
+
+
+def _contexto():
+    # Los workers se crean desde los hilos del programador: un fork directo de un proceso con hilos puede
+    # heredar locks tomados (logging, imports, malloc) y dejar al hijo colgado. Con forkserver se bifurcan
+    # desde un proceso servidor de un solo hilo que ya importó PRECARGAR; donde no existe (Windows), spawn.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(PRECARGAR)
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+def _worker(tarea: str) -> dict:
+    w = _workers.get(tarea)
+    if w is None or not w["proceso"].is_alive():
+        padre, hijo = _contexto().Pipe()
+        proceso = _contexto().Process(target=_bucle_worker, args=(hijo,), name=f"tarea-{tarea}")
+        proceso.start()
+        hijo.close()
+        w = _workers[tarea] = {"proceso": proceso, "canal": padre, "corridas": 0}
+    return w
+
+
+def _descartar_worker(tarea: str) -> None:
+    w = _workers.pop(tarea, None)
+    if w is None:
+        return
+    w["proceso"].terminate()
+    w["proceso"].join(5)
+    if w["proceso"].is_alive():
+        w["proceso"].kill()
+        w["proceso"].join()
+    w["canal"].close()
+
+
+def cerrar_workers() -> None:
+    for tarea, w in list(_workers.items()):
+        try:
+            w["canal"].send(None)
+            w["proceso"].join(10)
+        except (OSError, EOFError):
+            pass
+        _descartar_worker(tarea)
+
+
+def precargar(modulos: List[str] = PRECARGAR) -> None:
+    """Importa PRECARGAR en el programador para avisar si falta alguna (el servidor de forks las omite sin aviso)."""
+    for nombre in modulos:
+        try:
+            importlib.import_module(nombre)
+        except ImportError as e:
+            print(f"[WARN] No se pudo precargar {nombre}: {e}")
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 4) EJECUCIÓN Y REGISTRO
+# ═════════════════════════════════════════════════════════════════════════════
+
+def registrar_hook(fn: Callable) -> None:
+    """Registra `fn(tarea, retraso_s, duracion_s, estado)`; se llama al terminar cada corrida."""
+    _hooks.append(fn)
+
+
+# Duración, retraso y estado de cada corrida para Prometheus (ver metricas.py)
+registrar_hook(metricas.al_terminar_tarea)
+
+
+def _registrar(fila: Dict) -> None:
+    db = sqlite3.connect(PROGRAMADOR_DB, timeout=30)
+    try:
+        with db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS corridas (
+                    tarea TEXT, programado TEXT, inicio TEXT, retraso_s REAL, duracion_s REAL,
+                    estado TEXT, error TEXT, worker_nuevo INTEGER
+                )
+            """)
+            db.execute("INSERT INTO corridas VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (
+                fila["tarea"], fila["programado"], fila["inicio"], fila["retraso_s"], fila["duracion_s"],
+                fila["estado"], fila["error"], int(fila["worker_nuevo"]),
+            ))
+    finally:
+        db.close()
+    for fn in _hooks:
+        try:
+            fn(fila["tarea"], fila["retraso_s"], fila["duracion_s"], fila["estado"])
+        except Exception as e:
+            print(f"[WARN] Hook del programador falló: {e}")
+
+
+def ejecutar_tarea(tarea: str, programado: Optional[datetime] = None, tareas: Dict[str, Dict] = TAREAS) -> Dict:
+    """Corre la tarea en su worker (creándolo si no existe) respetando su timeout.
+
+    Retorna la fila registrada: tarea, programado, inicio, retraso_s, duracion_s, estado, error.
+    """
+    cfg = tareas[tarea]
+    inicio = datetime.now()
+    programado = programado or inicio
+    nuevo = tarea not in _workers or not _workers[tarea]["proceso"].is_alive()
+    w = _worker(tarea)
+    retraso = max(0.0, (inicio - programado).total_seconds())
+    print(f"▶️  [{tarea}] inicio (retraso en cola {retraso:.1f}s{', worker nuevo' if nuevo else ''})")
+
+    t0 = time.perf_counter()
+    estado, error = "ERROR", None
+    try:
+        w["canal"].send((cfg["funcion"], cfg.get("args", []), cfg.get("kwargs", {})))
+        if w["canal"].poll(cfg.get("timeout_s")):
+            estado, error = w["canal"].recv()
+            w["corridas"] += 1
+        else:
+            estado, error = "TIMEOUT", f"superó {cfg.get('timeout_s')}s"
+            _descartar_worker(tarea)
+    except (EOFError, OSError) as e:
+        error = f"el worker terminó inesperadamente ({e!r})"
+        _descartar_worker(tarea)
+    duracion = time.perf_counter() - t0
+
+    fila = {
+        "tarea": tarea, "programado": programado.isoformat(timespec="seconds"),
+        "inicio": inicio.isoformat(timespec="seconds"), "retraso_s": retraso, "duracion_s": duracion,
+        "estado": estado, "error": error, "worker_nuevo": nuevo,
+    }
+    _registrar(fila)
+    icono = "✅" if estado == "OK" else "❌"
+    print(f"{icono} [{tarea}] {estado} en {duracion:.1f}s" + (f": {error}" if error else ""))
+    return fila
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 5) BUCLE DEL PROGRAMADOR
+# ═════════════════════════════════════════════════════════════════════════════
+
+def servir(tareas: Dict[str, Dict] = TAREAS, workers: int = WORKERS_PROGRAMADOR) -> None:
+    """Lanza cada tarea cuando le toca; si la corrida anterior sigue en curso, se omite esa ejecución."""
+    crons = {t: parsear_cron(cfg["cron"]) for t, cfg in tareas.items()}
+    ahora = datetime.now()
+    proximas = {t: proxima_ejecucion(c, ahora) for t, c in crons.items()}
+    en_curso: Dict[str, object] = {}
+    print(f"🕒 Programador iniciado con {len(tareas)} tareas y {workers} workers (PID {os.getpid()})")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while not _detener.is_set():
+            ahora = datetime.now()
+            for tarea, cuando in proximas.items():
+                if cuando > ahora:
+                    continue
+                anterior = en_curso.get(tarea)
+                if anterior is not None and not anterior.done():
+                    print(f"[WARN] [{tarea}] La corrida anterior sigue en curso; se omite la de {cuando:%H:%M}")
+                else:
+                    en_curso[tarea] = pool.submit(ejecutar_tarea, tarea, cuando, tareas)
+                proximas[tarea] = proxima_ejecucion(crons[tarea], ahora)
+            espera = (min(proximas.values()) - datetime.now()).total_seconds()
+            _detener.wait(min(max(espera, 0.5), 30))
+        print("🛑 Deteniendo: esperando las corridas en curso...")
+    cerrar_workers()
+
+
+def _al_recibir_senal(signum, frame) -> None:
+    _detener.set()
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 6) PUNTO DE ENTRADA
+# ═════════════════════════════════════════════════════════════════════════════
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Programador de tareas con workers calientes")
+    parser.add_argument("--listar", action="store_true", help="Muestra las próximas ejecuciones y termina")
+    parser.add_argument("--ahora", nargs="+", metavar="TAREA", help="Corre las tareas indicadas una vez y termina")
+    parser.add_argument("--workers", type=int, default=WORKERS_PROGRAMADOR)
+    args = parser.parse_args(argv)
+
+    if args.listar:
+        ahora = datetime.now()
+        for tarea, cfg in TAREAS.items():
+            cron, t, proximas = parsear_cron(cfg["cron"]), ahora, []
+            for _ in range(3):
+                t = proxima_ejecucion(cron, t)
+                proximas.append(f"{t:%Y-%m-%d %H:%M}")
+            print(f"   {tarea:<22} {cfg['cron']:<18} {' | '.join(proximas)}")
+        return 0
+
+    precargar()
+    if args.ahora:
+        desconocidas = [t for t in args.ahora if t not in TAREAS]
+        if desconocidas:
+            print(f"❌ Tareas desconocidas: {', '.join(desconocidas)}")
+            return 2
+        try:
+            filas = [ejecutar_tarea(t) for t in args.ahora]
+        finally:
+            cerrar_workers()
+        return 0 if all(f["estado"] == "OK" for f in filas) else 1
+
+    signal.signal(signal.SIGTERM, _al_recibir_senal)
+    signal.signal(signal.SIGINT, _al_recibir_senal)
+    servir(workers=args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# El objetivo de este módulo es armar las tablas HTML de los correos de todos los scripts con una sola
+# función: el formato se aplica por columna (operaciones vectorizadas de pandas sobre strings) y el
+# HTML final se une una sola vez, en vez de recorrer el DataFrame fila a fila con iterrows().
+# Soporta filas alternadas (cebra), formato de miles ("1.234.567") y tope de filas con pie
+# "N filas más en el adjunto".
+# -*- coding: utf-8 -*-
+# ═════════════════════════════════════════════════════════════════════════════
+# 1) IMPORTS Y ESTILOS
+# ═════════════════════════════════════════════════════════════════════════════
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, Optional, Union
+
+# Estilo de las alertas (encabezado azul, celdas con borde)
+ESTILO_ALERTA: Dict[str, str] = {
+    "tabla": "border-collapse:collapse; width:100%; font-family:Arial,sans-serif;",
+    "th":    "background:#002B49; color:#fff; padding:8px; border:1px solid #ddd; text-align:left;",
+    "td":    "padding:8px; border:1px solid #ddd; text-align:left;",
+    "par":   "#f9f9f9",
+    "impar": "#ffffff",
+}
+
+# Estilo del reporte de tarifas (encabezado gris claro)
+ESTILO_REPORTE: Dict[str, str] = {
+    "tabla": "border-collapse:collapse;border:1px solid #cccccc;",
+    "th":    "border:1px solid #cccccc;padding:6px 8px;background:#f6f8fa;text-align:center;",
+    "td":    "border:1px solid #cccccc;padding:6px 8px;",
+    "par":   "#ffffff",
+    "impar": "#fbfbfb",
+}
+
+PIE_DESBORDE = "{n:,} filas más en el adjunto"
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2) FORMATO POR COLUMNA
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _escapar(s: pd.Series) -> pd.Series:
+    return (s.str.replace("&", "&amp;", regex=False)
+             .str.replace("<", "&lt;", regex=False)
+             .str.replace(">", "&gt;", regex=False))
+
+
+def formato_miles(s: pd.Series) -> pd.Series:
+    """Entero redondeado con punto como separador de miles, para toda la columna de una vez.
+
+    Los valores no numéricos se dejan como texto.
+    """
+    num = pd.to_numeric(s, errors="coerce")
+    es_num = num.notna() & np.isfinite(num)
+    enteros = num[es_num].round().astype("int64")
+    con_miles = pd.Series(list(map("{:,}".format, enteros.tolist())), index=enteros.index, dtype=object)
+    con_miles = con_miles.str.replace(",", ".", regex=False)
+    return s.astype(object).where(~es_num, con_miles).astype(str)
+
+
+def _texto_columna(s: pd.Series, miles: bool, na_rep: str, escapar: bool) -> pd.Series:
+    nulos = s.isna()
+    if miles:
+        texto = formato_miles(s)
+    else:
+        texto = s.astype(str)
+    if escapar:
+        texto = _escapar(texto)
+    return texto.where(~nulos, na_rep)
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 3) RENDER
+# ═════════════════════════════════════════════════════════════════════════════
+
+def tabla_html(
+    df: pd.DataFrame,
+    estilo: Dict[str, str] = ESTILO_ALERTA,
+    miles: Union[bool, Iterable[str]] = False,
+    max_filas: Optional[int] = None,
+    pie_desborde: str = PIE_DESBORDE,
+    cebra: bool = True,
+    na_rep: str = "",
+    escapar: bool = True,
+) -> str:
+    """Retorna `df` como tabla HTML con estilos en línea (aptos para clientes de correo).
+
+    `miles=True` aplica formato de miles a todas las columnas numéricas; también acepta
+    la lista de columnas. Con `max_filas` se muestran las primeras filas y un pie con las restantes.
+    """
+    total = len(df)
+    vista = df.iloc[:max_filas] if max_filas is not None else df
+    if miles is True:
+        cols_miles = {c for c in df.columns
+                      if pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])}
+    else:
+        cols_miles = set(miles or ())
+
+    th = f'<th style="{estilo["th"]}">'
+    encabezado = "".join(f"{th}{c}</th>" for c in df.columns)
+
+    td = f'<td style="{estilo["td"]}">'
+    cuerpo = pd.Series("", index=vista.index, dtype=object)
+    for c in vista.columns:
+        cuerpo = cuerpo + td + _texto_columna(vista[c], c in cols_miles, na_rep, escapar) + "</td>"
+
+    if cebra:
+        fondos = np.where(np.arange(len(vista)) % 2 == 0, estilo["par"], estilo["impar"])
+        aperturas = '<tr style="background:' + pd.Series(fondos, index=vista.index, dtype=object) + '">'
+    else:
+        aperturas = "<tr>"
+    filas = (aperturas + cuerpo + "</tr>").tolist()
+
+    pie = ""
+    if total > len(vista):
+        texto_pie = pie_desborde.format(n=total - len(vista)).replace(",", ".")
+        pie = (f'<tr><td colspan="{len(df.columns)}" style="{estilo["td"]}font-style:italic;">'
+               f"{texto_pie}</td></tr>")
+
+    return "".join([
+        f'<table style="{estilo["tabla"]}"><thead><tr>', encabezado, "</tr></thead><tbody>",
+        *filas, pie, "</tbody></table>",
+    ])
@@ -0,0 +1,5 @@
+# Los scripts viven en la raíz del repositorio (no es un paquete instalable)
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
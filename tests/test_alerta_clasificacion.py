@@ -0,0 +1,68 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import Alerta_x_comercios_mal_clasificado as clasificacion
+from Alerta_x_comercios_mal_clasificado import COLUMNAS_SEGMENTACION, evaluar_reglas, huellas_por_comercio
+from estado_alertas import huellas
+
+REGLAS = {"principal": {"comercios": [], "esperado": {"clasificacion_final": "OK"}}}
+CLAVES = ["lista", "rut_comercio"] + COLUMNAS_SEGMENTACION
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(clasificacion, "CACHE_SEGMENTACION", str(tmp_path / "seg.sqlite"))
+
+
+def _seg(*filas):
+    return pd.DataFrame(list(filas), columns=["rut_comercio"] + COLUMNAS_SEGMENTACION + ["huella"])
+
+
+def test_varias_filas_por_comercio_se_guardan_y_reemplazan(cache):
+    clasificacion.guardar_cambios(_seg(("1", "A", "0", "S", "G", "h1"), ("1", "B", "0", "S", "G", "h2"),
+                                       ("2", "OK", "0", "S", "G", "h3")))
+    assert len(clasificacion.leer_cache()) == 3
+    clasificacion.guardar_cambios(_seg(("1", "A", "0", "S", "G", "h1")))
+    assert sorted(clasificacion.leer_cache()["huella"]) == ["h1", "h3"]
+
+
+def test_huella_por_comercio_igual_a_la_del_servidor():
+    por_comercio = huellas_por_comercio(_seg(("1", "B", "", "", "", "h2"), ("1", "A", "", "", "", "h1")))
+    assert por_comercio.to_dict("records") == [
+        {"rut_comercio": "1", "huella": hashlib.md5(b"h1,h2").hexdigest()}]
+
+
+def test_informa_cada_fila_distinta_mal_clasificada():
+    listas = pd.DataFrame({"rut_comercio": ["1"], "lista": ["principal"]})
+    seg = _seg(("1", "A", "0", "S", "G", "h1"), ("1", "B", "0", "S", "G", "h2"), ("1", "OK", "0", "S", "G", "h3"))
+    assert list(evaluar_reglas(listas, seg, REGLAS)["clasificacion_final"]) == ["A", "B"]
+
+
+def test_nulos_dan_la_misma_huella_desde_redshift_o_desde_la_copia_local(cache):
+    listas = pd.DataFrame({"rut_comercio": ["1"], "lista": ["principal"]})
+    fresco = _seg(("1", "A", np.nan, "S", "G", "h1"))
+    clasificacion.guardar_cambios(fresco)
+    local = clasificacion.leer_cache()
+    assert local["ceco_final"].iloc[0] is None
+    h_fresco = huellas(evaluar_reglas(listas, fresco, REGLAS), CLAVES)
+    h_local = huellas(evaluar_reglas(listas, local, REGLAS), CLAVES)
+    assert list(h_fresco) == list(h_local)
+
+
+def test_lista_por_tabla_se_lee_una_vez_por_vigencia(cache, monkeypatch):
+    lecturas = []
+
+    def consultar_df(conn, sql, nombre=None, **_):
+        lecturas.append(sql)
+        return pd.DataFrame({"rut_comercio": ["1", "2"]})
+
+    monkeypatch.setattr(clasificacion, "consultar_df", consultar_df)
+    for _ in range(2):
+        assert clasificacion.comercios_de_tabla(None, "principal", "schema_auxiliar.lista_comercios") == ["1", "2"]
+    assert len(lecturas) == 1
+    monkeypatch.setattr(clasificacion, "VIGENCIA_LISTAS_H", -1)
+    clasificacion.comercios_de_tabla(None, "principal", "schema_auxiliar.lista_comercios")
+    assert len(lecturas) == 2
@@ -0,0 +1,48 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import Alerta_descuadratura as descuadratura
+from Alerta_descuadratura import FECHA_INICIO, guardar_agregados, ventanas_a_consultar
+
+VACIO = pd.DataFrame(columns=["lado", "fuente", "periodo", "venta", "trx"])
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(descuadratura, "AGREGADOS_DB", ":memory:")
+    monkeypatch.setattr(descuadratura, "MESES_ABIERTOS", 2)
+    monkeypatch.setattr(descuadratura, "RECHEQUEO_POR_CORRIDA", 1)
+    conn = descuadratura._abrir_agregados()
+    yield conn
+    conn.close()
+
+
+def test_almacen_vacio_trae_todo(db):
+    assert ventanas_a_consultar(db, hoy=date(2025, 6, 15)) == [(FECHA_INICIO, date(2025, 7, 1))]
+
+
+def test_reconstruir_trae_todo(db):
+    guardar_agregados(db, VACIO, FECHA_INICIO, date(2025, 7, 1))
+    assert ventanas_a_consultar(db, hoy=date(2025, 6, 15), reconstruir=True) == [(FECHA_INICIO, date(2025, 7, 1))]
+
+
+def test_corrida_al_dia_trae_meses_abiertos_y_un_rechequeo(db):
+    guardar_agregados(db, VACIO, FECHA_INICIO, date(2025, 6, 1))
+    ventanas = ventanas_a_consultar(db, hoy=date(2025, 6, 15))
+    assert ventanas[0] == (date(2025, 5, 1), date(2025, 7, 1))
+    assert ventanas[1:] == [(date(2025, 1, 1), date(2025, 2, 1))]
+
+
+def test_brecha_de_varios_meses_parte_despues_del_ultimo_guardado(db):
+    # Última corrida en febrero: marzo y abril no quedan fuera de la ventana abierta
+    guardar_agregados(db, VACIO, FECHA_INICIO, date(2025, 3, 1))
+    ventanas = ventanas_a_consultar(db, hoy=date(2025, 6, 15))
+    assert ventanas[0] == (date(2025, 3, 1), date(2025, 7, 1))
+    assert all(desde < date(2025, 3, 1) for desde, _ in ventanas[1:])
+
+
+def test_cambio_de_ano(db):
+    guardar_agregados(db, VACIO, FECHA_INICIO, date(2025, 12, 1))
+    assert ventanas_a_consultar(db, hoy=date(2026, 1, 10))[0] == (date(2025, 12, 1), date(2026, 2, 1))
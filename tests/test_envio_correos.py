@@ -0,0 +1,31 @@
+import smtplib
+import socket
+
+import pytest
+
+from envio_correos import _es_transitorio
+
+
+@pytest.mark.parametrize("error", [
+    smtplib.SMTPServerDisconnected("conexión cerrada"),
+    smtplib.SMTPConnectError(421, b"servicio no disponible"),
+    smtplib.SMTPResponseException(451, b"error local"),
+    smtplib.SMTPDataError(452, b"sin espacio"),
+    socket.timeout("timeout"),
+    TimeoutError(),
+    ConnectionResetError(),
+])
+def test_transitorios_se_reintentan(error):
+    assert _es_transitorio(error)
+
+
+@pytest.mark.parametrize("error", [
+    smtplib.SMTPDataError(550, b"buzon inexistente"),
+    smtplib.SMTPAuthenticationError(535, b"credenciales invalidas"),
+    smtplib.SMTPRecipientsRefused({"a@b.c": (550, b"rechazado")}),
+    smtplib.SMTPSenderRefused(553, b"remitente", "x@y.z"),
+    smtplib.SMTPNotSupportedError(),
+    ValueError("mensaje mal armado"),
+])
+def test_permanentes_fallan_de_inmediato(error):
+    assert not _es_transitorio(error)
@@ -0,0 +1,81 @@
+import pandas as pd
+import pytest
+
+import estado_alertas
+from estado_alertas import filtrar_por_estado, registrar_reportados
+
+ALERTA = {"nombre": "prueba", "estado": {"claves": ["periodo", "fuente"], "ambito": "periodo"}}
+
+
+@pytest.fixture(autouse=True)
+def almacen(tmp_path, monkeypatch):
+    monkeypatch.setattr(estado_alertas, "ESTADO_DB", str(tmp_path / "estado.sqlite"))
+    monkeypatch.setattr(estado_alertas, "USAR_ESTADO", True)
+
+
+def _df(*filas):
+    return pd.DataFrame(list(filas), columns=["periodo", "fuente"])
+
+
+def test_primera_corrida_reporta_todo():
+    df = _df(("2025-01", "A"), ("2025-02", "B"))
+    df_reporte, resumen, novedades = filtrar_por_estado(ALERTA, df)
+    assert novedades
+    assert len(df_reporte) == 2
+    assert (resumen["nuevos_n"], resumen["abiertos_n"], resumen["resueltos_n"]) == (2, 0, 0)
+
+
+def test_filtrar_no_modifica_el_almacen():
+    df = _df(("2025-01", "A"))
+    filtrar_por_estado(ALERTA, df)
+    # Sin registrar (p. ej. el correo falló) la corrida siguiente vuelve a reportarlo
+    _, resumen, novedades = filtrar_por_estado(ALERTA, df)
+    assert novedades
+    assert resumen["nuevos_n"] == 1
+
+
+def test_registrados_siguen_abiertos_sin_novedades():
+    df = _df(("2025-01", "A"), ("2025-02", "B"))
+    registrar_reportados(filtrar_por_estado(ALERTA, df)[1])
+    df_reporte, resumen, novedades = filtrar_por_estado(ALERTA, df)
+    assert not novedades
+    assert df_reporte.empty
+    assert (resumen["nuevos_n"], resumen["abiertos_n"], resumen["resueltos_n"]) == (0, 2, 0)
+
+
+def test_sin_aparecer_en_el_rango_evaluado_se_resuelve():
+    registrar_reportados(filtrar_por_estado(ALERTA, _df(("2025-01", "A"), ("2025-03", "B")))[1])
+    df = _df(("2025-01", "A"))
+    df.attrs["rango_ambito"] = ("2025-02", "2025-04")
+    _, resumen, novedades = filtrar_por_estado(ALERTA, df)
+    assert novedades
+    assert resumen["resueltos_n"] == 1
+    registrar_reportados(resumen)
+    assert estado_alertas.ambito_abierto_mas_antiguo("prueba") == "2025-01"
+
+
+def test_fuera_del_rango_evaluado_no_se_resuelve():
+    registrar_reportados(filtrar_por_estado(ALERTA, _df(("2025-01", "A")))[1])
+    df = _df()
+    df.attrs["rango_ambito"] = ("2025-02", "2025-04")
+    _, resumen, novedades = filtrar_por_estado(ALERTA, df)
+    assert not novedades
+    assert resumen["resueltos_n"] == 0
+
+
+def test_sin_estado_reporta_todo(monkeypatch):
+    monkeypatch.setattr(estado_alertas, "USAR_ESTADO", False)
+    df = _df(("2025-01", "A"))
+    df_reporte, resumen, novedades = filtrar_por_estado(ALERTA, df)
+    assert novedades and resumen is None
+    assert df_reporte is df
+    registrar_reportados(resumen)
+
+
+def test_marca_se_guarda_recien_al_registrar():
+    df = _df(("2025-01", "A"))
+    df.attrs["marca"] = "2025-01-20"
+    resumen = filtrar_por_estado(ALERTA, df)[1]
+    assert estado_alertas.leer_marca("prueba") is None
+    registrar_reportados(resumen)
+    assert estado_alertas.leer_marca("prueba") == "2025-01-20"
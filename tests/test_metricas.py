@@ -0,0 +1,65 @@
+import pytest
+
+import metricas
+from metricas import BUCKETS_S, formatear
+
+
+@pytest.fixture(autouse=True)
+def limpio():
+    metricas.reiniciar()
+    yield
+    metricas.reiniciar()
+
+
+def _registro():
+    return dict(metricas._contadores), {k: [list(v[0]), v[1], v[2]] for k, v in metricas._histogramas.items()}
+
+
+def test_contador_con_etiquetas_y_script():
+    metricas.contar("consultas_total", consulta="tarifas_mtd", resultado="ok")
+    metricas.contar("consultas_total", consulta="tarifas_mtd", resultado="ok")
+    texto = formatear(*_registro(), script="tarifas", formato="prometheus")
+    assert "# TYPE automatizaciones_consultas_total counter" in texto
+    assert 'automatizaciones_consultas_total{script="tarifas",consulta="tarifas_mtd",resultado="ok"} 2' in texto
+    assert "# EOF" not in texto
+
+
+def test_histograma_acumula_buckets():
+    metricas.observar("consulta_segundos", 0.07, consulta="q")
+    metricas.observar("consulta_segundos", 0.3, consulta="q")
+    metricas.observar("consulta_segundos", 7200, consulta="q")
+    lineas = formatear(*_registro(), script="s", formato="prometheus").splitlines()
+    buckets = [l for l in lineas if l.startswith("automatizaciones_consulta_segundos_bucket")]
+    assert len(buckets) == len(BUCKETS_S) + 1
+    assert buckets[0] == 'automatizaciones_consulta_segundos_bucket{script="s",consulta="q",le="0.05"} 0'
+    assert buckets[1].endswith('le="0.1"} 1')
+    assert buckets[3].endswith('le="0.5"} 2')
+    assert buckets[-2].endswith('le="3600"} 2')
+    assert buckets[-1].endswith('le="+Inf"} 3')
+    assert 'automatizaciones_consulta_segundos_count{script="s",consulta="q"} 3' in lineas
+    assert any(l.startswith('automatizaciones_consulta_segundos_sum{script="s",consulta="q"} 7200.37') for l in lineas)
+
+
+def test_openmetrics_quita_total_de_la_familia_y_cierra_con_eof():
+    metricas.contar("smtp_envios_total", resultado="error")
+    texto = formatear(*_registro(), script="alertas", formato="openmetrics")
+    assert "# TYPE automatizaciones_smtp_envios counter" in texto
+    assert 'automatizaciones_smtp_envios_total{script="alertas",resultado="error"} 1' in texto
+    assert texto.endswith("# EOF\n")
+
+
+def test_escapa_valores_de_etiquetas():
+    metricas.contar("tareas_total", tarea='a"b\\c', estado="ok")
+    texto = formatear(*_registro(), script="s", formato="prometheus")
+    assert 'tarea="a\\"b\\\\c"' in texto
+
+
+def test_familias_sin_series_no_se_escriben():
+    assert formatear({}, {}, script="s", formato="prometheus") == "\n"
+    metricas.contar("tareas_total", tarea="t", estado="ok")
+    assert "consulta_segundos" not in formatear(*_registro(), script="s", formato="prometheus")
+
+
+def test_metrica_no_declarada():
+    with pytest.raises(KeyError):
+        metricas.contar("no_existe_total")
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import pytest
+
+from programador import TAREAS, parsear_cron, proxima_ejecucion
+
+
+def _proxima(expr, desde):
+    return proxima_ejecucion(parsear_cron(expr), desde)
+
+
+def test_campos_con_rangos_listas_y_pasos():
+    cron = parsear_cron("*/15 9-11,14 * * 1-5")
+    assert cron["minutos"] == {0, 15, 30, 45}
+    assert cron["horas"] == {9, 10, 11, 14}
+    assert cron["dias_semana"] == {1, 2, 3, 4, 5}
+    assert not cron["dia_o_semana"]
+
+
+def test_domingo_como_0_o_7():
+    assert parsear_cron("0 0 * * 7")["dias_semana"] == {0}
+    assert parsear_cron("0 0 * * 5/2")["dias_semana"] == {5, 0}
+
+
+@pytest.mark.parametrize("expr", ["* * * *", "60 * * * *", "* 24 * * *", "* * 0 * *", "*/0 * * * *", "5-1 * * * *"])
+def test_expresiones_invalidas(expr):
+    with pytest.raises(ValueError):
+        parsear_cron(expr)
+
+
+def test_proxima_es_estrictamente_posterior():
+    assert _proxima("15 * * * *", datetime(2025, 3, 10, 8, 15, 0)) == datetime(2025, 3, 10, 9, 15)
+    assert _proxima("15 * * * *", datetime(2025, 3, 10, 8, 14, 59)) == datetime(2025, 3, 10, 8, 15)
+
+
+def test_dias_habiles_saltan_el_fin_de_semana():
+    # Viernes 2025-03-14 después de las 8:00 -> lunes 2025-03-17
+    assert _proxima("0 8 * * 1-5", datetime(2025, 3, 14, 9, 0)) == datetime(2025, 3, 17, 8, 0)
+
+
+def test_rango_de_horas_pasa_al_dia_siguiente():
+    assert _proxima("30 9-19 * * 1-5", datetime(2025, 3, 10, 19, 30)) == datetime(2025, 3, 11, 9, 30)
+
+
+def test_dia_del_mes_o_dia_de_semana():
+    # Con ambos restringidos basta cumplir uno: el 1 del mes o cualquier lunes
+    assert _proxima("0 0 1 * 1", datetime(2025, 3, 1, 0, 0)) == datetime(2025, 3, 3, 0, 0)
+    assert _proxima("0 0 1 * 1", datetime(2025, 3, 31, 0, 0)) == datetime(2025, 4, 1, 0, 0)
+
+
+def test_cambio_de_mes_y_ano():
+    assert _proxima("0 6 1 1 *", datetime(2025, 1, 1, 6, 0)) == datetime(2026, 1, 1, 6, 0)
+    assert _proxima("0 0 29 2 *", datetime(2025, 3, 1)) == datetime(2028, 2, 29, 0, 0)
+
+
+def test_sin_ejecuciones_posibles():
+    with pytest.raises(ValueError):
+        _proxima("0 0 31 2 *", datetime(2025, 1, 1))
+
+
+def test_tareas_declaradas_son_validas():
+    for cfg in TAREAS.values():
+        parsear_cron(cfg["cron"])
@@ -0,0 +1,26 @@
+from datetime import date
+
+import pytest
+
+from Validador_tarifas import unidades_backfill
+
+
+def test_meses_completos_usan_etiqueta_del_mes():
+    assert unidades_backfill(date(2025, 1, 1), date(2025, 2, 28)) == [
+        ("2025-01", date(2025, 1, 1), date(2025, 1, 31)),
+        ("2025-02", date(2025, 2, 1), date(2025, 2, 28)),
+    ]
+
+
+def test_meses_parciales_llevan_sus_limites():
+    unidades = unidades_backfill(date(2025, 1, 15), date(2025, 3, 10))
+    assert [u[0] for u in unidades] == ["2025-01-15_2025-01-31", "2025-02", "2025-03-01_2025-03-10"]
+    # Un backfill posterior del mes completo no reutiliza la partición parcial
+    assert unidades_backfill(date(2025, 3, 1), date(2025, 3, 31))[0][0] == "2025-03"
+
+
+def test_granularidad_diaria():
+    assert [u[0] for u in unidades_backfill(date(2025, 1, 30), date(2025, 2, 1), "dia")] == [
+        "2025-01-30", "2025-01-31", "2025-02-01"]
+    with pytest.raises(ValueError):
+        unidades_backfill(date(2025, 1, 1), date(2025, 1, 2), "semana")